@@ -1,3 +1,4 @@
+import logging
 import os
 from datetime import timedelta
 
@@ -7,8 +8,13 @@ from flask_smorest import Api
 from app.config.config import Config, jwt, connect_tcp_socket
 from app.models.api_client.api_client import ApiClient
 from app.routes import register_routes
+from app.services.analytics_service import check_analytics_backend
 from app.config.config import db
-from app.scripts.load_data_csv import load_csv_to_db
+from app.scripts.file_processor import get_file_hash, check_file_processed
+from app.utils.instrumentation import init_instrumentation
+from app.utils.record_cache import init_record_cache
+from app.utils.slow_query_log import init_slow_query_log
+from app.utils.structured_logging import init_logging
 
 """
 This __init__ class is responsible for create the app, 
@@ -44,6 +50,31 @@ def create_app():
 
     app.config["SQLALCHEMY_DATABASE_URI"] = connect_tcp_socket()
 
+    # 'sql' or 'columnar', see AnalyticsService.get_repository
+    app.config["ANALYTICS_BACKEND"] = os.environ.get('ANALYTICS_BACKEND', 'sql')
+    check_analytics_backend(app.config["ANALYTICS_BACKEND"])
+
+    # Statements over the threshold are kept on the slow query log, see app.utils.slow_query_log
+    app.config["SLOW_QUERY_SECONDS"] = float(os.environ.get('SLOW_QUERY_SECONDS', 0.5))
+    app.config["SLOW_QUERY_LOG_SIZE"] = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 200))
+    app.config["SLOW_QUERY_EXPLAIN"] = os.environ.get('SLOW_QUERY_EXPLAIN', '1') == '1'
+    # Keys of the api_clients allowed on the admin endpoints
+    app.config["ADMIN_API_CLIENTS"] = [key.strip() for key in os.environ.get('ADMIN_API_CLIENTS', '').split(',')
+                                       if key.strip()]
+
+    # JSON records written by a background thread, see app.utils.structured_logging
+    app.config["LOG_LEVEL"] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    app.config["LOG_FORMAT"] = os.environ.get('LOG_FORMAT', 'json')
+    app.config["LOG_QUEUE_SIZE"] = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    app.config["LOG_DEBUG_SAMPLE_EVERY"] = int(os.environ.get('LOG_DEBUG_SAMPLE_EVERY', 100))
+    app.config["LOG_REQUESTS"] = os.environ.get('LOG_REQUESTS', '1') == '1'
+
+    # Serialized attendances read by id, see app.utils.record_cache
+    app.config["RECORD_CACHE_BACKEND"] = os.environ.get('RECORD_CACHE_BACKEND', 'local')
+    app.config["RECORD_CACHE_SIZE"] = int(os.environ.get('RECORD_CACHE_SIZE', 10000))
+    app.config["RECORD_CACHE_TTL_SECONDS"] = float(os.environ.get('RECORD_CACHE_TTL_SECONDS', 60))
+    app.config["RECORD_CACHE_PATH"] = os.environ.get('RECORD_CACHE_PATH', '/tmp/kpi_record_cache.sqlite3')
+
     app.config.from_object(Config)
 
 
@@ -52,13 +83,46 @@ def create_app():
 
     jwt.init_app(app)
 
+    # Request timings, SQL statement counts and the Server-Timing header
+    init_instrumentation(app)
+    init_slow_query_log(app)
+    # Request ids and the request log, reading the timings of the instrumentation
+    init_logging(app)
+    init_record_cache(app)
+
     api = Api(app)
 
     register_routes(api)
 
     with app.app_context():
         csv_file_path = 'app/data/bd_desafio.csv'
-        load_csv_to_db(csv_file_path)
+        seed_csv(csv_file_path)
 
 
     return app
+
+
+def seed_csv(csv_file):
+    """
+    Loads the seed CSV file into the database, unless its hash is already recorded.
+
+    The ingest subsystem imports pandas, NumPy and pyarrow, so it is only imported
+    when there is a new file to load. The web workers of an already seeded database
+    do not pay for those imports at startup nor carry them in memory.
+
+    :param csv_file: The path of the CSV file.
+    :type csv_file: str
+    :return: None
+    """
+    try:
+        file_hash = get_file_hash(csv_file)
+        if check_file_processed(file_hash):
+            logging.info("File %s already processed. Skipping...", csv_file, extra={'file': csv_file})
+            return
+    except Exception as e:
+        db.session.rollback()
+        logging.error("Error processing CSV: %s", e, extra={'file': csv_file})
+        return
+
+    from app.scripts.load_data_csv import load_csv_to_db
+    load_csv_to_db(csv_file, file_hash=file_hash)
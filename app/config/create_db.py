@@ -1,28 +1,32 @@
 from app import db, create_app, ApiClient
+from app.config.migrations import run_migrations
 
 
-def create_db():
+def create_db(app=None):
     """
     Creates all the database tables defined in the application's models.
 
-    This function initializes a Flask application by invoking the `create_app`
-    function. It then sets up the application context using a `with` block,
-    allowing operations that require the context (such as database table creation)
-    to be performed. Inside the block, it imports the `Attendance` model from the
-    application's models and creates all tables in the database defined by the
-    SQLAlchemy models.
+    When an application is given, the tables are created inside its context so
+    the caller does not pay for a second `create_app` call (route registration,
+    OpenAPI spec generation and the CSV seed step). Without an application, a new
+    one is built by invoking the `create_app` function. Once the tables exist, the
+    migrations are applied to the tables created by former versions, and a default
+    api_client is created if the `api_clients` table is empty.
 
+    :param app: The Flask application whose database must be created. When None,
+        a new application is created.
+    :type app: flask.Flask or None
     :raises OperationalError: If there's an error during database creation.
     :raises ImportError: If models couldn't be imported during execution.
     :return: None
     """
-    app = create_app()
+    if app is None:
+        app = create_app()
     with app.app_context():
         db.create_all()
-        with app.app_context():
-            db.create_all()
-            if not ApiClient.query.first():
-                secret = 'secret_key'
-                client = ApiClient(api_client_key='my_client', api_client_secret=ApiClient.hash_secret(secret))
-                db.session.add(client)
-                db.session.commit()
\ No newline at end of file
+        run_migrations()
+        if not ApiClient.query.first():
+            secret = 'secret_key'
+            client = ApiClient(api_client_key='my_client', api_client_secret=ApiClient.hash_secret(secret))
+            db.session.add(client)
+            db.session.commit()
@@ -0,0 +1,100 @@
+import importlib.util
+import multiprocessing
+import os
+
+"""
+Gunicorn configuration used by the production image.
+
+Loaded with `gunicorn -c python:app.config.gunicorn_config wsgi:app`.
+The app is preloaded in the master process, so the routes, the schemas and the
+SQLAlchemy mappers are built once and shared by the workers after fork.
+Every value can be overridden through the environment.
+"""
+
+cpu_count = multiprocessing.cpu_count()
+
+
+def _gevent_available():
+    return importlib.util.find_spec('gevent') is not None
+
+
+def default_worker_class(cpus):
+    """
+    Chooses the worker class for the number of available CPUs.
+
+    With a single CPU several processes cannot run in parallel, so the request
+    concurrency comes from gevent greenlets when gevent is installed. With more
+    CPUs, one gthread worker per core plus the spare worker keeps the CPU busy
+    while threads are blocked on the database.
+
+    :param cpus: Number of CPUs available to the container.
+    :type cpus: int
+    :return: The gunicorn worker class name.
+    :rtype: str
+    """
+    if cpus <= 1 and _gevent_available():
+        return 'gevent'
+    return 'gthread'
+
+
+def default_workers(worker_class, cpus):
+    """
+    Computes the number of worker processes for the given worker class.
+
+    :param worker_class: The gunicorn worker class name.
+    :type worker_class: str
+    :param cpus: Number of CPUs available to the container.
+    :type cpus: int
+    :return: The number of worker processes.
+    :rtype: int
+    """
+    if worker_class == 'gevent':
+        return cpus
+    return cpus * 2 + 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+preload_app = True
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', default_worker_class(cpu_count))
+workers = int(os.environ.get('GUNICORN_WORKERS', default_workers(worker_class, cpu_count)))
+# Used by gthread workers only
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Used by gevent workers only
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Graceful timeouts
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle the workers from time to time to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """
+    Resets the SQLAlchemy pool state inherited from the master process.
+
+    The preloaded app opens connections while creating the database, and those
+    sockets must not be shared between processes. `dispose(close=False)` drops
+    the inherited pool without closing the parent's connections, so each worker
+    opens its own ones on first use.
+    """
+    from app.config.config import db
+
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen is not installed, psycopg2 calls will block the gevent loop")
+
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
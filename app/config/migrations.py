@@ -0,0 +1,231 @@
+from sqlalchemy import inspect, update, select, func, cast, Date
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.models.dimension.dimension_model import Angel, Pole
+from app.repositories.partition_repository import attendance_partitions
+
+"""
+Schema changes that `db.create_all` cannot apply on an existing database.
+
+`db.create_all` only creates the missing tables. The migrations below add the new
+columns and indexes to the tables created by former versions of the application and
+backfill their values. Every migration is idempotent and is run by `create_db`.
+"""
+
+# Number of rows updated by statement when backfilling a column
+BACKFILL_BATCH_SIZE = 50000
+
+# Number of months after the current one whose attendance partitions are created ahead
+PARTITION_MONTHS_AHEAD = 2
+
+
+def add_missing_columns(table, columns):
+    """
+    Adds the columns of a model missing from its table on the database.
+
+    :param table: The model table.
+    :type table: sqlalchemy.Table
+    :param columns: The names of the columns to add when missing.
+    :type columns: Iterable[str]
+    :return: The names of the columns added.
+    :rtype: list[str]
+    """
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    added = []
+    with db.engine.begin() as connection:
+        for name in columns:
+            if name in existing:
+                continue
+            column = table.columns[name]
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}'
+            if column.server_default is not None:
+                default = column.server_default.arg.compile(dialect=db.engine.dialect)
+                ddl += f' DEFAULT {default} NOT NULL' if not column.nullable else f' DEFAULT {default}'
+            connection.execute(db.text(ddl))
+            added.append(name)
+    return added
+
+
+def create_missing_indexes(table):
+    """
+    Creates the indexes of a model missing from its table on the database.
+
+    :param table: The model table.
+    :type table: sqlalchemy.Table
+    :return: None
+    """
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(db.engine)
+
+
+def backfill_on_time():
+    """
+    Fills the `on_time` and `attendance_day` columns of the existing attendances.
+
+    The rows are updated by ranges of ids, so a large table is not locked by a single
+    long statement.
+
+    :return: None
+    """
+    if db.engine.dialect.name == 'sqlite':
+        attendance_day = func.date(Attendance.attendance_date)
+    else:
+        attendance_day = cast(Attendance.attendance_date, Date)
+
+    with db.engine.begin() as connection:
+        max_id = connection.execute(select(func.max(Attendance.id))).scalar() or 0
+
+    for first_id in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(Attendance.__table__)
+                .where(Attendance.id >= first_id, Attendance.id < first_id + BACKFILL_BATCH_SIZE)
+                .values(on_time=func.coalesce(Attendance.attendance_date <= Attendance.deadline, False),
+                        attendance_day=attendance_day)
+            )
+
+
+def migrate_on_time_columns():
+    """
+    Adds the `on_time` and `attendance_day` columns and backfills them.
+
+    :return: None
+    """
+    if add_missing_columns(Attendance.__table__, ('on_time', 'attendance_day')):
+        backfill_on_time()
+
+
+def migrate_dimension_columns():
+    """
+    Moves the `angel` and `pole` names repeated on every attendance to the `angels` and
+    `poles` dimension tables.
+
+    The distinct names are inserted on the dimension tables, the `angel_id` and `pole_id`
+    keys are backfilled by ranges of ids, and the former string columns and their indexes
+    are dropped. On PostgreSQL the keys are then made not null and foreign keys.
+
+    :return: None
+    """
+    table = Attendance.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    if 'angel' not in existing and 'pole' not in existing:
+        return
+
+    add_missing_columns(table, ('angel_id', 'pole_id'))
+
+    for name, dimension in (('angel', Angel), ('pole', Pole)):
+        if name not in existing:
+            continue
+        key = f'{name}_id'
+        dimension_table = dimension.__tablename__
+
+        with db.engine.begin() as connection:
+            connection.execute(db.text(
+                f'INSERT INTO {dimension_table} (name) SELECT DISTINCT {name} FROM {table.name} '
+                f'WHERE {name} NOT IN (SELECT name FROM {dimension_table})'
+            ))
+            max_id = connection.execute(select(func.max(Attendance.id))).scalar() or 0
+
+        for first_id in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            with db.engine.begin() as connection:
+                connection.execute(db.text(
+                    f'UPDATE {table.name} SET {key} = '
+                    f'(SELECT id FROM {dimension_table} WHERE {dimension_table}.name = {table.name}.{name}) '
+                    f'WHERE id >= :first_id AND id < :last_id'
+                ), {'first_id': first_id, 'last_id': first_id + BACKFILL_BATCH_SIZE})
+
+        with db.engine.begin() as connection:
+            for index in inspect(connection).get_indexes(table.name):
+                if name in index['column_names']:
+                    connection.execute(db.text(f'DROP INDEX {index["name"]}'))
+            connection.execute(db.text(f'ALTER TABLE {table.name} DROP COLUMN {name}'))
+            if connection.dialect.name == 'postgresql':
+                connection.execute(db.text(f'ALTER TABLE {table.name} ALTER COLUMN {key} SET NOT NULL'))
+                connection.execute(db.text(
+                    f'ALTER TABLE {table.name} ADD CONSTRAINT {table.name}_{key}_fkey '
+                    f'FOREIGN KEY ({key}) REFERENCES {dimension_table} (id)'
+                ))
+
+
+def migrate_attendance_partitioning():
+    """
+    Converts the attendances table to a table partitioned by month of `attendance_date`
+    on PostgreSQL. The other databases keep a single table.
+
+    The partitioned table is created next to the existing one, with a partition for each
+    month holding attendances, the rows are copied and the tables are swapped, all in a
+    single transaction. The ids are kept and the sequence continues after the highest
+    one. The indexes are created afterwards by `migrate_attendance_indexes`.
+
+    :return: None
+    """
+    table = Attendance.__table__.name
+    new_table = f'{table}_partitioned'
+    with db.engine.begin() as connection:
+        if not attendance_partitions.is_supported(connection) or attendance_partitions.is_partitioned(connection):
+            return
+
+        months = connection.execute(db.text(
+            f"SELECT DISTINCT CAST(date_trunc('month', attendance_date) AS DATE) FROM {table} "
+            f"WHERE attendance_date IS NOT NULL"
+        )).scalars().all()
+        attendance_partitions.create_partitioned_table(connection, new_table, months)
+
+        columns = ', '.join(column.name for column in Attendance.__table__.columns)
+        connection.execute(db.text(f'INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {table}'))
+        connection.execute(db.text(
+            f"SELECT setval('{new_table}_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM {new_table}"
+        ))
+
+        connection.execute(db.text(f'DROP TABLE {table}'))
+        connection.execute(db.text(f'ALTER TABLE {new_table} RENAME TO {table}'))
+        connection.execute(db.text(f'ALTER SEQUENCE {new_table}_id_seq RENAME TO {table}_id_seq'))
+    attendance_partitions.clear()
+
+
+def create_upcoming_partitions():
+    """
+    Creates the attendance partitions of the current month and of the
+    `PARTITION_MONTHS_AHEAD` following months, so the new attendances do not wait for a
+    partition to be created. Runs on every start.
+
+    :return: None
+    """
+    with db.engine.begin() as connection:
+        attendance_partitions.ensure_partitions(attendance_partitions.upcoming_months(PARTITION_MONTHS_AHEAD),
+                                                connection)
+
+
+def migrate_attendance_indexes():
+    """
+    Creates the indexes of the attendances missing on the database, as the partial
+    indexes serving the on-time analytics. Runs after the column migrations, since the
+    indexes reference the new columns.
+
+    :return: None
+    """
+    create_missing_indexes(Attendance.__table__)
+
+
+# Migrations applied in order by `run_migrations`
+MIGRATIONS = (
+    migrate_on_time_columns,
+    migrate_dimension_columns,
+    migrate_attendance_partitioning,
+    create_upcoming_partitions,
+    migrate_attendance_indexes,
+)
+
+
+def run_migrations():
+    """
+    Applies the migrations to the database of the current application context.
+
+    :return: None
+    """
+    for migration in MIGRATIONS:
+        migration()
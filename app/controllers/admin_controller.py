@@ -0,0 +1,19 @@
+from flask import request
+
+from app.services.admin_service import AdminService
+
+
+class AdminController:
+    """
+    Handles the requests of the diagnostic endpoints, forwarding their arguments to
+    the AdminService.
+    """
+    @staticmethod
+    def get_slow_queries():
+        args = request.args.to_dict()
+        return AdminService.get_slow_queries(args)
+
+    @staticmethod
+    def get_profile():
+        args = request.args.to_dict()
+        return AdminService.get_profile(args)
@@ -73,4 +73,28 @@ class AnalyticsController:
             logistics pole and specified period.
         """
         args = request.args.to_dict()
-        return AnalyticsService.get_productivity_by_logistics_pole_and_period(args)
\ No newline at end of file
+        return AnalyticsService.get_productivity_by_logistics_pole_and_period(args)
+
+    @staticmethod
+    def get_productivity_leaderboard():
+        """
+        Returns the productivity ranking of all angels for a period based on the provided
+        query parameters.
+
+        :rtype: flask.Response
+        :return: The ranked productivity data of the angels for the requested page.
+        """
+        args = request.args.to_dict()
+        return AnalyticsService.get_productivity_leaderboard(args)
+
+    @staticmethod
+    def get_productivity_series():
+        """
+        Returns the productivity of the angels or poles by time bucket for a period based
+        on the provided query parameters.
+
+        :rtype: flask.Response
+        :return: The productivity series of the angels or poles.
+        """
+        args = request.args.to_dict()
+        return AnalyticsService.get_productivity_series(args)
@@ -46,6 +46,33 @@ class AttendanceController:
 
         return AttendanceService.update_attendance(data, id)
 
+    @staticmethod
+    def bulk_update_attendances(data):
+        """
+        Updates the given fields of many attendance records by delegating to the
+        AttendanceService.
+
+        :param data: The items, each with the `id` of its attendance and the fields to
+            write.
+        :type data: list[dict]
+        :return: The result of each item, as processed by the AttendanceService.
+        :rtype: flask.Response
+        """
+        return AttendanceService.bulk_update_attendances(data)
+
+    @staticmethod
+    def bulk_retrieve_attendances(data):
+        """
+        Retrieves many attendance records by delegating to the AttendanceService.
+
+        :param data: The payload, with either a list of `ids` or a list of
+            `id_attendance` values.
+        :type data: dict
+        :return: An entry by requested value, as processed by the AttendanceService.
+        :rtype: flask.Response
+        """
+        return AttendanceService.bulk_retrieve_attendances(data)
+
     @staticmethod
     def retrieve_attendance(id):
         """
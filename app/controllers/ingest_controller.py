@@ -0,0 +1,14 @@
+from flask import request
+
+from app.services.ingest_service import IngestService
+
+
+class IngestController:
+    """
+    Handles the requests of the ingest endpoints, forwarding their arguments to the
+    IngestService.
+    """
+    @staticmethod
+    def get_status():
+        args = request.args.to_dict()
+        return IngestService.get_status(args)
@@ -1,13 +1,14 @@
 import datetime
 
-from marshmallow import Schema, fields, ValidationError, validates, post_load
+from marshmallow import Schema, fields, ValidationError, validates_schema, post_load
 
 from app.config.config import db
 from app.models.attendance.attendance_model import Attendance
 from app.utils.date_utils import parse_date
+from app.utils.instrumentation import TimedSchemaMixin
 
 
-class AttendanceCreationSchema(Schema):
+class AttendanceCreationSchema(TimedSchemaMixin, Schema):
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.datetime.now())
     updated_at = db.Column(db.DateTime, default=datetime.datetime.now(), onupdate=datetime.datetime.now())
@@ -28,28 +29,78 @@ class AttendanceCreationSchema(Schema):
                            attendance_date = data['attendance_date'])
 
 
-    #TODO: add personalized validations on schema
-    @validates('id_attendance')
-    def validate_id_attendance(self, value):
-        if value <= 0:
-            raise ValidationError("INVALID_ATTENDANCE_ID")
+    # The rules of the fields, checked in a single pass once the fields are deserialized
+    @validates_schema(skip_on_field_errors=False)
+    def validate_attendance(self, data, **kwargs):
+        errors = attendance_rule_errors(data)
+        if errors:
+            raise ValidationError(errors)
 
-    @validates('id_client')
-    def validate_id_client(self, value):
-        if value <= 0:
-            raise ValidationError("INVALID_CLIENT_ID")
 
-    @validates('deadline')
-    def validate_deadline(self, value):
-        if not isinstance(value, datetime.datetime):
-            raise ValidationError("INVALID_DEADLINE")
+def parse_item_date(value):
+    """
+    Parses the date of a bulk update item, a date matching no format being an error of
+    its item rather than of the whole batch.
 
-    @validates('angel')
-    def validate_angel(self, value):
-        if len(value) <= 0:
-            raise ValidationError("INVALID_ANGEL_NAME")
+    :param value: The date as sent.
+    :type value: str
+    :return: The parsed date.
+    :rtype: datetime.datetime
+    :raises ValidationError: If the date matches no format.
+    """
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise ValidationError("DATE_INVALID_FORMAT")
+
+
+class AttendanceUpdateSchema(TimedSchemaMixin, Schema):
+    """
+    Schema of an item of a bulk update: the id of the attendance and the fields to
+    write, the other fields being kept. The fields follow the rules of the
+    `AttendanceCreationSchema`, and an `attendance_date` may be null.
+    """
+    id = fields.Int(required=True)
+    id_attendance = fields.Int()
+    id_client = fields.Int()
+    angel = fields.Str()
+    pole = fields.Str()
+    deadline = fields.Function(deserialize=parse_item_date)
+    attendance_date = fields.Function(deserialize=parse_item_date, allow_none=True)
+
+    @validates_schema(skip_on_field_errors=False, pass_original=True)
+    def validate_attendance(self, data, original_data, **kwargs):
+        errors = attendance_rule_errors(data)
+        if 'id' in data and data['id'] <= 0:
+            errors['id'] = ["INVALID_ID"]
+        # The fields given are read from the item as sent, a field that failed to
+        # deserialize not being in data
+        if not set(original_data).intersection(self.fields).difference({'id'}):
+            errors['_schema'] = ["NO_FIELDS_TO_UPDATE"]
+        if errors:
+            raise ValidationError(errors)
+
+
+def attendance_rule_errors(data):
+    """
+    Checks the rules of the attendance fields. A field that failed to deserialize, or
+    was not given, is not in data, so its rule is not checked.
+
+    :param data: The deserialized fields.
+    :type data: dict
+    :return: The error codes by field.
+    :rtype: dict[str, list[str]]
+    """
+    errors = {}
+    if 'id_attendance' in data and data['id_attendance'] <= 0:
+        errors['id_attendance'] = ["INVALID_ATTENDANCE_ID"]
+    if 'id_client' in data and data['id_client'] <= 0:
+        errors['id_client'] = ["INVALID_CLIENT_ID"]
+    if 'deadline' in data and not isinstance(data['deadline'], datetime.datetime):
+        errors['deadline'] = ["INVALID_DEADLINE"]
+    if 'angel' in data and len(data['angel']) <= 0:
+        errors['angel'] = ["INVALID_ANGEL_NAME"]
+    if 'pole' in data and len(data['pole']) <= 0:
+        errors['pole'] = ["INVALID_POLE_NAME"]
+    return errors
 
-    @validates('pole')
-    def validate_pole(self, value):
-        if len(value) <= 0:
-            raise ValidationError("INVALID_POLE_NAME")
\ No newline at end of file
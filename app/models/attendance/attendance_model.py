@@ -1,5 +1,11 @@
 from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import validates
+
 from app.config.config import db
+from app.models.dimension.dimension_model import Angel, Pole
 
 
 #TODO: Add python documentation
@@ -22,16 +28,34 @@ class Attendance(db.Model):
     :type id_attendance: int
     :ivar id_client: Identifier for the api_client associated with the attendance.
     :type id_client: int
-    :ivar angel: Name of the associated angel (representative).
+    :ivar angel_id: Key of the associated angel on the `angels` dimension table.
+    :type angel_id: int
+    :ivar pole_id: Key of the associated pole on the `poles` dimension table.
+    :type pole_id: int
+    :ivar angel: Name of the associated angel (representative). Assigning a name does not
+        touch the database; the `angel_id` key is resolved on write by the repository.
     :type angel: str
-    :ivar pole: Name of the associated pole or center.
+    :ivar pole: Name of the associated pole or center. Assigning a name does not touch the
+        database; the `pole_id` key is resolved on write by the repository.
     :type pole: str
     :ivar deadline: The deadline assigned to the attendance.
     :type deadline: datetime
     :ivar attendance_date: The date on which the attendance occurred, if applicable.
     :type attendance_date: datetime or None
+    :ivar on_time: Whether the attendance occurred until the deadline. Maintained on write
+        from `attendance_date` and `deadline`, so the on-time analytics can be served by an index.
+    :type on_time: bool
+    :ivar attendance_day: The day of `attendance_date`. Maintained on write.
+    :type attendance_day: date or None
     """
     __tablename__ = 'attendances'
+    __table_args__ = (
+        # Partial indexes serving the on-time analytics by angel and by pole
+        db.Index('ix_attendances_on_time_angel_id', 'angel_id', 'attendance_date',
+                 postgresql_where=db.text('on_time'), sqlite_where=db.text('on_time')),
+        db.Index('ix_attendances_on_time_pole_id', 'pole_id', 'attendance_date',
+                 postgresql_where=db.text('on_time'), sqlite_where=db.text('on_time')),
+    )
 
     #@TODO: Replace id by uuid
     id = db.Column(db.Integer, primary_key=True)
@@ -39,10 +63,19 @@ class Attendance(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     id_attendance = db.Column('id_attendance', db.Integer, nullable=False)
     id_client = db.Column('id_client', db.Integer, nullable=False)
-    angel = db.Column('angel', db.String(255), nullable=False)
-    pole = db.Column('pole', db.String(255), nullable=False)
+    angel_id = db.Column('angel_id', db.Integer, db.ForeignKey('angels.id'), nullable=False)
+    pole_id = db.Column('pole_id', db.Integer, db.ForeignKey('poles.id'), nullable=False)
     deadline = db.Column('deadline', db.DateTime, nullable=False)
     attendance_date = db.Column('attendance_date', db.DateTime, nullable=True)
+    on_time = db.Column('on_time', db.Boolean, nullable=False, default=False, server_default=db.false())
+    attendance_day = db.Column('attendance_day', db.Date, nullable=True)
+
+    angel_dimension = db.relationship(Angel, lazy='joined', innerjoin=True)
+    pole_dimension = db.relationship(Pole, lazy='joined', innerjoin=True)
+
+    # Names assigned on this instance, resolved to their dimension keys on write
+    angel_name = None
+    pole_name = None
 
     def __init__(self, id_attendance, id_client, angel, pole, deadline, attendance_date):
         self.id_attendance = id_attendance
@@ -52,6 +85,71 @@ class Attendance(db.Model):
         self.deadline = deadline
         self.attendance_date = attendance_date
 
+    @hybrid_property
+    def angel(self):
+        if self.angel_name is not None:
+            return self.angel_name
+        return self.angel_dimension.name if self.angel_dimension is not None else None
+
+    @angel.setter
+    def angel(self, name):
+        self.angel_name = name
+
+    @angel.expression
+    def angel(cls):
+        return select(Angel.name).where(Angel.id == cls.angel_id).scalar_subquery()
+
+    @hybrid_property
+    def pole(self):
+        if self.pole_name is not None:
+            return self.pole_name
+        return self.pole_dimension.name if self.pole_dimension is not None else None
+
+    @pole.setter
+    def pole(self, name):
+        self.pole_name = name
+
+    @pole.expression
+    def pole(cls):
+        return select(Pole.name).where(Pole.id == cls.pole_id).scalar_subquery()
+
+    # Keep the derived columns up to date whenever one of the dates is assigned
+    @validates('deadline', 'attendance_date')
+    def validate_dates(self, key, value):
+        deadline = value if key == 'deadline' else self.deadline
+        attendance_date = value if key == 'attendance_date' else self.attendance_date
+        self.on_time = Attendance.is_on_time(attendance_date, deadline)
+        if key == 'attendance_date':
+            self.attendance_day = Attendance.day_of(value)
+        return value
+
+    @staticmethod
+    def is_on_time(attendance_date, deadline):
+        """
+        Computes the `on_time` flag of an attendance, as the former
+        `CASE WHEN attendance_date <= deadline` expression of the analytics queries.
+
+        :param attendance_date: The date on which the attendance occurred, if applicable.
+        :type attendance_date: datetime or None
+        :param deadline: The deadline assigned to the attendance.
+        :type deadline: datetime or None
+        :return: True if the attendance occurred until the deadline.
+        :rtype: bool
+        """
+        return attendance_date is not None and deadline is not None and attendance_date <= deadline
+
+    @staticmethod
+    def day_of(attendance_date):
+        """
+        Computes the `attendance_day` column of an attendance.
+
+        :param attendance_date: The date on which the attendance occurred, if applicable.
+        :type attendance_date: datetime or None
+        :return: The day of the attendance, or None.
+        :rtype: date or None
+        """
+        return attendance_date.date() if isinstance(attendance_date, datetime) else attendance_date
+
     def __repr__(self):
         return (f"<Attendance { self.id } - {self.id_attendance} - {self.id_client} - {self.angel} - {self.pole} - "
                 f"{self.attendance_date} - {self.deadline}>")
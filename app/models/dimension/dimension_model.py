@@ -0,0 +1,43 @@
+from app.config.config import db
+
+
+class Angel(db.Model):
+    """
+    Represents an angel (representative) dimension record.
+
+    The attendances reference the angel by its small integer key instead of
+    repeating the name on every row, so the analytics group on integers.
+
+    :ivar id: Surrogate key of the angel.
+    :type id: int
+    :ivar name: Name of the angel.
+    :type name: str
+    """
+    __tablename__ = 'angels'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), unique=True, nullable=False)
+
+    def __repr__(self):
+        return f"<Angel {self.id} - {self.name}>"
+
+
+class Pole(db.Model):
+    """
+    Represents a logistics pole (center) dimension record.
+
+    The attendances reference the pole by its small integer key instead of
+    repeating the name on every row, so the analytics group on integers.
+
+    :ivar id: Surrogate key of the pole.
+    :type id: int
+    :ivar name: Name of the pole.
+    :type name: str
+    """
+    __tablename__ = 'poles'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), unique=True, nullable=False)
+
+    def __repr__(self):
+        return f"<Pole {self.id} - {self.name}>"
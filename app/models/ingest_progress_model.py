@@ -0,0 +1,105 @@
+from datetime import datetime
+
+from app.config.config import db
+
+# Status of an ingest
+INGEST_RUNNING = 'running'
+INGEST_COMPLETED = 'completed'
+INGEST_FAILED = 'failed'
+INGEST_STATUSES = (INGEST_RUNNING, INGEST_COMPLETED, INGEST_FAILED)
+
+
+class IngestProgress(db.Model):
+    """
+    Represents the progress of the ingest of a file, updated as each chunk of the file
+    is committed, so a load can be followed from another process.
+
+    :ivar id: Primary key of the progress record.
+    :type id: int
+    :ivar file_hash: Hash of the file, as recorded on the `file_records` table once loaded.
+    :type file_hash: str
+    :ivar file_name: Path of the file, as given to the ingest.
+    :type file_name: str
+    :ivar status: `running`, `completed` or `failed`.
+    :type status: str
+    :ivar size_bytes: Size of the file.
+    :type size_bytes: int
+    :ivar bytes_read: Bytes of the file read so far, header included.
+    :type bytes_read: int
+    :ivar rows_read: Rows read so far.
+    :type rows_read: int
+    :ivar rows_accepted: Rows read that passed the validation.
+    :type rows_accepted: int
+    :ivar rows_rejected: Rows written to the `ingest_rejects` quarantine table, refused by
+        the validation or by the database.
+    :type rows_rejected: int
+    :ivar rows_inserted: Attendances inserted.
+    :type rows_inserted: int
+    :ivar error: The error of a failed ingest.
+    :type error: str
+    :ivar started_at: Timestamp when the ingest of the file started.
+    :type started_at: datetime
+    :ivar updated_at: Timestamp of the last committed chunk.
+    :type updated_at: datetime
+    :ivar finished_at: Timestamp when the ingest completed or failed.
+    :type finished_at: datetime
+    """
+    __tablename__ = 'ingest_progress'
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_hash = db.Column(db.String(64), nullable=False, unique=True)
+    file_name = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=INGEST_RUNNING)
+    size_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    bytes_read = db.Column(db.BigInteger, nullable=False, default=0)
+    rows_read = db.Column(db.BigInteger, nullable=False, default=0)
+    rows_accepted = db.Column(db.BigInteger, nullable=False, default=0)
+    rows_rejected = db.Column(db.BigInteger, nullable=False, default=0)
+    rows_inserted = db.Column(db.BigInteger, nullable=False, default=0)
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<IngestProgress {self.id} - {self.file_hash} - {self.status} - {self.rows_read}>"
+
+    def to_dict(self, now=None):
+        """
+        Returns the progress with the rates since the start of the ingest and, while it
+        runs, the estimated time left from the bytes left to read.
+
+        :param now: The current time, `datetime.now()` by default.
+        :type now: datetime or None
+        :return: The progress of the ingest.
+        :rtype: dict
+        """
+        elapsed = ((self.finished_at or self.updated_at) - self.started_at).total_seconds()
+        rows_per_second = self.rows_read / elapsed if elapsed > 0 else None
+        bytes_per_second = self.bytes_read / elapsed if elapsed > 0 else None
+
+        eta_seconds = None
+        if self.status == INGEST_RUNNING and bytes_per_second:
+            # Left from the last committed chunk, less the time since it was committed
+            left = (self.size_bytes - self.bytes_read) / bytes_per_second
+            since_update = ((now or datetime.now()) - self.updated_at).total_seconds()
+            eta_seconds = round(max(left - since_update, 0.0), 1)
+
+        return {
+            "file_hash": self.file_hash,
+            "file_name": self.file_name,
+            "status": self.status,
+            "size_bytes": self.size_bytes,
+            "bytes_read": self.bytes_read,
+            "progress": round(self.bytes_read / self.size_bytes, 4) if self.size_bytes else None,
+            "rows_read": self.rows_read,
+            "rows_accepted": self.rows_accepted,
+            "rows_rejected": self.rows_rejected,
+            "rows_inserted": self.rows_inserted,
+            "rows_per_second": round(rows_per_second, 1) if rows_per_second is not None else None,
+            "eta_seconds": eta_seconds,
+            "error": self.error,
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
+        }
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from app.config.config import db
+
+
+class IngestReject(db.Model):
+    """
+    Represents a row of an ingested CSV file that was not loaded, kept in quarantine so
+    it can be reviewed, fixed and loaded again.
+
+    :ivar id: Primary key of the rejected row.
+    :type id: int
+    :ivar file_hash: Hash of the file of the row, as recorded on the `file_records` table.
+    :type file_hash: str
+    :ivar line: Line of the row on the file, the header being the line 1.
+    :type line: int
+    :ivar error_code: Reason of the rejection, as `INVALID_DEADLINE`.
+    :type error_code: str
+    :ivar raw_row: The row, its values as read joined by the separator of the file.
+    :type raw_row: str
+    :ivar created_at: Timestamp when the row was rejected.
+    :type created_at: datetime
+    """
+    __tablename__ = 'ingest_rejects'
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_hash = db.Column(db.String(64), nullable=False, index=True)
+    line = db.Column(db.Integer, nullable=False)
+    error_code = db.Column(db.String(64), nullable=False)
+    raw_row = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<IngestReject {self.id} - {self.file_hash} - {self.line} - {self.error_code}>"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "file_hash": self.file_hash,
+            "line": self.line,
+            "error_code": self.error_code,
+            "raw_row": self.raw_row,
+            "created_at": self.created_at,
+        }
@@ -1,13 +1,29 @@
-from sqlalchemy import func, select
+from sqlalchemy import func, select, desc, literal_column, update, values, column, bindparam, cast, and_, any_, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.sql import case
 
 from app.config.config import db
 from app.models.attendance.attendance_model import Attendance
+from app.models.dimension.dimension_model import Angel, Pole
+from app.repositories.dimension_repository import angel_repository, pole_repository
+from app.repositories.partition_repository import attendance_partitions
+from app.utils.date_utils import DATE_BUCKETS
+from app.utils.record_cache import attendance_record_cache
 
 
 class AttendanceRepository:
 
+    # Aggregated columns accepted to rank the angels on the productivity leaderboard
+    LEADERBOARD_ORDER_COLUMNS = ('angel', 'total_attendances', 'on_time_attendances', 'delayed_attendances',
+                                 'on_time_percentage')
+
+    # Fields written by a bulk update, the angel and pole names being written as their keys
+    BULK_UPDATE_FIELDS = {'id_attendance': 'id_attendance', 'id_client': 'id_client', 'angel': 'angel_id',
+                          'pole': 'pole_id', 'deadline': 'deadline', 'attendance_date': 'attendance_date'}
+    # Rows of a bulk UPDATE statement, and ids of an IN list
+    BULK_BATCH_SIZE = 5000
+
     @staticmethod
     def create_attendance(validated_data):
         """
@@ -34,10 +50,14 @@ class AttendanceRepository:
             validated_data.pop('created_at', None)
             validated_data.pop('updated_at', None)
             new_attendance = Attendance(**validated_data)
+            AttendanceRepository.resolve_dimensions([new_attendance])
+            attendance_partitions.ensure_partitions([new_attendance.attendance_date])
 
             db.session.add(new_attendance)
 
             db.session.commit()
+            # An attendance loaded again has an id_attendance of cached attendances
+            attendance_record_cache.invalidate(id_attendance=[new_attendance.id_attendance])
 
             return new_attendance
         except SQLAlchemyError as e:
@@ -46,6 +66,173 @@ class AttendanceRepository:
         except Exception as e:
             db.session.rollback()
             raise e
+    @staticmethod
+    def resolve_dimensions(attendances):
+        """
+        Resolves the angel and pole names assigned to the given attendances to their
+        dimension keys, with one lookup by dimension for the whole batch. The missing
+        dimension records are created.
+
+        :param attendances: The attendances to resolve.
+        :type attendances: list[Attendance]
+        :return: None
+        """
+        angel_ids = angel_repository.get_ids(
+            {attendance.angel_name for attendance in attendances if attendance.angel_name is not None})
+        pole_ids = pole_repository.get_ids(
+            {attendance.pole_name for attendance in attendances if attendance.pole_name is not None})
+        for attendance in attendances:
+            if attendance.angel_name is not None:
+                attendance.angel_id = angel_ids[attendance.angel_name]
+            if attendance.pole_name is not None:
+                attendance.pole_id = pole_ids[attendance.pole_name]
+
+    @staticmethod
+    def update_attendance(id, validated_data):
+        """
+        Updates the attendance record of the given ID with the validated data, including
+        the `on_time` and `attendance_day` columns derived from its dates.
+
+        :param id: The unique identifier of the attendance record to update.
+        :type id: int
+        :param validated_data: The validated attendance, as loaded by the
+            `AttendanceCreationSchema`.
+        :type validated_data: Attendance
+        :return: None
+        :raises SQLAlchemyError: If there is an error during the database operation.
+        """
+        try:
+            # The missing dimension records are created on their own connection, before the
+            # partition locks are taken by the session
+            angel_id = angel_repository.get_id(validated_data.angel)
+            pole_id = pole_repository.get_id(validated_data.pole)
+            # A new date may move the attendance to the partition of another month
+            attendance_partitions.ensure_partitions([validated_data.attendance_date])
+            db.session.execute(
+                update(Attendance).where(Attendance.id == id).values(
+                    id_attendance=validated_data.id_attendance,
+                    id_client=validated_data.id_client,
+                    angel_id=angel_id,
+                    pole_id=pole_id,
+                    deadline=validated_data.deadline,
+                    attendance_date=validated_data.attendance_date,
+                    on_time=Attendance.is_on_time(validated_data.attendance_date, validated_data.deadline),
+                    attendance_day=Attendance.day_of(validated_data.attendance_date)
+                )
+            )
+            # Commit the db changes
+            db.session.commit()
+            attendance_record_cache.invalidate([id], id_attendance=[validated_data.id_attendance])
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def bulk_update_attendances(items):
+        """
+        Writes the given fields of many attendances, with one set-based UPDATE statement
+        by batch of rows sharing the same fields, along with the `on_time` and
+        `attendance_day` columns derived from their dates. Each attendance is updated
+        once, in a single transaction.
+
+        On PostgreSQL the new values are joined to the attendances as a
+        `UPDATE ... FROM (VALUES ...)` list. Other dialects, as the SQLite database used on
+        tests, run the same UPDATE once by row with `executemany`.
+
+        :param items: The validated items, each with the `id` of its attendance and the
+            fields to write, as loaded by the `AttendanceUpdateSchema`. The ids are unique.
+        :type items: list[dict]
+        :return: The ids of the attendances not found, which were not updated.
+        :rtype: set[int]
+        :raises SQLAlchemyError: If there is an error during the database operation.
+        """
+        try:
+            found = AttendanceRepository.get_existing_ids([item['id'] for item in items])
+            not_found = {item['id'] for item in items} - found
+            items = [item for item in items if item['id'] in found]
+
+            # The missing dimension records are created on their own connection, before the
+            # partition locks are taken by the session
+            angel_ids = angel_repository.get_ids({item['angel'] for item in items if 'angel' in item})
+            pole_ids = pole_repository.get_ids({item['pole'] for item in items if 'pole' in item})
+            # A new date may move an attendance to the partition of another month
+            attendance_partitions.ensure_partitions([item.get('attendance_date') for item in items])
+
+            # Rows by set of written columns, in the order of the ids so concurrent bulk
+            # updates lock the rows in the same order
+            batches = {}
+            for item in sorted(items, key=lambda item: item['id']):
+                row = {'id': item['id']}
+                for field, name in AttendanceRepository.BULK_UPDATE_FIELDS.items():
+                    if field in item:
+                        row[name] = item[field]
+                if 'angel_id' in row:
+                    row['angel_id'] = angel_ids[row['angel_id']]
+                if 'pole_id' in row:
+                    row['pole_id'] = pole_ids[row['pole_id']]
+                if 'attendance_date' in row:
+                    row['attendance_day'] = Attendance.day_of(row['attendance_date'])
+                batches.setdefault(tuple(row), []).append(row)
+
+            for names, rows in batches.items():
+                for start in range(0, len(rows), AttendanceRepository.BULK_BATCH_SIZE):
+                    AttendanceRepository.update_rows(names, rows[start:start + AttendanceRepository.BULK_BATCH_SIZE])
+            db.session.commit()
+            attendance_record_cache.invalidate([item['id'] for item in items], id_attendance=[
+                item['id_attendance'] for item in items if 'id_attendance' in item])
+            return not_found
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def update_rows(names, rows):
+        """
+        Runs the UPDATE of a batch of rows writing the same columns.
+
+        :param names: The `id` then the columns written, the same for every row.
+        :type names: tuple[str]
+        :param rows: The rows, by column name.
+        :type rows: list[dict]
+        :return: None
+        """
+        table = Attendance.__table__
+        written = [name for name in names if name != 'id']
+        if db.engine.dialect.name == 'postgresql':
+            source = values(*(column(name, table.c[name].type) for name in names), name='bulk_update').data(
+                [tuple(row[name] for name in names) for row in rows])
+            # A VALUES column of NULLs only is typed as text
+            new = {name: cast(source.c[name], table.c[name].type) for name in written}
+            statement = update(table).where(table.c.id == source.c.id)
+            parameters = None
+        else:
+            # The bound parameters cannot be named after the columns they are written to
+            new = {name: bindparam(f'new_{name}', type_=table.c[name].type) for name in written}
+            statement = update(table).where(table.c.id == bindparam('row_id'))
+            parameters = [{'row_id': row['id'], **{f'new_{name}': row[name] for name in written}} for row in rows]
+
+        if 'attendance_date' in new or 'deadline' in new:
+            # The date not written is the one of the row
+            attendance_date = new.get('attendance_date', table.c.attendance_date)
+            new['on_time'] = and_(attendance_date.isnot(None), attendance_date <= new.get('deadline', table.c.deadline))
+        db.session.execute(statement.values(**new), parameters)
+
+    @staticmethod
+    def get_existing_ids(ids):
+        """
+        Returns the ids of the given list that have an attendance.
+
+        :param ids: The ids of the attendances.
+        :type ids: list[int]
+        :return: The ids found.
+        :rtype: set[int]
+        """
+        found = set()
+        for start in range(0, len(ids), AttendanceRepository.BULK_BATCH_SIZE):
+            batch = ids[start:start + AttendanceRepository.BULK_BATCH_SIZE]
+            found.update(db.session.scalars(select(Attendance.id).where(Attendance.id.in_(batch))))
+        return found
+
     # Returning a simple register of Attendance on db
     @staticmethod
     def get_attendances():
@@ -81,6 +268,35 @@ class AttendanceRepository:
         # Using db.session.query due the Attendance.query.get are deprecated
         return db.session.scalars(select(Attendance).where(Attendance.id == id)).one()
 
+    # Keys the attendances can be fetched by in bulk
+    BULK_RETRIEVE_KEYS = ('id', 'id_attendance')
+
+    @staticmethod
+    def get_attendances_by_keys(key, keys):
+        """
+        Retrieves the attendances matching any of the given ids, or `id_attendance`
+        values, with a single query.
+
+        On PostgreSQL the values are bound as one array, `WHERE id = ANY(:keys)`, so the
+        statement is the same whatever the number of values. Other dialects use an IN list.
+
+        :param key: The column the values are matched on, 'id' or 'id_attendance'.
+        :type key: str
+        :param keys: The values to match.
+        :type keys: list[int]
+        :return: The attendances found, ordered by id.
+        :rtype: list[Attendance]
+        :raises ValueError: If the key is not one of `BULK_RETRIEVE_KEYS`.
+        """
+        if key not in AttendanceRepository.BULK_RETRIEVE_KEYS:
+            raise ValueError('INVALID_KEY ' + str(key))
+        column = getattr(Attendance, key)
+        if db.engine.dialect.name == 'postgresql':
+            condition = column == any_(bindparam('keys', list(keys), type_=ARRAY(Integer)))
+        else:
+            condition = column.in_(keys)
+        return db.session.scalars(select(Attendance).where(condition).order_by(Attendance.id)).all()
+
     # Returning a list of registers of Attendance on db by a period of time
     @staticmethod
     def get_attendances_by_period(start_date, end_date):
@@ -99,33 +315,40 @@ class AttendanceRepository:
             Example format: [(angel1, total_attendance1), (angel2, total_attendance2), ...]
         :rtype: list[tuple[Angel, int]]
         """
-        return (db.session.query(
-            Attendance.angel,
+        stats = db.session.query(
+            Attendance.angel_id.label('key'),
             func.count(Attendance.id).label('total_attendances'),
             func.min(Attendance.attendance_date).label('start_date'),
             func.max(Attendance.attendance_date).label('end_date')
         ).filter(
             Attendance.attendance_date >= start_date,
             Attendance.attendance_date <= end_date
-        ).group_by(Attendance.angel).all())
+        ).group_by(Attendance.angel_id).subquery()
+
+        return AttendanceRepository.join_dimension_names(stats, Angel, 'angel').all()
 
     @staticmethod
     def get_productivity_by_angel(angel):
 
-        query = db.session.query(
-            Attendance.angel,
+        angel_id = angel_repository.find_id(angel)
+        if angel_id is None:
+            return []
+
+        stats = db.session.query(
+            Attendance.angel_id.label('key'),
             func.count(Attendance.id).label('total_attendances'),
             func.min(Attendance.attendance_date).label('start_date'),
             func.max(Attendance.attendance_date).label('end_date'),
             func.sum(
                 case(
-                    (Attendance.attendance_date <= Attendance.deadline, 1),
+                    (Attendance.on_time, 1),
                     else_=0
                 )
             ).label('on_time_attendances')
-        ).filter(Attendance.angel == angel)
+        ).filter(Attendance.angel_id == angel_id).group_by(Attendance.angel_id).subquery()
+
+        return AttendanceRepository.join_dimension_names(stats, Angel, 'angel').all()
 
-        return query.group_by(Attendance.angel).all()
     # Returning a list of registers of Attendance on db by a period of time by a angel
     @staticmethod
     def get_productivity_by_period_with_angel(start_date, end_date, angel):
@@ -145,16 +368,20 @@ class AttendanceRepository:
             attendance count within the given period.
         :rtype: list[tuple[str, int]]
         """
-        query = db.session.query(
-            Attendance.angel,
+        angel_id = angel_repository.find_id(angel)
+        if angel_id is None:
+            return []
+
+        stats = db.session.query(
+            Attendance.angel_id.label('key'),
             func.count(Attendance.id).label('total_attendances')
         ).filter(
+            Attendance.angel_id == angel_id,
             Attendance.attendance_date >= start_date,
             Attendance.attendance_date <= end_date
-        )
-        query = query.filter(Attendance.angel == angel)
+        ).group_by(Attendance.angel_id).subquery()
 
-        return query.group_by(Attendance.angel).all()
+        return AttendanceRepository.join_dimension_names(stats, Angel, 'angel').all()
 
     # Querying productivity of a pole on db in a period
     @staticmethod
@@ -171,21 +398,198 @@ class AttendanceRepository:
         :return: A list of grouped query results containing logistics pole, total attendances, and on-time attendances
         :rtype: list
         """
+        pole_id = pole_repository.find_id(pole)
+        if pole_id is None:
+            return []
+
         # Query to count the attendances on time in a pole
+        stats = db.session.query(
+            Attendance.pole_id.label('key'),
+            func.count(Attendance.id).label('total_attendances'),
+            func.sum(
+                case(
+                    (Attendance.on_time, 1),
+                    else_=0
+                )
+            ).label('on_time_attendances')
+        ).filter(
+            Attendance.pole_id == pole_id,
+            Attendance.attendance_date >= start_date,
+            Attendance.attendance_date <= end_date
+        ).group_by(Attendance.pole_id).subquery()
+
+        return AttendanceRepository.join_dimension_names(stats, Pole, 'pole').all()
+
+    # Querying the productivity of all angels on db in a period, ranked and paginated
+    @staticmethod
+    def get_productivity_leaderboard(start_date, end_date, order_by='total_attendances', descending=True,
+                                     limit=None, offset=0):
+        """
+        Fetches the total, on-time and delayed attendances of every angel within a given
+        date range using a single grouped query. The ordering, the limit and the offset are
+        applied by the database, so only the requested page of angels is returned.
+
+        :param start_date: The start date of the period to filter attendance records (inclusive).
+        :type start_date: datetime.date
+        :param end_date: The end date of the period to filter attendance records (inclusive).
+        :type end_date: datetime.date
+        :param order_by: Name of the aggregated column used to rank the angels. One of the keys
+            of `LEADERBOARD_ORDER_COLUMNS`.
+        :type order_by: str
+        :param descending: Whether the ranking is in descending order.
+        :type descending: bool
+        :param limit: Maximum number of angels to return. When None, all angels are returned.
+        :type limit: int or None
+        :param offset: Number of ranked angels to skip.
+        :type offset: int
+        :return: A list of rows containing the angel, total attendances, on-time attendances,
+            delayed attendances and on-time percentage.
+        :rtype: list
+        """
+        stats = db.session.query(
+            Attendance.angel_id.label('key'),
+            func.count(Attendance.id).label('total_attendances'),
+            func.sum(
+                case(
+                    (Attendance.on_time, 1),
+                    else_=0
+                )
+            ).label('on_time_attendances')
+        ).filter(
+            Attendance.attendance_date >= start_date,
+            Attendance.attendance_date <= end_date
+        ).group_by(Attendance.angel_id).subquery()
+
+        columns = {
+            'angel': Angel.name,
+            'total_attendances': stats.c.total_attendances,
+            'on_time_attendances': stats.c.on_time_attendances,
+            'delayed_attendances': stats.c.total_attendances - stats.c.on_time_attendances,
+            'on_time_percentage': stats.c.on_time_attendances * 100.0 / stats.c.total_attendances,
+        }
+
         query = db.session.query(
-            Attendance.pole,
+            *(column.label(name) for name, column in columns.items())
+        ).join(stats, stats.c.key == Angel.id)
+
+        order_column = columns[order_by]
+        # The angel is used as tie-breaker to keep the pages stable
+        query = query.order_by(desc(order_column) if descending else order_column, Angel.name)
+
+        if limit is not None:
+            query = query.limit(limit)
+        if offset:
+            query = query.offset(offset)
+
+        return query.all()
+
+    @staticmethod
+    def date_bucket(column, bucket):
+        """
+        Builds the SQL expression truncating a date column to the start of its bucket.
+
+        PostgreSQL provides the `date_trunc` function. On other dialects, as the SQLite
+        database used on tests, the same truncation is done with the date functions.
+
+        :param column: The date column to be truncated.
+        :param bucket: The bucket size: 'day', 'week' or 'month'.
+        :type bucket: str
+        :return: The SQL expression of the bucket's first day.
+        :raises ValueError: If the bucket is not one of `DATE_BUCKETS`.
+        """
+        if bucket not in DATE_BUCKETS:
+            raise ValueError('INVALID_BUCKET ' + str(bucket))
+        if db.engine.dialect.name == 'postgresql':
+            # The bucket is rendered inline, so the SELECT and GROUP BY expressions are identical
+            return func.date_trunc(literal_column(f"'{bucket}'"), column)
+        if bucket == 'week':
+            # Monday on or before the date, as the date_trunc function
+            return func.date(column, '-6 days', 'weekday 1')
+        if bucket == 'month':
+            return func.date(column, 'start of month')
+        return func.date(column)
+
+    # Querying the productivity of angels or poles on db by time bucket in a period
+    @staticmethod
+    def get_productivity_series(start_date, end_date, bucket, group_by, group_value=None):
+        """
+        Fetches the total and on-time attendances of every angel or pole by day, week or
+        month within a given date range using a single grouped query.
+
+        :param start_date: The start date of the period to filter attendance records (inclusive).
+        :type start_date: datetime.date
+        :param end_date: The end date of the period to filter attendance records (inclusive).
+        :type end_date: datetime.date
+        :param bucket: The bucket size: 'day', 'week' or 'month'.
+        :type bucket: str
+        :param group_by: The grouping column, 'angel' or 'pole'.
+        :type group_by: str
+        :param group_value: When given, only the attendances of this angel or pole are fetched.
+        :type group_value: str or None
+        :return: A list of rows containing the group name, the bucket start, the total
+            attendances and the on-time attendances, ordered by group and bucket.
+        :rtype: list
+        """
+        key_column, dimension, dimension_repository = AttendanceRepository.dimension_of(group_by)
+        bucket_column = AttendanceRepository.date_bucket(Attendance.attendance_date, bucket)
+
+        query = db.session.query(
+            key_column.label('key'),
+            bucket_column.label('bucket_start'),
             func.count(Attendance.id).label('total_attendances'),
             func.sum(
                 case(
-                    (Attendance.attendance_date <= Attendance.deadline, 1),
+                    (Attendance.on_time, 1),
                     else_=0
                 )
             ).label('on_time_attendances')
         ).filter(
-            Attendance.pole == pole,
             Attendance.attendance_date >= start_date,
             Attendance.attendance_date <= end_date
         )
+        if group_value:
+            group_id = dimension_repository.find_id(group_value)
+            if group_id is None:
+                return []
+            query = query.filter(key_column == group_id)
+
+        stats = query.group_by(key_column, bucket_column).subquery()
+
+        return AttendanceRepository.join_dimension_names(stats, dimension, 'group').order_by(
+            dimension.name, stats.c.bucket_start).all()
+
+    @staticmethod
+    def dimension_of(name):
+        """
+        Returns the key column of the attendances, the dimension model and the dimension
+        repository of the 'angel' or 'pole' dimension.
 
-        return query.group_by(Attendance.pole).all()
+        :param name: The dimension name, 'angel' or 'pole'.
+        :type name: str
+        :return: A tuple with the key column, the dimension model and its repository.
+        :rtype: tuple
+        """
+        if name == 'angel':
+            return Attendance.angel_id, Angel, angel_repository
+        if name == 'pole':
+            return Attendance.pole_id, Pole, pole_repository
+        raise ValueError('INVALID_DIMENSION ' + str(name))
 
+    @staticmethod
+    def join_dimension_names(stats, dimension, label):
+        """
+        Joins the names of a dimension back on the rows of a query grouped by the
+        dimension key. The aggregates are computed on the small integer keys, and the
+        names are only joined on the final, already grouped, rows.
+
+        :param stats: The grouped subquery, returning the dimension key as its `key` column.
+        :param dimension: The dimension model, `Angel` or `Pole`.
+        :param label: The label of the name column on the result rows.
+        :type label: str
+        :return: The query returning the name and the other columns of the subquery.
+        :rtype: sqlalchemy.orm.Query
+        """
+        return db.session.query(
+            dimension.name.label(label),
+            *(column for column in stats.c if column.name != 'key')
+        ).join(stats, stats.c.key == dimension.id)
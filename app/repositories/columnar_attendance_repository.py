@@ -0,0 +1,398 @@
+import calendar
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, func, cast, BigInteger, Integer
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.models.dimension.dimension_model import Angel, Pole
+
+"""
+In-memory columnar snapshot of the attendances, used as the analytics backend when
+`ANALYTICS_BACKEND=columnar`.
+
+The attendances are kept as NumPy arrays, one per column: the dates as int64 epoch
+seconds and the angel and pole as their dimension keys, which are small integer codes.
+The productivity queries are answered with vectorized masks and `bincount`, without a
+round trip to the database. The snapshot is refreshed incrementally from the rows
+updated since the last sync.
+"""
+
+# Epoch value of the missing dates. Lower than any date, so it never matches a period
+NULL_EPOCH = np.iinfo(np.int64).min
+
+# Rows fetched by batch when loading the snapshot
+FETCH_BATCH_SIZE = 100000
+
+# Rows updated up to this delay before the last sync are fetched again, so a row
+# committed late with an older `updated_at` is not missed
+SYNC_OVERLAP = timedelta(seconds=60)
+
+SNAPSHOT_COLUMNS = ('id', 'angel', 'pole', 'attendance_date', 'deadline')
+
+PeriodRow = namedtuple('PeriodRow', ['angel', 'total_attendances', 'start_date', 'end_date'])
+AngelRow = namedtuple('AngelRow', ['angel', 'total_attendances', 'start_date', 'end_date', 'on_time_attendances'])
+AngelPeriodRow = namedtuple('AngelPeriodRow', ['angel', 'total_attendances'])
+PoleRow = namedtuple('PoleRow', ['pole', 'total_attendances', 'on_time_attendances'])
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(value):
+    """
+    Converts a naive datetime to epoch seconds, as the database does for the snapshot.
+
+    :param value: The datetime to convert.
+    :type value: datetime.datetime or datetime.date
+    :return: The epoch seconds.
+    :rtype: int
+    """
+    return calendar.timegm(value.timetuple())
+
+
+def from_epoch(value):
+    """
+    Converts epoch seconds of the snapshot back to a naive datetime.
+
+    :param value: The epoch seconds, or `NULL_EPOCH`.
+    :type value: int
+    :return: The datetime, or None for `NULL_EPOCH`.
+    :rtype: datetime.datetime or None
+    """
+    if value == NULL_EPOCH:
+        return None
+    return _EPOCH + timedelta(seconds=int(value))
+
+
+class ColumnarSnapshot:
+    """
+    The arrays of the snapshot. The arrays are allocated with spare capacity, so the new
+    rows are appended without copying the existing ones; only the first `size` values
+    are valid. The rows are sorted by id.
+
+    :ivar columns: The arrays of the `SNAPSHOT_COLUMNS` and the `on_time` flags.
+    :type columns: dict[str, numpy.ndarray]
+    :ivar size: Number of valid rows.
+    :type size: int
+    """
+
+    def __init__(self, columns, size):
+        self.columns = columns
+        self.size = size
+
+    def __getattr__(self, name):
+        try:
+            return self.columns[name][:self.size]
+        except KeyError:
+            raise AttributeError(name)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.columns.values())
+
+
+class ColumnarAttendanceRepository:
+    """
+    Answers the productivity queries of `AttendanceRepository` from the in-memory
+    snapshot. The methods have the same signatures and return rows with the same
+    attributes, so `AnalyticsService` uses either backend.
+
+    Each process keeps its own snapshot. When the application is preloaded by gunicorn,
+    the snapshot loaded by the master process is shared with the workers until their
+    first refresh.
+
+    :ivar refresh_interval: Minimum number of seconds between two syncs with the database.
+    :type refresh_interval: float
+    """
+
+    def __init__(self, refresh_interval=5.0):
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._last_sync = None
+        self._synced_at = None
+        self._angel_ids = {}
+        self._angel_names = {}
+        self._pole_ids = {}
+        self._pole_names = {}
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def refresh(self, force=False):
+        """
+        Syncs the snapshot with the database if the refresh interval has elapsed. The
+        first sync loads every attendance; the next ones only load the attendances
+        updated since the previous sync.
+
+        While a sync is running the other threads keep answering from the current
+        snapshot, except on the first sync, which they wait for.
+
+        :param force: Syncs even if the refresh interval has not elapsed.
+        :type force: bool
+        :return: None
+        """
+        if not force and self._synced_at is not None \
+                and time.monotonic() - self._synced_at < self.refresh_interval:
+            return
+        if not self._lock.acquire(blocking=self._snapshot is None):
+            return
+        try:
+            if self._snapshot is not None and not force \
+                    and time.monotonic() - self._synced_at < self.refresh_interval:
+                return
+            self._sync()
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """
+        Drops the snapshot, so the next refresh loads every attendance again.
+
+        :return: None
+        """
+        with self._lock:
+            self._snapshot = None
+            self._last_sync = None
+            self._synced_at = None
+
+    def _sync(self):
+        # The watermark is read first, so the rows updated while loading are fetched again
+        watermark = db.session.execute(select(func.max(Attendance.updated_at))).scalar()
+        self._load_dimensions()
+
+        query = select(
+            Attendance.id,
+            Attendance.angel_id,
+            Attendance.pole_id,
+            self.epoch_seconds(Attendance.attendance_date),
+            self.epoch_seconds(Attendance.deadline)
+        ).order_by(Attendance.id)
+        if self._last_sync is not None:
+            query = query.where(Attendance.updated_at > self._last_sync - SYNC_OVERLAP)
+
+        batches = [np.array(rows, dtype=np.int64) for rows in self._fetch(query)]
+        rows = np.concatenate(batches) if batches else np.empty((0, len(SNAPSHOT_COLUMNS)), dtype=np.int64)
+
+        self._snapshot = self._merge(self._snapshot, rows)
+        self._last_sync = watermark or self._last_sync
+        self._synced_at = time.monotonic()
+
+    @staticmethod
+    def _fetch(query):
+        """
+        Runs the query on a DB-API cursor of the session connection and yields its rows
+        by batches of plain tuples, skipping the SQLAlchemy row objects. On PostgreSQL a
+        server side cursor is used, so the whole result is never held by the client.
+        """
+        connection = db.session.connection()
+        statement = str(query.compile(connection, compile_kwargs={'literal_binds': True}))
+        dbapi_connection = connection.connection.dbapi_connection
+        if connection.dialect.name == 'postgresql':
+            cursor = dbapi_connection.cursor(name='columnar_snapshot')
+            cursor.itersize = FETCH_BATCH_SIZE
+        else:
+            cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(statement)
+            while rows := cursor.fetchmany(FETCH_BATCH_SIZE):
+                yield rows
+        finally:
+            cursor.close()
+
+    def _load_dimensions(self):
+        angels = db.session.execute(select(Angel.id, Angel.name)).all()
+        poles = db.session.execute(select(Pole.id, Pole.name)).all()
+        self._angel_names = dict(angels)
+        self._angel_ids = {name: id for id, name in angels}
+        self._pole_names = dict(poles)
+        self._pole_ids = {name: id for id, name in poles}
+
+    @staticmethod
+    def epoch_seconds(column):
+        """
+        Builds the SQL expression converting a datetime column to epoch seconds, with
+        `NULL_EPOCH` for the missing dates.
+
+        :param column: The datetime column.
+        :return: The SQL expression.
+        """
+        if db.engine.dialect.name == 'sqlite':
+            epoch = cast(func.strftime('%s', column), Integer)
+        else:
+            epoch = cast(func.floor(func.extract('epoch', column)), BigInteger)
+        return func.coalesce(epoch, int(NULL_EPOCH))
+
+    @staticmethod
+    def _merge(snapshot, rows):
+        """
+        Upserts the fetched rows, sorted by id, into the snapshot. The new rows are
+        appended to the spare capacity of the arrays, reallocated when full. The rows
+        already on the snapshot are updated on copies of the arrays, as the readers use
+        the arrays of the published snapshot without the lock.
+        """
+        on_time = (rows[:, 3] != NULL_EPOCH) & (rows[:, 3] <= rows[:, 4])
+        if snapshot is None:
+            columns = {name: rows[:, i].copy() for i, name in enumerate(SNAPSHOT_COLUMNS)}
+            columns['angel'] = columns['angel'].astype(np.int32)
+            columns['pole'] = columns['pole'].astype(np.int32)
+            columns['on_time'] = on_time
+            return ColumnarSnapshot(columns, len(rows))
+
+        ids = snapshot.id
+        positions = np.searchsorted(ids, rows[:, 0])
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == rows[found, 0]
+
+        columns = snapshot.columns
+        updated = positions[found]
+        if len(updated):
+            # A published snapshot never changes, a query running during the sync would
+            # mix the old and new values of a row
+            columns = {name: array.copy() for name, array in columns.items()}
+            for i, name in enumerate(SNAPSHOT_COLUMNS[1:], start=1):
+                columns[name][updated] = rows[found, i]
+            columns['on_time'][updated] = on_time[found]
+
+        new_rows, new_on_time = rows[~found], on_time[~found]
+        if not len(new_rows):
+            return ColumnarSnapshot(columns, snapshot.size) if len(updated) else snapshot
+
+        size = snapshot.size + len(new_rows)
+        capacity = len(columns['id'])
+        if size > capacity:
+            capacity = max(size, capacity + capacity // 2)
+            grown = {}
+            for name, array in columns.items():
+                grown[name] = np.empty(capacity, dtype=array.dtype)
+                grown[name][:snapshot.size] = array[:snapshot.size]
+            columns = grown
+        for i, name in enumerate(SNAPSHOT_COLUMNS):
+            columns[name][snapshot.size:size] = new_rows[:, i]
+        columns['on_time'][snapshot.size:size] = new_on_time
+
+        if snapshot.size and new_rows[0, 0] < ids[-1]:
+            # Rows committed out of id order, the ids are sorted again for the lookups
+            order = np.argsort(columns['id'][:size], kind='stable')
+            columns = {name: array[:size][order] for name, array in columns.items()}
+
+        # A new snapshot object is published, so the readers never see a partial size
+        return ColumnarSnapshot(columns, size)
+
+    def _view(self):
+        if self._snapshot is None:
+            self.refresh(force=True)
+        return self._snapshot
+
+    def get_attendances_by_period(self, start_date, end_date):
+        """
+        Counts the attendances of each angel within a date range, along with the first
+        and last attendance dates of each angel.
+
+        :param start_date: The start of the period (inclusive).
+        :type start_date: datetime.datetime
+        :param end_date: The end of the period (inclusive).
+        :type end_date: datetime.datetime
+        :return: The rows of the angels with attendances in the period, by angel name.
+        :rtype: list[PeriodRow]
+        """
+        snapshot = self._view()
+        dates = snapshot.attendance_date
+        mask = (dates >= to_epoch(start_date)) & (dates <= to_epoch(end_date))
+        angels = snapshot.angel[mask]
+        dates = dates[mask]
+
+        size = int(angels.max()) + 1 if len(angels) else 0
+        totals = np.bincount(angels, minlength=size)
+        first = np.full(size, np.iinfo(np.int64).max)
+        last = np.full(size, NULL_EPOCH)
+        np.minimum.at(first, angels, dates)
+        np.maximum.at(last, angels, dates)
+
+        rows = [PeriodRow(self._angel_names[key], int(totals[key]), from_epoch(first[key]), from_epoch(last[key]))
+                for key in np.flatnonzero(totals)]
+        return sorted(rows, key=lambda row: row.angel)
+
+    def get_productivity_by_angel(self, angel):
+        """
+        Counts all the attendances of an angel, its on-time attendances and its first
+        and last attendance dates.
+
+        :param angel: The angel name.
+        :type angel: str
+        :return: A single row, or an empty list if the angel has no attendances.
+        :rtype: list[AngelRow]
+        """
+        snapshot = self._view()
+        key = self._angel_ids.get(angel)
+        if key is None:
+            return []
+
+        mask = snapshot.angel == key
+        total = int(np.count_nonzero(mask))
+        if not total:
+            return []
+        dates = snapshot.attendance_date[mask]
+        dates = dates[dates != NULL_EPOCH]
+        start_date = from_epoch(dates.min()) if len(dates) else None
+        end_date = from_epoch(dates.max()) if len(dates) else None
+        on_time = int(np.count_nonzero(snapshot.on_time[mask]))
+        return [AngelRow(angel, total, start_date, end_date, on_time)]
+
+    def get_productivity_by_period_with_angel(self, start_date, end_date, angel):
+        """
+        Counts the attendances of an angel within a date range.
+
+        :param start_date: The start of the period (inclusive).
+        :type start_date: datetime.datetime
+        :param end_date: The end of the period (inclusive).
+        :type end_date: datetime.datetime
+        :param angel: The angel name.
+        :type angel: str
+        :return: A single row, or an empty list if the angel has no attendances in the period.
+        :rtype: list[AngelPeriodRow]
+        """
+        snapshot = self._view()
+        key = self._angel_ids.get(angel)
+        if key is None:
+            return []
+
+        dates = snapshot.attendance_date
+        mask = (snapshot.angel == key) & (dates >= to_epoch(start_date)) & (dates <= to_epoch(end_date))
+        total = int(np.count_nonzero(mask))
+        return [AngelPeriodRow(angel, total)] if total else []
+
+    def get_productivity_by_logistics_pole_and_period(self, pole, start_date, end_date):
+        """
+        Counts the attendances and the on-time attendances of a pole within a date range.
+
+        :param pole: The pole name.
+        :type pole: str
+        :param start_date: The start of the period (inclusive).
+        :type start_date: datetime.datetime
+        :param end_date: The end of the period (inclusive).
+        :type end_date: datetime.datetime
+        :return: A single row, or an empty list if the pole has no attendances in the period.
+        :rtype: list[PoleRow]
+        """
+        snapshot = self._view()
+        key = self._pole_ids.get(pole)
+        if key is None:
+            return []
+
+        dates = snapshot.attendance_date
+        mask = (snapshot.pole == key) & (dates >= to_epoch(start_date)) & (dates <= to_epoch(end_date))
+        total = int(np.count_nonzero(mask))
+        if not total:
+            return []
+        on_time = int(np.count_nonzero(snapshot.on_time[mask]))
+        return [PoleRow(pole, total, on_time)]
+
+
+columnar_attendance_repository = ColumnarAttendanceRepository(float(os.environ.get('ANALYTICS_REFRESH_SECONDS', 5)))
@@ -0,0 +1,101 @@
+import threading
+
+from sqlalchemy import select, insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config.config import db
+from app.models.dimension.dimension_model import Angel, Pole
+
+
+class DimensionRepository:
+    """
+    Resolves the names of a dimension table (angels or poles) to their integer keys.
+
+    The keys are kept in an in-process name -> key cache. A dimension record is never
+    updated nor deleted, so a cached key never becomes stale. Missing names are inserted
+    through a separate connection committed right away, so a rolled back attendance
+    transaction cannot leave a key in the cache that does not exist on the database.
+
+    :ivar model: The dimension model, `Angel` or `Pole`.
+    :type model: type
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._ids_by_name = {}
+        self._lock = threading.Lock()
+
+    def get_ids(self, names):
+        """
+        Returns the keys of the given names, creating the dimension records of the
+        names that do not exist yet.
+
+        :param names: The names to resolve.
+        :type names: Iterable[str]
+        :return: A dictionary mapping each name to its key.
+        :rtype: dict[str, int]
+        """
+        names = set(names)
+        missing = names.difference(self._ids_by_name)
+        if missing:
+            self._create_missing(missing)
+        return {name: self._ids_by_name[name] for name in names}
+
+    def get_id(self, name):
+        """
+        Returns the key of a name, creating its dimension record if it does not exist yet.
+
+        :param name: The name to resolve.
+        :type name: str
+        :return: The key of the name.
+        :rtype: int
+        """
+        return self.get_ids((name,))[name]
+
+    def find_id(self, name):
+        """
+        Returns the key of a name without creating its dimension record. Used to filter
+        the attendances by name.
+
+        :param name: The name to look up.
+        :type name: str
+        :return: The key of the name, or None if no record has this name.
+        :rtype: int or None
+        """
+        if name in self._ids_by_name:
+            return self._ids_by_name[name]
+        id = db.session.execute(select(self.model.id).where(self.model.name == name)).scalar()
+        if id is not None:
+            with self._lock:
+                self._ids_by_name[name] = id
+        return id
+
+    def clear(self):
+        """
+        Empties the cache, for instance after the dimension tables are recreated.
+
+        :return: None
+        """
+        with self._lock:
+            self._ids_by_name.clear()
+
+    def _create_missing(self, names):
+        table = self.model.__table__
+        rows = [{'name': name} for name in names]
+        with db.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+                connection.execute(dialect_insert(table).on_conflict_do_nothing(index_elements=['name']), rows)
+            else:
+                existing = set(connection.execute(select(table.c.name).where(table.c.name.in_(names))).scalars())
+                new_rows = [row for row in rows if row['name'] not in existing]
+                if new_rows:
+                    connection.execute(insert(table), new_rows)
+            ids = connection.execute(select(table.c.name, table.c.id).where(table.c.name.in_(names))).all()
+        with self._lock:
+            self._ids_by_name.update(ids)
+
+
+angel_repository = DimensionRepository(Angel)
+pole_repository = DimensionRepository(Pole)
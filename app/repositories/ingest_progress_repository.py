@@ -0,0 +1,105 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.config.config import db
+from app.models.ingest_progress_model import IngestProgress, INGEST_RUNNING
+
+
+# Repository class to handle the ingest_progress db table
+class IngestProgressRepository:
+
+    @staticmethod
+    def start(file_hash, file_name, size_bytes):
+        """
+        Records the start of the ingest of a file, on the transaction of the current
+        session. The counters of a former run of the same file, which failed, are reset.
+
+        :param file_hash: Hash of the file.
+        :type file_hash: str
+        :param file_name: Path of the file.
+        :type file_name: str
+        :param size_bytes: Size of the file.
+        :type size_bytes: int
+        :return: The progress record.
+        :rtype: IngestProgress
+        """
+        progress = IngestProgressRepository.get_by_file_hash(file_hash)
+        if progress is None:
+            progress = IngestProgress(file_hash=file_hash)
+            db.session.add(progress)
+        now = datetime.now()
+        progress.file_name = file_name
+        progress.status = INGEST_RUNNING
+        progress.size_bytes = size_bytes
+        progress.bytes_read = progress.rows_read = 0
+        progress.rows_accepted = progress.rows_rejected = progress.rows_inserted = 0
+        progress.error = None
+        progress.started_at = progress.updated_at = now
+        progress.finished_at = None
+        return progress
+
+    @staticmethod
+    def update(file_hash, **counters):
+        """
+        Writes the counters of an ingest, on the transaction of the current session, so
+        they are committed along with the chunk they count.
+
+        :param file_hash: Hash of the file.
+        :type file_hash: str
+        :param counters: The new values of the counters, as `rows_read`.
+        :type counters: int
+        :return: None
+        """
+        db.session.execute(
+            IngestProgress.__table__.update().where(IngestProgress.file_hash == file_hash)
+            .values(updated_at=datetime.now(), **counters)
+        )
+
+    @staticmethod
+    def finish(file_hash, status, error=None):
+        """
+        Records the end of an ingest, on the transaction of the current session.
+
+        :param file_hash: Hash of the file.
+        :type file_hash: str
+        :param status: `completed` or `failed`.
+        :type status: str
+        :param error: The error of a failed ingest.
+        :type error: str or None
+        :return: None
+        """
+        now = datetime.now()
+        db.session.execute(
+            IngestProgress.__table__.update().where(IngestProgress.file_hash == file_hash)
+            .values(status=status, error=error, updated_at=now, finished_at=now)
+        )
+
+    @staticmethod
+    def get_by_file_hash(file_hash):
+        """
+        Fetches the progress of the ingest of a file.
+
+        :param file_hash: Hash of the file.
+        :type file_hash: str
+        :return: The progress record, or None if the file was never ingested.
+        :rtype: IngestProgress or None
+        """
+        return db.session.scalars(select(IngestProgress).where(IngestProgress.file_hash == file_hash)).first()
+
+    @staticmethod
+    def get_recent(limit, status=None):
+        """
+        Fetches the most recently started ingests.
+
+        :param limit: The maximum number of records.
+        :type limit: int
+        :param status: Keeps the ingests of a status only, when given.
+        :type status: str or None
+        :return: The progress records, the most recently started first.
+        :rtype: list[IngestProgress]
+        """
+        query = select(IngestProgress).order_by(IngestProgress.started_at.desc(), IngestProgress.id.desc())
+        if status is not None:
+            query = query.where(IngestProgress.status == status)
+        return db.session.scalars(query.limit(limit)).all()
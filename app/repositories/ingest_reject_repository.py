@@ -0,0 +1,82 @@
+from sqlalchemy import func, insert, select
+
+from app.config.config import db
+from app.models.ingest_reject_model import IngestReject
+
+
+# Repository class to handle the ingest_rejects db table
+class IngestRejectRepository:
+
+    @staticmethod
+    def add_rejects(file_hash, rejects, sep=';'):
+        """
+        Writes rejected rows to the quarantine table with a single bulk insert, on the
+        transaction of the current session, so they are committed along with the
+        accepted rows of the same chunk.
+
+        :param file_hash: Hash of the file of the rows.
+        :type file_hash: str
+        :param rejects: The rejected rows.
+        :type rejects: list[Reject]
+        :param sep: The separator the values of a row are joined with.
+        :type sep: str
+        :return: None
+        """
+        if not rejects:
+            return
+        db.session.execute(insert(IngestReject.__table__), [
+            {'file_hash': file_hash, 'line': reject.line, 'error_code': reject.error_code,
+             'raw_row': IngestRejectRepository.raw_row(reject.row, sep)}
+            for reject in rejects
+        ])
+
+    @staticmethod
+    def raw_row(row, sep=';'):
+        """
+        Joins the values of a row as read back into a line of the file. The missing
+        values are left empty, and the ids parsed as floats are written as integers.
+
+        :param row: The values of the row, by column.
+        :type row: dict
+        :param sep: The separator of the values.
+        :type sep: str
+        :return: The line of the row, without its line break.
+        :rtype: str
+        """
+        values = []
+        for value in row.values():
+            if value is None or value != value:
+                value = ''
+            elif isinstance(value, float) and value.is_integer():
+                value = int(value)
+            values.append(str(value))
+        return sep.join(values)
+
+    @staticmethod
+    def get_rejects_by_file_hash(file_hash):
+        """
+        Fetches the rejected rows of a file, ordered by line.
+
+        :param file_hash: Hash of the file.
+        :type file_hash: str
+        :return: The rejected rows of the file.
+        :rtype: list[IngestReject]
+        """
+        return db.session.scalars(
+            select(IngestReject).where(IngestReject.file_hash == file_hash).order_by(IngestReject.line)
+        ).all()
+
+    @staticmethod
+    def count_rejects_by_error_code(file_hash):
+        """
+        Counts the rejected rows of a file by reason.
+
+        :param file_hash: Hash of the file.
+        :type file_hash: str
+        :return: The number of rejected rows by error code.
+        :rtype: dict[str, int]
+        """
+        return dict(db.session.execute(
+            select(IngestReject.error_code, func.count()).where(IngestReject.file_hash == file_hash)
+            .group_by(IngestReject.error_code)
+        ).all())
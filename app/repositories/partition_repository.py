@@ -0,0 +1,218 @@
+import threading
+from datetime import date, timedelta
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.utils.date_utils import truncate_date
+
+
+class PartitionRepository:
+    """
+    Manages the monthly range partitions of a table partitioned by a date column on
+    PostgreSQL. On the other databases, as SQLite, the table is a single regular table
+    and every method is a no-op.
+
+    Each month is stored on its own partition, named `<table>_y<year>m<month>`. The rows
+    without a date, or with a date on a month without partition, are kept on the
+    `<table>_default` partition. Before writing rows, `ensure_partitions` creates the
+    partitions of their months, moving the rows of these months out of the default
+    partition, so the range queries on the date column only scan the relevant months.
+
+    :ivar table: The partitioned table.
+    :type table: sqlalchemy.Table
+    :ivar column: The name of the date column partitioning the table.
+    :type column: str
+    """
+
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+        self._months = set()
+        self._lock = threading.Lock()
+
+    @property
+    def default_partition(self):
+        return f'{self.table.name}_default'
+
+    def partition_name(self, month):
+        """
+        Returns the name of the partition of a month.
+
+        :param month: The first day of the month.
+        :type month: datetime.date
+        :return: The partition name, for instance `attendances_y2021m06`.
+        :rtype: str
+        """
+        return f'{self.table.name}_y{month.year:04d}m{month.month:02d}'
+
+    @staticmethod
+    def month_range(month):
+        """
+        Returns the bounds of the partition of a month, the first day of the month
+        included and the first day of the next month excluded.
+
+        :param month: The first day of the month.
+        :type month: datetime.date
+        :return: The lower and upper bounds of the partition.
+        :rtype: tuple[datetime.date, datetime.date]
+        """
+        return month, (month + timedelta(days=31)).replace(day=1)
+
+    @staticmethod
+    def is_supported(connection):
+        return connection.dialect.name == 'postgresql'
+
+    def is_partitioned(self, connection):
+        """
+        Tells whether the table is a partitioned table on the database.
+
+        :param connection: An open connection.
+        :type connection: sqlalchemy.engine.Connection
+        :return: True if the table is partitioned.
+        :rtype: bool
+        """
+        if not self.is_supported(connection):
+            return False
+        return connection.execute(db.text(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))'
+        ), {'table': self.table.name}).scalar()
+
+    def ensure_partitions(self, dates, connection=None):
+        """
+        Creates the missing partitions of the months of the given dates.
+
+        The partitions are created on the connection of the current session by default,
+        so they are committed along with the rows written to them. The months known to
+        have a partition are cached in process, so the catalog is only queried for the
+        months not seen yet.
+
+        :param dates: The dates of the rows to be written. None values are ignored.
+        :type dates: Iterable[datetime.date or datetime.datetime or None]
+        :param connection: The connection to create the partitions on. Defaults to the
+            connection of the current session.
+        :type connection: sqlalchemy.engine.Connection or None
+        :return: The months whose partition was created.
+        :rtype: list[datetime.date]
+        """
+        months = {truncate_date(value, 'month') for value in dates if value is not None}
+        missing = months.difference(self._months)
+        if not missing:
+            return []
+
+        if connection is None:
+            connection = db.session.connection()
+        if not self.is_partitioned(connection):
+            return []
+
+        # Serialize the partition creation between the workers
+        connection.execute(db.text('SELECT pg_advisory_xact_lock(hashtext(:table))'), {'table': self.table.name})
+        created = []
+        for month in sorted(missing):
+            if connection.execute(db.text('SELECT to_regclass(:name)'),
+                                  {'name': self.partition_name(month)}).scalar() is None:
+                self.create_partition(connection, month)
+                created.append(month)
+            else:
+                with self._lock:
+                    self._months.add(month)
+        return created
+
+    def create_partition(self, connection, month):
+        """
+        Creates the partition of a month and moves to it the rows of the month stored on
+        the default partition.
+
+        :param connection: An open connection, inside a transaction.
+        :type connection: sqlalchemy.engine.Connection
+        :param month: The first day of the month.
+        :type month: datetime.date
+        :return: None
+        """
+        name = self.partition_name(month)
+        start, end = self.month_range(month)
+        connection.execute(db.text(
+            f'CREATE TABLE {name} (LIKE {self.table.name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        ))
+        connection.execute(db.text(f'ALTER TABLE {name} ADD PRIMARY KEY (id)'))
+        connection.execute(db.text(
+            f'WITH moved AS (DELETE FROM {self.default_partition} '
+            f'WHERE {self.column} >= :start AND {self.column} < :end RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'
+        ), {'start': start, 'end': end})
+        connection.execute(db.text(
+            f"ALTER TABLE {self.table.name} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+
+    def create_partitioned_table(self, connection, name, months=()):
+        """
+        Creates a table with the columns and foreign keys of the model, partitioned by
+        range of the date column, along with its default partition and the partitions of
+        the given months.
+
+        PostgreSQL requires the primary key of a partitioned table to include the
+        partitioning column, which is nullable here, so the primary key on `id` is
+        declared on each partition instead. The ids stay unique, since all partitions
+        share the sequence of the table.
+
+        :param connection: An open connection, inside a transaction.
+        :type connection: sqlalchemy.engine.Connection
+        :param name: The name of the table to be created.
+        :type name: str
+        :param months: The first days of the months whose partition must be created.
+        :type months: Iterable[datetime.date]
+        :return: None
+        """
+        compiler = connection.dialect.ddl_compiler(connection.dialect, None)
+        definitions = [compiler.get_column_specification(column) for column in self.table.columns]
+        for constraint in self.table.foreign_key_constraints:
+            # Named after the final table, as PostgreSQL names the keys of a regular table
+            columns = ', '.join(constraint.column_keys)
+            referred = ', '.join(element.column.name for element in constraint.elements)
+            definitions.append(
+                f'CONSTRAINT {self.table.name}_{"_".join(constraint.column_keys)}_fkey FOREIGN KEY ({columns}) '
+                f'REFERENCES {constraint.referred_table.name} ({referred})'
+            )
+        connection.execute(db.text(
+            f'CREATE TABLE {name} ({", ".join(definitions)}) PARTITION BY RANGE ({self.column})'
+        ))
+        connection.execute(db.text(
+            f'CREATE TABLE {self.default_partition} PARTITION OF {name} (PRIMARY KEY (id)) DEFAULT'
+        ))
+        for month in sorted(set(months)):
+            start, end = self.month_range(month)
+            connection.execute(db.text(
+                f"CREATE TABLE {self.partition_name(month)} PARTITION OF {name} (PRIMARY KEY (id)) "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+
+    def upcoming_months(self, months_ahead, today=None):
+        """
+        Returns the current month and the given number of following months.
+
+        :param months_ahead: Number of months after the current one.
+        :type months_ahead: int
+        :param today: The current date, defaults to today.
+        :type today: datetime.date or None
+        :return: The first days of the months.
+        :rtype: list[datetime.date]
+        """
+        month = truncate_date(today or date.today(), 'month')
+        months = [month]
+        for _ in range(months_ahead):
+            month = self.month_range(month)[1]
+            months.append(month)
+        return months
+
+    def clear(self):
+        """
+        Empties the cache of the months known to have a partition, for instance after
+        the table is recreated.
+
+        :return: None
+        """
+        with self._lock:
+            self._months.clear()
+
+
+attendance_partitions = PartitionRepository(Attendance.__table__, 'attendance_date')
@@ -2,6 +2,9 @@ from .analytics_routes import productivity_blueprint
 from .auth_routes import auth_blueprint
 from .general_routes import general_blueprint
 from .attendance_routes import attendance_blueprint
+from .metrics_routes import metrics_blueprint
+from .admin_routes import admin_blueprint
+from .ingest_routes import ingest_blueprint
 
 """
 This method is used to register routes as blueprint
@@ -10,4 +13,7 @@ def register_routes(api):
     api.register_blueprint(general_blueprint)
     api.register_blueprint(attendance_blueprint, url_prefix="/api/attendances")
     api.register_blueprint(productivity_blueprint, url_prefix="/api/analytics")
-    api.register_blueprint(auth_blueprint)
\ No newline at end of file
+    api.register_blueprint(auth_blueprint)
+    api.register_blueprint(metrics_blueprint)
+    api.register_blueprint(admin_blueprint, url_prefix="/api/admin")
+    api.register_blueprint(ingest_blueprint, url_prefix="/api/ingest")
\ No newline at end of file
@@ -0,0 +1,39 @@
+from flask_smorest import Blueprint
+
+from app.controllers.admin_controller import AdminController
+from app.utils.auth_utils import admin_required
+
+admin_blueprint = Blueprint('admin', __name__, url_prefix="/api/admin",
+                            description="Diagnostic endpoints of the admin api_clients")
+
+# Routes for the diagnostic endpoints, reserved to the ADMIN_API_CLIENTS
+@admin_blueprint.route('/slow_queries', methods=['GET'])
+@admin_required()
+def get_slow_queries():
+    """
+    Retrieves the slow statements recorded by the worker process, the most recent
+    first, with their bound parameters, the repository method that ran them and, on
+    PostgreSQL, their plan.
+
+    Accepts an optional `limit` on the number of statements returned.
+
+    :return: The slow statements of the slow query log.
+    :rtype: flask.Response
+    """
+    return AdminController.get_slow_queries()
+
+@admin_blueprint.route('/profile', methods=['GET'])
+@admin_required()
+def get_profile():
+    """
+    Samples the stacks of the threads of the worker process for a few seconds and
+    returns them in the collapsed format of the flame graph tools.
+
+    Accepts the `seconds` of the profile, the `interval_ms` between two samples and
+    `idle=1` to keep the samples of the idle threads. The request waits for the end
+    of the profile.
+
+    :return: The collapsed stacks as plain text.
+    :rtype: flask.Response
+    """
+    return AdminController.get_profile()
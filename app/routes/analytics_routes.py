@@ -78,4 +78,34 @@ def get_productivity_by_logistics_pole_and_period():
     :return: Productivity data filtered by logistics pole and period.
     :rtype: Response
     """
-    return AnalyticsController.get_productivity_by_logistics_pole_and_period()
\ No newline at end of file
+    return AnalyticsController.get_productivity_by_logistics_pole_and_period()
+
+@productivity_blueprint.route('/productivity_leaderboard/', methods=['GET'])
+@jwt_required()
+def get_productivity_leaderboard():
+    """
+    Retrieves the productivity ranking of every angel within a period.
+
+    Accepts the `start_date` and `end_date` of the period, the `order_by` ranking
+    column, the `top_k` cut and the `page`/`per_page` pagination parameters. It
+    delegates the functionality to the AnalyticsController.
+
+    :return: The ranked productivity data of the angels.
+    :rtype: Response
+    """
+    return AnalyticsController.get_productivity_leaderboard()
+
+@productivity_blueprint.route('/productivity_series/', methods=['GET'])
+@jwt_required()
+def get_productivity_series():
+    """
+    Retrieves the productivity of the angels or poles by day, week or month within a period.
+
+    Accepts the `start_date` and `end_date` of the period, the `bucket` size, the
+    `group_by` column and an optional `angel` or `pole` filter. It delegates the
+    functionality to the AnalyticsController.
+
+    :return: The productivity series with empty buckets filled with zeros.
+    :rtype: Response
+    """
+    return AnalyticsController.get_productivity_series()
@@ -70,6 +70,33 @@ def update_attendance(id):
     """
     return AttendanceController.update_attendance(request.json, id)
 
+@attendance_blueprint.route('/bulk', methods=['PATCH'])
+@jwt_required()
+def bulk_update_attendances():
+    """
+    Updates many attendance records with a single request, as the batches of
+    corrections to `attendance_date`. The JSON payload is a list of items, each with
+    the `id` of its attendance and the fields to write, the other fields being kept.
+
+    :return: The result of each item, in the order of the request.
+    :rtype: flask.Response
+    """
+    return AttendanceController.bulk_update_attendances(request.json)
+
+@attendance_blueprint.route('/bulk_retrieve', methods=['POST'])
+@jwt_required()
+def bulk_retrieve_attendances():
+    """
+    Retrieves many attendance records with a single request, as the reconciliation
+    jobs do. The JSON payload has either a list of `ids` or a list of `id_attendance`
+    values, sent on the body as thousands of ids do not fit on a request line.
+
+    :return: An entry by requested value, in the order of the request, with the
+        attendance or marked as not found.
+    :rtype: flask.Response
+    """
+    return AttendanceController.bulk_retrieve_attendances(request.json)
+
 @attendance_blueprint.route('/<int:id>', methods=['GET'])
 @jwt_required()
 def retrieve_attendance(id):
@@ -0,0 +1,25 @@
+from flask_jwt_extended import jwt_required
+from flask_smorest import Blueprint
+
+from app.controllers.ingest_controller import IngestController
+
+ingest_blueprint = Blueprint('ingest', __name__, url_prefix="/api/ingest",
+                             description="Progress of the CSV ingests")
+
+# Routes for the progress of the ingests, run by the ingest daemon or the seed
+@ingest_blueprint.route('/status', methods=['GET'])
+@jwt_required()
+def get_ingest_status():
+    """
+    Retrieves the progress of the ingests: the rows read, accepted, rejected and
+    inserted, the bytes read, the rows per second and the estimated time left of the
+    running ones.
+
+    Accepts a `file_hash` to retrieve a single ingest along with its rejected rows by
+    reason, or else a `status` filter and a `limit` on the most recently started
+    ingests returned.
+
+    :return: The progress of the ingests.
+    :rtype: flask.Response
+    """
+    return IngestController.get_status()
@@ -0,0 +1,18 @@
+from flask import Response
+from flask_smorest import Blueprint
+
+from app.utils.instrumentation import render_metrics, METRICS_CONTENT_TYPE
+
+metrics_blueprint = Blueprint("Metrics", 'metrics', url_prefix="/", description="Prometheus metrics")
+
+# Route scraped by Prometheus, left without token like the probes of the orchestrator
+@metrics_blueprint.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Exposes the request, SQL and span timing histograms of the worker process in
+    the Prometheus text format.
+
+    :return: The metrics as plain text.
+    :rtype: flask.Response
+    """
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
@@ -4,8 +4,9 @@ from marshmallow_sqlalchemy import SQLAlchemySchema, auto_field
 from app.config.config import db
 from app.models.attendance.attendance_model import Attendance
 from app.utils.date_utils import parse_date
+from app.utils.instrumentation import TimedSchemaMixin
 
-class AttendanceSchema(SQLAlchemySchema):
+class AttendanceSchema(TimedSchemaMixin, SQLAlchemySchema):
     class Meta:
         model = Attendance
         load_instance = True
@@ -36,7 +37,8 @@ class AttendanceSchema(SQLAlchemySchema):
     id = auto_field()
     id_attendance = auto_field()
     id_client = auto_field()
-    angel = auto_field()
-    pole = auto_field()
+    # Names of the angel and pole dimension records
+    angel = fields.Str(required=True)
+    pole = fields.Str(required=True)
     deadline = fields.Function(serialize=lambda obj: obj.deadline, deserialize=parse_date, required=True)
     attendance_date = fields.Function(serialize=lambda obj: obj.attendance_date, deserialize=parse_date, required=False)
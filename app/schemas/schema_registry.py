@@ -0,0 +1,49 @@
+import threading
+
+"""
+Registry of the marshmallow schema instances shared by the requests.
+
+Building a schema binds its fields, resolves its hooks and, for the
+marshmallow-sqlalchemy schemas, introspects the model of the `auto_field` columns.
+The registry builds each schema once by class and options, and the services reuse
+the instance. The shared instances are only used through `load(data)` and
+`dump(obj)`, which keep no state on the schema, so the worker threads can use them
+concurrently. A load given an `instance` or a `session`, which marshmallow-sqlalchemy
+stores on the schema, must use a schema of its own.
+"""
+
+
+class SchemaRegistry:
+    """
+    Builds and keeps one schema instance by schema class and options.
+    """
+
+    def __init__(self):
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def get(self, schema_class, **options):
+        """
+        Returns the shared instance of a schema class built with the given options.
+
+        :param schema_class: The marshmallow schema class.
+        :type schema_class: type[marshmallow.Schema]
+        :param options: The keyword arguments of the schema constructor, such as `many`.
+        :return: The schema instance.
+        :rtype: marshmallow.Schema
+        """
+        key = (schema_class, tuple(sorted(options.items())))
+        schema = self._schemas.get(key)
+        if schema is None:
+            with self._lock:
+                schema = self._schemas.get(key)
+                if schema is None:
+                    schema = self._schemas[key] = schema_class(**options)
+        return schema
+
+    def clear(self):
+        with self._lock:
+            self._schemas.clear()
+
+
+schema_registry = SchemaRegistry()
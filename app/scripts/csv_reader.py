@@ -0,0 +1,174 @@
+import mmap
+import os
+
+import pyarrow as pa
+import pyarrow.csv as csv
+
+"""
+Memory-mapped CSV reader of the ingest path.
+
+The source file is memory mapped instead of being read through buffered reads. The
+chunk boundaries are located by searching the next line break after the target
+offset directly on the mapping, and each chunk is handed to the Arrow CSV parser as a
+zero-copy slice of the mapped buffer. The chunk size is not a fixed number of rows: it
+adapts so the DataFrame of a chunk fits the configured memory budget.
+"""
+
+# Memory budget of the DataFrame of a chunk, in bytes
+DEFAULT_MEMORY_BUDGET = int(os.environ.get('INGEST_MEMORY_BUDGET', 64 * 1024 * 1024))
+
+# DataFrame bytes by CSV byte assumed for the first chunk, until it is measured
+INITIAL_EXPANSION = 8
+
+# Bounds of the chunk size, in bytes of the CSV file
+MIN_CHUNK_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 1024 * 1024 * 1024
+
+
+class MappedCSVReader:
+    """
+    Reads a CSV file by chunks of DataFrames from a memory mapping.
+
+    Used as a context manager, which maps the file on enter and unmaps it on exit::
+
+        with MappedCSVReader('attendances.csv', sep=';') as reader:
+            for chunk in reader:
+                ...
+
+    The values spanning several lines (quoted line breaks) are not supported, since the
+    chunks are split on line breaks.
+
+    :ivar path: The path of the CSV file.
+    :type path: str
+    :ivar sep: The field delimiter.
+    :type sep: str
+    :ivar memory_budget: Target size in bytes of the DataFrame of a chunk.
+    :type memory_budget: int
+    :ivar string_columns: Columns kept as strings instead of having their type inferred,
+        as the dates parsed afterwards.
+    :type string_columns: Iterable[str]
+    :ivar columns: The column names of the header line.
+    :type columns: list[str]
+    :ivar chunk_bytes: Number of CSV bytes of the next chunk.
+    :type chunk_bytes: int
+    :ivar bytes_read: Number of CSV bytes read so far, header included.
+    :type bytes_read: int
+    :ivar rows_read: Number of rows read so far.
+    :type rows_read: int
+    """
+
+    def __init__(self, path, sep=',', memory_budget=DEFAULT_MEMORY_BUDGET, string_columns=()):
+        self.path = path
+        self.sep = sep
+        self.memory_budget = memory_budget
+        self.string_columns = tuple(string_columns)
+        self.columns = []
+        self.chunk_bytes = self._clamp(memory_budget // INITIAL_EXPANSION)
+        self.bytes_read = 0
+        self.rows_read = 0
+        self._file = None
+        self._map = None
+        self._buffer = None
+        self._measured = False
+
+    @property
+    def size(self):
+        """
+        :return: The size in bytes of the CSV file.
+        :rtype: int
+        """
+        return len(self._map) if self._map is not None else 0
+
+    def __enter__(self):
+        self._file = open(self.path, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            # Sequential read, the kernel can read ahead aggressively
+            if hasattr(self._map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                self._map.madvise(mmap.MADV_SEQUENTIAL)
+            self._buffer = pa.py_buffer(self._map)
+            self._read_header()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The Arrow buffer holds an export of the mapping, released before closing it
+        self._buffer = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _read_header(self):
+        end = self._line_end(0)
+        header = self._map[:end].decode('utf-8-sig').rstrip('\r\n')
+        self.columns = [column.strip() for column in header.split(self.sep)]
+        self.bytes_read = end
+
+    def _line_end(self, offset):
+        """
+        Returns the offset following the first line break at or after the offset, or the
+        end of the file.
+        """
+        position = self._map.find(b'\n', offset)
+        return len(self._map) if position < 0 else position + 1
+
+    def _clamp(self, chunk_bytes):
+        return int(min(max(chunk_bytes, MIN_CHUNK_BYTES), MAX_CHUNK_BYTES))
+
+    def _parse(self, start, end):
+        read_options = csv.ReadOptions(column_names=self.columns, use_threads=True)
+        parse_options = csv.ParseOptions(delimiter=self.sep)
+        convert_options = csv.ConvertOptions(
+            column_types={column: pa.string() for column in self.string_columns if column in self.columns},
+            strings_can_be_null=True
+        )
+        table = csv.read_csv(pa.BufferReader(self._buffer.slice(start, end - start)),
+                             read_options=read_options, parse_options=parse_options,
+                             convert_options=convert_options)
+        chunk = table.to_pandas()
+        self._adapt(table.nbytes + chunk.memory_usage(deep=True).sum(), end - start)
+        return chunk
+
+    def _adapt(self, chunk_memory, chunk_bytes):
+        """
+        Measures the memory by CSV byte of the first chunk, the Arrow table and the
+        DataFrame being both alive during the conversion, and sizes the next chunks to
+        the memory budget.
+        """
+        if self._measured or not chunk_bytes:
+            return
+        expansion = chunk_memory / chunk_bytes
+        if expansion > 0:
+            self.chunk_bytes = self._clamp(self.memory_budget / expansion)
+        self._measured = True
+
+    def _release(self, end):
+        """
+        Drops the pages of the mapping before the offset from the resident memory. They
+        are backed by the file, so the read pages do not accumulate up to its size.
+        """
+        if not hasattr(self._map, 'madvise') or not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        length = end - end % mmap.PAGESIZE
+        if length:
+            self._map.madvise(mmap.MADV_DONTNEED, 0, length)
+
+    def __iter__(self):
+        """
+        Yields the chunks of the file as DataFrames.
+
+        :return: The DataFrames of the chunks.
+        :rtype: Iterator[pandas.DataFrame]
+        """
+        if self._map is None:
+            return
+        start = self.bytes_read
+        while start < len(self._map):
+            end = self._line_end(start + self.chunk_bytes - 1)
+            chunk = self._parse(start, end)
+            self.bytes_read = end
+            self.rows_read += len(chunk)
+            self._release(end)
+            if len(chunk):
+                yield chunk
+            start = end
@@ -0,0 +1,174 @@
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.utils.date_utils import DATE_FORMATS
+
+"""
+Vectorized validation of the chunks of the ingest CSV files.
+
+The rules of the `AttendanceCreationSchema` are applied to whole columns as boolean
+masks instead of loading each row through the schema: positive ids, non-empty angel
+and pole names that fit their column, a valid deadline and a valid attendance date.
+The dates are parsed with the formats of `parse_date`, one vectorized pass by format.
+The accepted rows are converted to plain records for a Core bulk insert, and the
+rejected ones are reported with their line and the reason of the rejection.
+"""
+
+# Largest id accepted, the ids being stored as 32-bit integers
+MAX_ID = 2 ** 31 - 1
+
+# Longest angel and pole names, the length of the name column of their dimension table
+MAX_NAME_LENGTH = 255
+
+# Reasons of the rejections, by order of precedence when a row breaks several rules. The
+# codes of the AttendanceCreationSchema validations are kept
+INVALID_ATTENDANCE_ID = 'INVALID_ATTENDANCE_ID'
+INVALID_CLIENT_ID = 'INVALID_CLIENT_ID'
+INVALID_ANGEL_NAME = 'INVALID_ANGEL_NAME'
+INVALID_POLE_NAME = 'INVALID_POLE_NAME'
+INVALID_DEADLINE = 'INVALID_DEADLINE'
+INVALID_ATTENDANCE_DATE = 'INVALID_ATTENDANCE_DATE'
+DATE_IN_FUTURE = 'DATE_IN_FUTURE'
+
+# Reason of the valid rows refused by the database on insert
+DATABASE_ERROR = 'DATABASE_ERROR'
+
+# A rejected row: its line on the file, the reason and the row as read
+Reject = namedtuple('Reject', ['line', 'error_code', 'row'])
+
+
+def parse_date_column(values, now):
+    """
+    Parses a column of date strings with the formats of `parse_date`, tried in the same
+    order. As `parse_date` does, the values are stripped and `-` is parsed as now.
+
+    :param values: The date strings.
+    :type values: pandas.Series
+    :param now: The date of the `-` values.
+    :type now: datetime.datetime
+    :return: The parsed dates, NaT where the value is missing or has none of the formats.
+    :rtype: pandas.Series
+    """
+    values = values.astype('string').str.strip()
+    present = values.notna().to_numpy()
+    dates = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for fmt in DATE_FORMATS:
+        pending = dates.isna().to_numpy() & present
+        if not pending.any():
+            break
+        dates[pending] = pd.to_datetime(values[pending], format=fmt, errors='coerce')
+    dates[values.eq('-').fillna(False).to_numpy(dtype=bool)] = now
+    return dates
+
+
+def parse_id_column(values):
+    """
+    Parses a column of ids, whatever the type inferred for it by the CSV parser.
+
+    :param values: The ids.
+    :type values: pandas.Series
+    :return: The ids as floats, NaN where the value is missing or is not a positive
+        integer.
+    :rtype: pandas.Series
+    """
+    ids = pd.to_numeric(values, errors='coerce').astype('float64')
+    return ids.where((ids > 0) & (ids <= MAX_ID) & (ids % 1 == 0))
+
+
+def validate_chunk(chunk, first_line, now=None):
+    """
+    Validates a chunk of a CSV file.
+
+    :param chunk: The rows of the chunk, with the columns of the CSV files as read.
+    :type chunk: pandas.DataFrame
+    :param first_line: The line of the first row of the chunk on the file, the header
+        being the line 1.
+    :type first_line: int
+    :param now: The dates after it are rejected, and it is the date of the `-` values.
+        Defaults to now.
+    :type now: datetime.datetime or None
+    :return: The accepted rows, with the attendance fields as columns, and the rejected
+        rows.
+    :rtype: tuple[pandas.DataFrame, list[Reject]]
+    """
+    now = now or datetime.now()
+    chunk = chunk.reset_index(drop=True)
+    id_attendance = parse_id_column(chunk['id_atendimento'])
+    id_client = parse_id_column(chunk['id_cliente'])
+    angel = chunk['angel'].astype('string')
+    pole = chunk['polo'].astype('string')
+    deadline = parse_date_column(chunk['data_limite'], now)
+    attendance_date = parse_date_column(chunk['data_de_atendimento'], now)
+
+    # The first broken rule of each row is its reason
+    masks = [
+        (INVALID_ATTENDANCE_ID, id_attendance.isna()),
+        (INVALID_CLIENT_ID, id_client.isna()),
+        (INVALID_ANGEL_NAME, ~angel.str.len().fillna(0).between(1, MAX_NAME_LENGTH)),
+        (INVALID_POLE_NAME, ~pole.str.len().fillna(0).between(1, MAX_NAME_LENGTH)),
+        (INVALID_DEADLINE, deadline.isna()),
+        (INVALID_ATTENDANCE_DATE, attendance_date.isna() & chunk['data_de_atendimento'].notna()),
+        (DATE_IN_FUTURE, (deadline > now) | (attendance_date > now)),
+    ]
+    codes = np.select([mask.to_numpy() for _, mask in masks], [code for code, _ in masks], default='')
+    rejected = np.flatnonzero(codes != '')
+
+    rejects = [
+        Reject(first_line + position, code, row)
+        for position, code, row in zip(rejected.tolist(), codes[rejected].tolist(),
+                                       chunk.iloc[rejected].to_dict('records'))
+    ]
+    accepted = pd.DataFrame({
+        'id_attendance': id_attendance,
+        'id_client': id_client,
+        'angel': angel.astype(object),
+        'pole': pole.astype(object),
+        'deadline': deadline,
+        'attendance_date': attendance_date,
+    }).drop(index=rejected)
+    accepted['id_attendance'] = accepted['id_attendance'].astype('int64')
+    accepted['id_client'] = accepted['id_client'].astype('int64')
+    return accepted, rejects
+
+
+def to_python(values):
+    """
+    Converts a column to Python objects, with None for the missing values.
+    """
+    values = values.astype(object)
+    return values.where(values.notna(), None)
+
+
+def to_records(accepted, angel_ids, pole_ids):
+    """
+    Converts the accepted rows of a chunk to the records of a Core bulk insert on the
+    attendances table, with the dimension keys and the derived `on_time` and
+    `attendance_day` columns computed on the whole columns.
+
+    :param accepted: The accepted rows, as returned by `validate_chunk`.
+    :type accepted: pandas.DataFrame
+    :param angel_ids: The keys of the angel names of the rows.
+    :type angel_ids: dict[str, int]
+    :param pole_ids: The keys of the pole names of the rows.
+    :type pole_ids: dict[str, int]
+    :return: The records, one dictionary by row.
+    :rtype: list[dict]
+    """
+    attendance_date = accepted['attendance_date']
+    deadline = accepted['deadline']
+    columns = pd.DataFrame({
+        'id_attendance': accepted['id_attendance'],
+        'id_client': accepted['id_client'],
+        'angel_id': accepted['angel'].map(angel_ids),
+        'pole_id': accepted['pole'].map(pole_ids),
+        'deadline': to_python(deadline),
+        'attendance_date': to_python(attendance_date),
+        # NaT never compares lower, so the attendances without a date are not on time
+        'on_time': attendance_date <= deadline,
+        'attendance_day': to_python(attendance_date.dt.date),
+    })
+    names = list(columns.columns)
+    return [dict(zip(names, row)) for row in columns.itertuples(index=False, name=None)]
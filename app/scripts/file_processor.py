@@ -3,13 +3,16 @@ import hashlib
 from app.config.config import db
 from app.models.file_record_model import FileRecord
 
+# Bytes read at a time when hashing a file
+HASH_BLOCK_SIZE = 1024 * 1024
+
 
 def get_file_hash(file_path):
     """
     Computes the MD5 hash of a given file.
 
-    This function reads the entire content of the file located at the provided
-    path, computes the MD5 hash of the file's binary content, and returns the
+    This function reads the content of the file located at the provided path by
+    blocks, computes the MD5 hash of the file's binary content, and returns the
     resulting hash as a hexadecimal string.
 
     :param file_path: The path to the file whose MD5 hash is to be computed.
@@ -19,8 +22,9 @@ def get_file_hash(file_path):
     """
     hasher = hashlib.md5()
     with open(file_path, 'rb') as f:
-        buf = f.read()
-        hasher.update(buf)
+        # Read by blocks, so a large file is not loaded in memory
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
     return hasher.hexdigest()
 
 def check_file_processed(file_hash):
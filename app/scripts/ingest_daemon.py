@@ -0,0 +1,372 @@
+import argparse
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import shutil
+import signal
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.config.config import db
+from app.scripts.csv_reader import DEFAULT_MEMORY_BUDGET
+from app.scripts.file_processor import get_file_hash
+from app.scripts.load_data_csv import import_csv
+
+"""
+Ingest daemon of a drop directory.
+
+The CSV files landing on the drop directory are loaded into the database without
+restarting the web tier. The directory is watched with inotify on Linux, and polled
+elsewhere. Each new file is fingerprinted with the `FileRecord` hash, queued to a
+bounded pool of workers loading several files concurrently, and moved to the
+`processed` or `failed` folder of the directory once handled. Usage:
+
+    python -m app.scripts.ingest_daemon /srv/kpi/drop --workers 4
+
+The producers should write a file under another name, or on another directory of the
+same filesystem, and rename it into the drop directory once complete. The names
+starting with a dot are ignored.
+"""
+
+# Settings of the daemon, overridden by the command line
+DEFAULT_DROP_DIRECTORY = os.environ.get('INGEST_DROP_DIRECTORY', 'app/data/drop')
+DEFAULT_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+DEFAULT_POLL_SECONDS = float(os.environ.get('INGEST_POLL_SECONDS', 2))
+
+# Folders of the handled files, inside the drop directory
+PROCESSED_FOLDER = 'processed'
+FAILED_FOLDER = 'failed'
+
+# Extension of the files picked up, case insensitive
+CSV_EXTENSION = '.csv'
+
+# inotify flags and event header, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def is_candidate(name):
+    """
+    Tells whether a file name of the drop directory is a CSV file to load.
+
+    :param name: The file name.
+    :type name: str
+    :return: True if the file must be loaded.
+    :rtype: bool
+    """
+    return not name.startswith('.') and name.lower().endswith(CSV_EXTENSION)
+
+
+class PollingWatcher:
+    """
+    Reports the files of a directory by scanning it periodically. A file is reported
+    once its size and modification time are the same on two scans in a row, so the
+    files still being written are not picked up.
+
+    :ivar directory: The watched directory.
+    :type directory: str
+    :ivar poll_seconds: The interval between two scans.
+    :type poll_seconds: float
+    """
+
+    def __init__(self, directory, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self._stats = {}
+
+    def scan(self):
+        """
+        Scans the directory once.
+
+        :return: The paths of the candidate files whose size and modification time did
+            not change since the previous scan.
+        :rtype: list[str]
+        """
+        stats = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and is_candidate(entry.name):
+                    stat = entry.stat()
+                    stats[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        stable = [path for path, stat in stats.items() if self._stats.get(path) == stat]
+        self._stats = stats
+        return sorted(stable)
+
+    def wait(self, timeout):
+        """
+        Waits for the next scan and returns the stable files.
+
+        :param timeout: Seconds to wait at most.
+        :type timeout: float
+        :return: The paths of the stable candidate files.
+        :rtype: list[str]
+        """
+        time.sleep(min(timeout, self.poll_seconds))
+        return self.scan()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Reports the files closed after writing, or moved into a directory, through the
+    inotify API of Linux. The directory is also scanned on start and whenever the
+    kernel event queue overflows, so no file is missed.
+
+    :ivar directory: The watched directory.
+    :type directory: str
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f'inotify_add_watch failed on {directory}')
+
+    def scan(self):
+        """
+        Lists the candidate files of the directory.
+
+        :return: The paths of the candidate files.
+        :rtype: list[str]
+        """
+        with os.scandir(self.directory) as entries:
+            return sorted(entry.path for entry in entries if entry.is_file() and is_candidate(entry.name))
+
+    def wait(self, timeout):
+        """
+        Waits for file events and returns the files they are about.
+
+        :param timeout: Seconds to wait at most.
+        :type timeout: float
+        :return: The paths of the candidate files written or moved into the directory.
+        :rtype: list[str]
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        paths = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return self.scan()
+            if name and is_candidate(name):
+                paths.append(os.path.join(self.directory, name))
+        return paths
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_watcher(directory, poll_seconds=DEFAULT_POLL_SECONDS):
+    """
+    Creates the watcher of a directory, with inotify when available and by polling
+    otherwise.
+
+    :param directory: The directory to watch.
+    :type directory: str
+    :param poll_seconds: The interval between two scans when polling.
+    :type poll_seconds: float
+    :return: The watcher.
+    :rtype: InotifyWatcher or PollingWatcher
+    """
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError, TypeError) as e:
+        # Not on Linux, or out of inotify watches
+        logging.info("inotify is not available (%s), polling %s every %ss.", e, directory, poll_seconds)
+        return PollingWatcher(directory, poll_seconds)
+
+
+class IngestDaemon:
+    """
+    Loads the CSV files dropped on a directory with a bounded pool of workers.
+
+    At most `workers` files are loaded at a time and `queue_size` more wait for a
+    worker; the watcher blocks while the queue is full, the files dropped meanwhile
+    being reported once it resumes. A file whose hash is already recorded is moved to
+    the processed folder without being loaded again, and a file with the content of a
+    file being loaded by another worker waits for it.
+
+    :ivar app: The Flask application, whose context the workers run in.
+    :type app: flask.Flask
+    :ivar directory: The drop directory.
+    :type directory: str
+    :ivar workers: Number of files loaded concurrently.
+    :type workers: int
+    :ivar queue_size: Number of files waiting for a worker.
+    :type queue_size: int
+    :ivar poll_seconds: The interval between two scans when polling.
+    :type poll_seconds: float
+    :ivar memory_budget: The memory budget of the chunks of each file.
+    :type memory_budget: int
+    """
+
+    def __init__(self, app, directory, workers=DEFAULT_WORKERS, queue_size=None, poll_seconds=DEFAULT_POLL_SECONDS,
+                 memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.app = app
+        self.directory = os.path.abspath(directory)
+        self.workers = workers
+        self.queue_size = workers if queue_size is None else queue_size
+        self.poll_seconds = poll_seconds
+        self.memory_budget = memory_budget
+        self.processed_directory = os.path.join(self.directory, PROCESSED_FOLDER)
+        self.failed_directory = os.path.join(self.directory, FAILED_FOLDER)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Condition()
+        self._pending = set()
+        self._hashes = set()
+        self._stopped = threading.Event()
+        self._executor = None
+
+    def run(self):
+        """
+        Watches the drop directory and loads its files until `stop` is called. The
+        files already on the directory are loaded first.
+
+        :return: None
+        """
+        for directory in (self.directory, self.processed_directory, self.failed_directory):
+            os.makedirs(directory, exist_ok=True)
+        watcher = create_watcher(self.directory, self.poll_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ingest')
+        logging.info("Watching %s with %s, %d workers.", self.directory, type(watcher).__name__, self.workers)
+        try:
+            paths = watcher.scan()
+            while not self._stopped.is_set():
+                for path in paths:
+                    self.submit(path)
+                paths = watcher.wait(self.poll_seconds)
+        finally:
+            watcher.close()
+            self._executor.shutdown(wait=True)
+
+    def stop(self, *args):
+        """
+        Stops watching the directory. The files being loaded are finished.
+
+        :return: None
+        """
+        self._stopped.set()
+
+    def submit(self, path):
+        """
+        Queues a file to the workers, waiting for a free slot of the queue.
+
+        :param path: The path of the file.
+        :type path: str
+        :return: True if the file was queued, False if it is already queued or the
+            daemon stopped.
+        :rtype: bool
+        """
+        with self._lock:
+            if path in self._pending:
+                return False
+            self._pending.add(path)
+        while not self._slots.acquire(timeout=self.poll_seconds):
+            if self._stopped.is_set():
+                with self._lock:
+                    self._pending.discard(path)
+                return False
+        self._executor.submit(self._process, path)
+        return True
+
+    def _process(self, path):
+        file_hash = None
+        try:
+            if not os.path.exists(path):
+                return
+            file_hash = get_file_hash(path)
+            with self._lock:
+                # The same content under another name is loaded by another worker, it is
+                # recorded as processed once that worker is done
+                while file_hash in self._hashes:
+                    self._lock.wait()
+                self._hashes.add(file_hash)
+            try:
+                with self.app.app_context():
+                    try:
+                        rejected = import_csv(path, self.memory_budget, file_hash)
+                    finally:
+                        db.session.remove()
+                self.move(path, self.processed_directory)
+                if rejected is None:
+                    logging.info("%s was already loaded, moved to %s.", path, self.processed_directory, extra={'file': path})
+            except Exception as e:
+                logging.exception("Failed to load %s.", path, extra={'file': path})
+                self.move(path, self.failed_directory, str(e))
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+                self._hashes.discard(file_hash)
+                self._lock.notify_all()
+            self._slots.release()
+
+    @staticmethod
+    def move(path, directory, error=None):
+        """
+        Moves a handled file to a folder, adding a timestamp to its name if the folder
+        already has a file with the same name. The error of a failed file is written
+        next to it, on a `.error` file.
+
+        :param path: The path of the file.
+        :type path: str
+        :param directory: The destination folder.
+        :type directory: str
+        :param error: The error of the file, if it failed.
+        :type error: str or None
+        :return: The new path of the file.
+        :rtype: str
+        """
+        name = os.path.basename(path)
+        destination = os.path.join(directory, name)
+        if os.path.exists(destination):
+            stem, extension = os.path.splitext(name)
+            destination = os.path.join(directory, f"{stem}.{datetime.now():%Y%m%d%H%M%S%f}{extension}")
+        shutil.move(path, destination)
+        if error is not None:
+            with open(destination + '.error', 'w') as f:
+                f.write(error + '\n')
+        return destination
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load the CSV files dropped on a directory')
+    parser.add_argument('directory', nargs='?', default=DEFAULT_DROP_DIRECTORY)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--queue-size', type=int)
+    parser.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_SECONDS)
+    parser.add_argument('--memory-budget', type=int, default=DEFAULT_MEMORY_BUDGET)
+    args = parser.parse_args()
+
+    from app import create_app
+
+    daemon = IngestDaemon(create_app(), args.directory, args.workers, args.queue_size, args.poll_seconds,
+                          args.memory_budget)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+
+
+if __name__ == '__main__':
+    main()
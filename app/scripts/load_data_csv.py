@@ -1,31 +1,233 @@
 import os
-import pandas as pd
 from datetime import datetime
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
 from app import db, ApiClient
 from app.models.attendance.attendance_model import Attendance
 from app.models.file_record_model import FileRecord
+from app.models.ingest_progress_model import INGEST_COMPLETED, INGEST_FAILED
+from app.repositories.dimension_repository import angel_repository, pole_repository
+from app.repositories.ingest_progress_repository import IngestProgressRepository
+from app.repositories.ingest_reject_repository import IngestRejectRepository
+from app.repositories.partition_repository import attendance_partitions
+from app.scripts.csv_reader import MappedCSVReader, DEFAULT_MEMORY_BUDGET
+from app.scripts.csv_validator import validate_chunk, to_records, Reject, DATABASE_ERROR
 from app.scripts.file_processor import get_file_hash, check_file_processed
-from app.utils.date_utils import parse_date
+from app.utils.record_cache import attendance_record_cache
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Columns of the CSV files
+REQUIRED_COLUMNS = ['id_atendimento', 'id_cliente', 'angel', 'polo', 'data_limite', 'data_de_atendimento']
+# Columns kept as read, the dates being parsed by the validator
+STRING_COLUMNS = ['angel', 'polo', 'data_limite', 'data_de_atendimento']
+
+# Lines of the rejected rows logged by reason and chunk
+REJECTS_LOGGED = 10
+
+
+def log_rejects(rejects):
+    """
+    Logs the rejected rows of a chunk, counted by reason with their first lines.
+
+    :param rejects: The rejected rows.
+    :type rejects: list[Reject]
+    :return: None
+    """
+    lines_by_code = {}
+    for reject in rejects:
+        lines_by_code.setdefault(reject.error_code, []).append(reject.line)
+    for code, lines in lines_by_code.items():
+        shown = ', '.join(str(line) for line in lines[:REJECTS_LOGGED])
+        more = f" and {len(lines) - REJECTS_LOGGED} more" if len(lines) > REJECTS_LOGGED else ''
+        logging.warning("Rejected %d rows with %s at lines %s%s.", len(lines), code, shown, more,
+                        extra={'error_code': code, 'rows': len(lines)})
+    # Every rejected row, sampled with the other DEBUG records
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+    for reject in rejects:
+        logging.debug("Rejected line %d with %s: %s", reject.line, reject.error_code, reject.row,
+                      extra={'line': reject.line, 'error_code': reject.error_code})
 
 
-def validate_and_parse_dates(df):
+def insert_records(records, accepted, chunk, first_line):
+    """
+    Inserts the records of a chunk with a single bulk insert. If the database refuses
+    the batch, it is rolled back to its savepoint and the records are inserted one by
+    one, each on its own savepoint, so a bad row does not take the chunk down.
 
-    now = datetime.now()
-    df['data_de_atendimento'] = df['data_de_atendimento'].apply(parse_date)
-    df['data_limite'] = df['data_limite'].apply(parse_date)
-    # filter invalid and valid future data
-    df = df[(df['data_de_atendimento'] <= now) & (df['data_limite'] <= now)]
-    return df
+    :param records: The records of the accepted rows.
+    :type records: list[dict]
+    :param accepted: The accepted rows, indexed by their position on the chunk.
+    :type accepted: pandas.DataFrame
+    :param chunk: The rows of the chunk, as read.
+    :type chunk: pandas.DataFrame
+    :param first_line: The line of the first row of the chunk on the file.
+    :type first_line: int
+    :return: The number of inserted attendances and the rows refused by the database.
+    :rtype: tuple[int, list[Reject]]
+    """
+    table = Attendance.__table__
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table), records)
+        return len(records), []
+    except SQLAlchemyError as e:
+        # The driver error, without the parameters of the whole batch
+        logging.warning("Bulk insert of the chunk failed, inserting its rows one by one: %s", getattr(e, 'orig', e))
 
+    rejects = []
+    for position, record in zip(accepted.index.tolist(), records):
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table), [record])
+        except SQLAlchemyError:
+            row = chunk.iloc[position].to_dict()
+            rejects.append(Reject(first_line + position, DATABASE_ERROR, row))
+    return len(records) - len(rejects), rejects
+
+
+def load_chunk(chunk, first_line, file_hash):
+    """
+    Validates a chunk of the CSV file and bulk inserts its accepted attendances. The
+    rejected rows are written to the `ingest_rejects` quarantine table, and are
+    committed along with the accepted ones.
 
-def load_csv_to_db(csv_file, chunksize=1000):
+    :param chunk: The rows of the chunk.
+    :type chunk: pandas.DataFrame
+    :param first_line: The line of the first row of the chunk on the file.
+    :type first_line: int
+    :param file_hash: Hash of the CSV file.
+    :type file_hash: str
+    :return: The number of inserted attendances and the rejected rows.
+    :rtype: tuple[int, list[Reject]]
+    """
+    chunk = chunk.reset_index(drop=True)
+    # Validate (column masks of the AttendanceCreationSchema rules)
+    accepted, rejects = validate_chunk(chunk, first_line)
+    inserted = 0
+    if not accepted.empty:
+        # Resolve the angel and pole names to their dimension keys
+        angel_ids = angel_repository.get_ids(accepted['angel'].unique())
+        pole_ids = pole_repository.get_ids(accepted['pole'].unique())
+        # Create the partitions of the months of the chunk
+        months = np.unique(accepted['attendance_date'].to_numpy().astype('datetime64[M]'))
+        attendance_partitions.ensure_partitions(months.tolist())
+
+        # Insert data (packages)
+        inserted, refused = insert_records(to_records(accepted, angel_ids, pole_ids), accepted, chunk, first_line)
+        rejects.extend(refused)
+
+    # Quarantine the rejected rows
+    log_rejects(rejects)
+    IngestRejectRepository.add_rejects(file_hash, rejects)
+
+    db.session.commit()
+    if inserted:
+        # The cached attendances of the same id_attendance values no longer are all of them
+        attendance_record_cache.invalidate(id_attendance=accepted['id_attendance'].unique().tolist())
+    return inserted, rejects
+
+
+def import_csv(csv_file, memory_budget=DEFAULT_MEMORY_BUDGET, file_hash=None):
+    """
+    Loads a CSV file into the database, by chunks read from a memory mapping of the
+    file sized to a memory budget. The rows breaking a rule of the
+    `AttendanceCreationSchema`, or refused by the database, are written to the
+    `ingest_rejects` quarantine table with their line and reason, and the other rows
+    are loaded. The file is recorded on the `file_records` table once loaded, and a
+    file whose hash is already recorded is skipped. The counters of the ingest are
+    written to the `ingest_progress` table as each chunk is committed.
+
+    :param csv_file: The path of the CSV file.
+    :type csv_file: str
+    :param memory_budget: The target size in bytes of the DataFrame of a chunk.
+    :type memory_budget: int
+    :param file_hash: The hash of the file, when already computed by the caller.
+    :type file_hash: str or None
+    :return: The rejected rows, or None if the file was already processed.
+    :rtype: list[Reject] or None
+    :raises ValueError: If the file is missing one of the required columns.
+    :raises Exception: Any error of the processing, once the current chunk is rolled
+        back. The chunks committed before are kept.
+    """
+    rejected = []
+    started = False
+    try:
+        file_hash = file_hash or get_file_hash(csv_file)
+        if check_file_processed(file_hash):
+            logging.info("File %s already processed. Skipping...", csv_file, extra={'file': csv_file})
+            return None
+        # Read (memory mapped chunks, the names and dates are kept as read)
+        with MappedCSVReader(csv_file, sep=';', memory_budget=memory_budget,
+                             string_columns=STRING_COLUMNS) as reader:
+            IngestProgressRepository.start(file_hash, csv_file, reader.size)
+            db.session.commit()
+            started = True
+            # Indentify necessary columns
+            if not all(col in reader.columns for col in REQUIRED_COLUMNS):
+                raise ValueError("CSV_MISSING_COLUMNS")
+
+            accepted = inserted_total = 0
+            for chunk in reader:
+                # The header is the line 1
+                inserted, rejects = load_chunk(chunk, reader.rows_read - len(chunk) + 2, file_hash)
+                rejected.extend(rejects)
+                # The rows refused by the database passed the validation
+                accepted += len(chunk) - sum(reject.error_code != DATABASE_ERROR for reject in rejects)
+                inserted_total += inserted
+                IngestProgressRepository.update(file_hash, bytes_read=reader.bytes_read, rows_read=reader.rows_read,
+                                                rows_accepted=accepted, rows_rejected=len(rejected),
+                                                rows_inserted=inserted_total)
+                db.session.commit()
+                logging.info("Processed %d records in current chunk, %d rejected (%d/%d bytes).", inserted,
+                             len(rejects), reader.bytes_read, reader.size,
+                             extra={'file': csv_file, 'inserted': inserted, 'rejected': len(rejects),
+                                    'bytes_read': reader.bytes_read, 'size': reader.size})
+
+        new_record = FileRecord(file_name=csv_file, processed_at=datetime.now(), hash=file_hash)
+        db.session.add(new_record)
+        IngestProgressRepository.finish(file_hash, INGEST_COMPLETED)
+        db.session.commit()
+        logging.info("CSV data of %s loaded successfully into the database, %d rows rejected.", csv_file,
+                     len(rejected), extra={'file': csv_file, 'rejected': len(rejected)})
+        return rejected
+    except Exception as e:
+        db.session.rollback()
+        if started:
+            record_failure(file_hash, e)
+        raise
+
+
+def record_failure(file_hash, error):
+    """
+    Records the failure of an ingest on its progress, without hiding the error of the
+    ingest if the database is not reachable.
+
+    :param file_hash: Hash of the file.
+    :type file_hash: str
+    :param error: The error of the ingest.
+    :type error: Exception
+    :return: None
+    """
+    try:
+        IngestProgressRepository.finish(file_hash, INGEST_FAILED, str(error))
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logging.warning("Failed to record the failure of the ingest of %s: %s", file_hash, getattr(e, 'orig', e))
+
+
+def load_csv_to_db(csv_file, memory_budget=DEFAULT_MEMORY_BUDGET, file_hash=None):
     """
     Function to load data from a CSV file into a database. It processes the file in
-    chunks and validates data before storing it in the database. The process also
+    chunks read from a memory mapping of the file, sized to a memory budget, and
+    validates its rows before storing them in the database. The rows breaking a rule
+    of the `AttendanceCreationSchema`, or refused by the database, are written to the
+    `ingest_rejects` quarantine table with their line and reason, and the other rows
+    are loaded. The process also
     checks if the file has been processed previously using a hash of the file, and
     skips re-processing in such cases. After successful insertion, it logs the
     processed data and updates the metadata about the file.
@@ -33,49 +235,24 @@ def load_csv_to_db(csv_file, chunksize=1000):
     Args:
         csv_file (str): The path to the CSV file that will be imported into the
             database.
-        chunksize (int, optional): The number of rows to process at a time from the
-            CSV file. Defaults to 1000.
+        memory_budget (int, optional): The target size in bytes of the DataFrame of a
+            chunk. Defaults to the INGEST_MEMORY_BUDGET setting, 64 MiB.
+        file_hash (str, optional): The hash of the file, when already computed by
+            the caller.
 
     Raises:
         Exception: Rolls back all changes made to the database in case of any error
             during processing and logs the error message.
 
     Returns:
-        None
+        list[Reject]: The rejected rows, with their line and the reason of the
+            rejection.
     """
+    rejected = []
     try:
-        file_hash = get_file_hash(csv_file)
-        if check_file_processed(file_hash):
-            logging.info("File already processed. Skipping...")
-            return
-        # Read (blocks)
-        chunk_iter = pd.read_csv(csv_file, sep=';', chunksize=chunksize)
-
-        for chunk in chunk_iter:
-            # Indentify necessary columns
-            required_columns = ['id_atendimento', 'id_cliente', 'angel', 'polo', 'data_limite', 'data_de_atendimento']
-            if not all(col in chunk.columns for col in required_columns):
-                logging.error("CSV file is missing one or more required columns.")
-                return
-
-            # Validate date
-            chunk = validate_and_parse_dates(chunk)
-
-            # Transformar dados para objetos Attendance
-            attendances = [
-                Attendance.create_from_csv(row)
-                for _, row in chunk.iterrows()
-            ]
-
-            # Insert data (packages)
-            db.session.bulk_save_objects(attendances)
-
-            db.session.commit()
-            logging.info(f"Processed {len(attendances)} records in current chunk.")
-        new_record = FileRecord(file_name=csv_file, processed_at=datetime.now(), hash=get_file_hash(csv_file))
-        db.session.add(new_record)
-        db.session.commit()
-        logging.info("CSV data loaded successfully into the database.")
+        rejected = import_csv(csv_file, memory_budget, file_hash)
+        if rejected is None:
+            return []
 
         if not ApiClient.query.first():
             secret = 'meu_segredo'
@@ -86,7 +263,8 @@ def load_csv_to_db(csv_file, chunksize=1000):
 
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Error processing CSV: {e}")
+        logging.error("Error processing CSV: %s", e, extra={'file': csv_file})
+    return rejected or []
 
 
 if __name__ == "__main__":
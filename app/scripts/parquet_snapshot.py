@@ -0,0 +1,361 @@
+import argparse
+import io
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.parquet as pq
+from sqlalchemy import select
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.models.dimension.dimension_model import Angel, Pole
+from app.models.file_record_model import FileRecord
+from app.repositories.dimension_repository import angel_repository, pole_repository
+from app.repositories.partition_repository import attendance_partitions
+from app.scripts.file_processor import get_file_hash, check_file_processed
+from app.utils.record_cache import attendance_record_cache
+
+"""
+Columnar snapshots of the attendances as Parquet datasets.
+
+The export streams the attendances from the database as Arrow record batches into a
+Parquet dataset partitioned by month of `attendance_date`, for the offline KPI work.
+The import bulk loads such a dataset, typed, so seeding a new environment does not
+re-parse the dates of the CSV files. Usage:
+
+    python -m app.scripts.parquet_snapshot export <directory>
+    python -m app.scripts.parquet_snapshot import <directory or file>
+"""
+
+# Schema of the exported attendances. The angel and pole are exported by name, since
+# the dimension keys are specific to each database
+SNAPSHOT_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('created_at', pa.timestamp('us')),
+    ('updated_at', pa.timestamp('us')),
+    ('id_attendance', pa.int64()),
+    ('id_client', pa.int64()),
+    ('angel', pa.dictionary(pa.int32(), pa.string())),
+    ('pole', pa.dictionary(pa.int32(), pa.string())),
+    ('deadline', pa.timestamp('us')),
+    ('attendance_date', pa.timestamp('us')),
+    ('on_time', pa.bool_()),
+])
+
+# Column of the hive partitioning of the dataset, and its value for the missing dates
+PARTITION_COLUMN = 'attendance_month'
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# Rows by record batch, on both the export and the import
+BATCH_SIZE = 100000
+
+
+def export_query():
+    return select(
+        Attendance.id,
+        Attendance.created_at,
+        Attendance.updated_at,
+        Attendance.id_attendance,
+        Attendance.id_client,
+        Angel.name,
+        Pole.name,
+        Attendance.deadline,
+        Attendance.attendance_date,
+        Attendance.on_time
+    ).join(Angel, Angel.id == Attendance.angel_id).join(Pole, Pole.id == Attendance.pole_id)
+
+
+def to_record_batch(rows):
+    """
+    Converts rows of the export query to a record batch of the `SNAPSHOT_SCHEMA`, with
+    the month partitioning column.
+
+    :param rows: The rows, as tuples in the order of the schema, as returned by the
+        DB-API cursor.
+    :type rows: list[tuple]
+    :return: The record batch.
+    :rtype: pyarrow.RecordBatch
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(SNAPSHOT_SCHEMA)
+    arrays = []
+    for field, values in zip(SNAPSHOT_SCHEMA, columns):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            # SQLite returns the dates as ISO strings and the booleans as integers,
+            # which are cast by Arrow instead of being parsed in Python
+            arrays.append(pa.array(values).cast(field.type))
+    month = pc.strftime(arrays[SNAPSHOT_SCHEMA.get_field_index('attendance_date')], format='%Y-%m')
+    return pa.RecordBatch.from_arrays(arrays + [month], schema=SNAPSHOT_SCHEMA.append(
+        pa.field(PARTITION_COLUMN, pa.string())))
+
+
+def stream_record_batches(batch_size=BATCH_SIZE):
+    """
+    Streams the attendances from the database as record batches. The rows are fetched by
+    batches from a DB-API cursor, server side on PostgreSQL, so the table is never held
+    in memory.
+
+    :param batch_size: Number of rows by record batch.
+    :type batch_size: int
+    :return: The record batches.
+    :rtype: Iterator[pyarrow.RecordBatch]
+    """
+    connection = db.session.connection()
+    statement = str(export_query().compile(connection))
+    dbapi_connection = connection.connection.dbapi_connection
+    if connection.dialect.name == 'postgresql':
+        cursor = dbapi_connection.cursor(name='parquet_snapshot')
+        cursor.itersize = batch_size
+    else:
+        cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(statement)
+        while rows := cursor.fetchmany(batch_size):
+            yield to_record_batch(rows)
+    finally:
+        cursor.close()
+
+
+def export_attendances_to_parquet(directory, batch_size=BATCH_SIZE):
+    """
+    Exports the attendances to a Parquet dataset partitioned by month of
+    `attendance_date`, as `<directory>/attendance_month=YYYY-MM/part-0.parquet`. The
+    attendances without a date go to the `__HIVE_DEFAULT_PARTITION__` partition.
+
+    Each record batch is split by month and appended to the open writer of its
+    partition, so the export memory is bounded by the batch size.
+
+    :param directory: The directory of the dataset. Existing files with the same names
+        are overwritten.
+    :type directory: str
+    :param batch_size: Number of rows by record batch.
+    :type batch_size: int
+    :return: The number of exported attendances.
+    :rtype: int
+    """
+    writers = {}
+    exported = 0
+    try:
+        for batch in stream_record_batches(batch_size):
+            months = batch.column(PARTITION_COLUMN)
+            for month in pc.unique(months).to_pylist():
+                mask = pc.is_null(months) if month is None else pc.equal(months, month)
+                rows = batch.filter(mask).drop_columns([PARTITION_COLUMN])
+                if month not in writers:
+                    partition = os.path.join(directory, f"{PARTITION_COLUMN}={month or NULL_PARTITION}")
+                    os.makedirs(partition, exist_ok=True)
+                    writers[month] = pq.ParquetWriter(os.path.join(partition, 'part-0.parquet'), SNAPSHOT_SCHEMA)
+                writers[month].write_batch(rows, row_group_size=batch_size)
+            exported += batch.num_rows
+    finally:
+        for writer in writers.values():
+            writer.close()
+        db.session.commit()
+
+    logging.info("Exported %d attendances to %s.", exported, directory)
+    return exported
+
+
+def dimension_keys(column, repository):
+    """
+    Resolves a column of names to the dimension keys, with one lookup for the distinct
+    names of the column.
+
+    :param column: The names, plain or dictionary encoded.
+    :type column: pyarrow.Array or pyarrow.ChunkedArray
+    :param repository: The dimension repository.
+    :type repository: DimensionRepository
+    :return: The dimension keys.
+    :rtype: numpy.ndarray
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if not pa.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    names = column.dictionary.to_pylist()
+    ids = repository.get_ids(names)
+    return np.array([ids[name] for name in names], dtype=np.int64)[column.indices.to_numpy()]
+
+
+def resolve_dimensions(parquet_file, batch_size=BATCH_SIZE):
+    """
+    Resolves the angel and pole names of a whole Parquet file to the dimension keys.
+
+    The missing names are inserted by the dimension repositories on their own
+    connection, so they are resolved before the partitions of the file are created on
+    the session: on PostgreSQL an insert waiting on the uncommitted partition would
+    never be granted. The keys are then cached for the batches of the file.
+
+    :param parquet_file: The Parquet file.
+    :type parquet_file: pyarrow.parquet.ParquetFile
+    :param batch_size: Number of rows by record batch.
+    :type batch_size: int
+    :return: None
+    """
+    angels, poles = set(), set()
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=['angel', 'pole']):
+        angels.update(pc.unique(batch.column('angel')).to_pylist())
+        poles.update(pc.unique(batch.column('pole')).to_pylist())
+    angels.discard(None)
+    poles.discard(None)
+    angel_repository.get_ids(angels)
+    pole_repository.get_ids(poles)
+
+
+def to_attendance_table(batch, now=None):
+    """
+    Converts a record batch of a snapshot to the columns inserted on the attendances
+    table.
+
+    The dimension keys and the derived `on_time` and `attendance_day` columns are
+    computed on the whole batch. The ids are assigned by the database, and `updated_at`
+    is set to the import time, so the columnar analytics snapshot syncs the rows.
+
+    :param batch: A record batch with the columns of the `SNAPSHOT_SCHEMA`.
+    :type batch: pyarrow.RecordBatch or pyarrow.Table
+    :param now: The import time, defaults to now.
+    :type now: datetime.datetime or None
+    :return: The attendances columns.
+    :rtype: pyarrow.Table
+    """
+    now = now or datetime.now()
+    attendance_date = batch.column('attendance_date')
+    deadline = batch.column('deadline')
+    return pa.table({
+        'created_at': batch.column('created_at').fill_null(now),
+        'updated_at': pa.array([now] * batch.num_rows, pa.timestamp('us')),
+        'id_attendance': batch.column('id_attendance'),
+        'id_client': batch.column('id_client'),
+        'angel_id': pa.array(dimension_keys(batch.column('angel'), angel_repository)),
+        'pole_id': pa.array(dimension_keys(batch.column('pole'), pole_repository)),
+        'deadline': deadline,
+        'attendance_date': attendance_date,
+        'on_time': pc.fill_null(pc.less_equal(attendance_date, deadline), False),
+        'attendance_day': pc.cast(attendance_date, pa.date32()),
+    })
+
+
+def insert_attendances(table):
+    """
+    Inserts the attendances columns on the connection of the current session, without
+    converting the rows to Python objects.
+
+    On PostgreSQL the columns are written as CSV by Arrow and streamed with `COPY`. On
+    the other databases, as SQLite, the dates are formatted by Arrow as SQLAlchemy
+    stores them, and the rows are inserted with a single `executemany`.
+
+    :param table: The attendances columns, as returned by `to_attendance_table`.
+    :type table: pyarrow.Table
+    :return: None
+    """
+    connection = db.session.connection()
+    columns = ', '.join(table.column_names)
+    if connection.dialect.name == 'postgresql':
+        buffer = io.BytesIO()
+        csv.write_csv(table, buffer, csv.WriteOptions(include_header=False))
+        buffer.seek(0)
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(f'COPY {Attendance.__tablename__} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+        return
+
+    values = []
+    for column in table.columns:
+        if pa.types.is_timestamp(column.type):
+            # %S includes the microseconds of the timestamps
+            column = pc.strftime(column, format='%Y-%m-%d %H:%M:%S')
+        elif pa.types.is_date(column.type):
+            column = pc.strftime(column, format='%Y-%m-%d')
+        values.append(column.to_pylist())
+    placeholders = ', '.join('?' * table.num_columns)
+    connection.exec_driver_sql(f'INSERT INTO {Attendance.__tablename__} ({columns}) VALUES ({placeholders})',
+                               list(zip(*values)))
+
+
+def snapshot_files(path):
+    """
+    Lists the Parquet files of a snapshot, sorted by path.
+
+    :param path: A Parquet file or the directory of a dataset.
+    :type path: str
+    :return: The paths of the Parquet files.
+    :rtype: list[str]
+    """
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(path)
+                  for name in names if name.endswith('.parquet'))
+
+
+def load_parquet_to_db(path, batch_size=BATCH_SIZE):
+    """
+    Bulk loads a Parquet snapshot into the database.
+
+    Each file of the dataset is recorded on the `file_records` table once loaded, as the
+    CSV files are, so an interrupted import is resumed from the files not loaded yet and
+    a file is never loaded twice. The rows of a file are committed along with its record,
+    and the cached attendances of its `id_attendance` are invalidated once committed.
+
+    :param path: A Parquet file or the directory of a dataset.
+    :type path: str
+    :param batch_size: Number of rows by record batch.
+    :type batch_size: int
+    :return: The number of imported attendances.
+    :rtype: int
+    """
+    imported = 0
+    for file_path in snapshot_files(path):
+        file_hash = get_file_hash(file_path)
+        if check_file_processed(file_hash):
+            logging.info("File %s already processed. Skipping...", file_path, extra={'file': file_path})
+            continue
+        try:
+            parquet_file = pq.ParquetFile(file_path)
+            resolve_dimensions(parquet_file, batch_size)
+            id_attendances = set()
+            for batch in parquet_file.iter_batches(batch_size=batch_size,
+                                                   columns=[name for name in SNAPSHOT_SCHEMA.names if name != 'id']):
+                table = to_attendance_table(batch)
+                months = pc.unique(pc.floor_temporal(table.column('attendance_date'), unit='month'))
+                attendance_partitions.ensure_partitions(months.to_pylist())
+                insert_attendances(table)
+                id_attendances.update(pc.unique(table.column('id_attendance')).to_pylist())
+                imported += table.num_rows
+            db.session.add(FileRecord(file_name=file_path, processed_at=datetime.now(), hash=file_hash))
+            db.session.commit()
+            attendance_record_cache.invalidate(id_attendance=id_attendances)
+            logging.info("Processed %d records of %s.", parquet_file.metadata.num_rows, file_path,
+                         extra={'file': file_path, 'inserted': parquet_file.metadata.num_rows})
+        except Exception:
+            db.session.rollback()
+            raise
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export or import Parquet snapshots of the attendances')
+    parser.add_argument('command', choices=('export', 'import'))
+    parser.add_argument('path')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if args.command == 'export':
+            export_attendances_to_parquet(args.path, args.batch_size)
+        else:
+            load_parquet_to_db(args.path, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import os
+from datetime import datetime
+
+from flask import jsonify, make_response
+
+from app.utils.sampling_profiler import (sampling_profiler, render_collapsed, ProfilerBusyError, DEFAULT_SECONDS,
+                                         MAX_SECONDS, DEFAULT_INTERVAL_MS, MIN_INTERVAL_MS, MAX_INTERVAL_MS)
+from app.utils.slow_query_log import slow_query_log
+
+
+# Service of the diagnostic endpoints
+class AdminService:
+
+    @staticmethod
+    def get_slow_queries(args):
+        """
+        Retrieves the records of the slow query log of the worker process.
+
+        :param args: The request arguments, with an optional `limit` on the number of
+            records returned.
+        :type args: dict
+        :return: A JSON response with the records, the most recent first, and the
+            settings of the log.
+        :rtype: flask.Response
+        """
+        try:
+            limit = int(args['limit']) if args.get('limit') else None
+            if limit is not None and limit < 1:
+                raise ValueError("LIMIT_MUST_BE_POSITIVE")
+        except ValueError as e:
+            return make_response(jsonify({'message': 'INVALID_LIMIT', 'error': str(e)}), 400)
+
+        return make_response(jsonify({
+            'message': 'SLOW_QUERIES_RETRIEVED',
+            'threshold_ms': round(slow_query_log.threshold_seconds * 1000, 2),
+            'size': slow_query_log.size,
+            'slow_queries': slow_query_log.records(limit),
+        }), 200)
+
+    @staticmethod
+    def get_profile(args):
+        """
+        Samples the stacks of the threads of the worker process and returns them in the
+        collapsed format, as a file for flamegraph.pl or speedscope.
+
+        :param args: The request arguments: the `seconds` of the profile, up to
+            MAX_SECONDS, the `interval_ms` between two samples, up to MAX_INTERVAL_MS,
+            and `idle`, 1 to keep the samples of the idle threads.
+        :type args: dict
+        :return: A plain text response with one `stack count` line by stack, or a JSON
+            error response.
+        :rtype: flask.Response
+        """
+        try:
+            seconds = float(args.get('seconds', DEFAULT_SECONDS))
+            interval_ms = float(args.get('interval_ms', DEFAULT_INTERVAL_MS))
+            if not 0 < seconds <= MAX_SECONDS:
+                raise ValueError(f"SECONDS_MUST_BE_BETWEEN_0_AND_{MAX_SECONDS}")
+            # The chained comparisons are False for NaN, so it is rejected as well
+            if not MIN_INTERVAL_MS <= interval_ms <= MAX_INTERVAL_MS:
+                raise ValueError(f"INTERVAL_MS_MUST_BE_BETWEEN_{MIN_INTERVAL_MS}_AND_{MAX_INTERVAL_MS}")
+        except ValueError as e:
+            return make_response(jsonify({'message': 'INVALID_PROFILE_ARGUMENTS', 'error': str(e)}), 400)
+
+        try:
+            stacks, rounds = sampling_profiler.profile(seconds, interval_ms / 1000, args.get('idle') == '1')
+        except ProfilerBusyError as e:
+            return make_response(jsonify({'message': str(e)}), 409)
+
+        response = make_response(render_collapsed(stacks), 200)
+        response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+        response.headers['Content-Disposition'] = (f'attachment; filename="profile-{os.getpid()}-'
+                                                   f'{datetime.now():%Y%m%d%H%M%S}.folded"')
+        response.headers['X-Profile-Samples'] = str(rounds)
+        return response
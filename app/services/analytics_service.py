@@ -1,13 +1,88 @@
 
-from flask import make_response, jsonify
+from flask import make_response, jsonify, current_app
 from jsonschema.exceptions import ValidationError
 
 from app.repositories.attendance_repository import AttendanceRepository
-from app.utils.date_utils import parse_date, compare_date, business_count_days
+from app.utils.business_calendar import get_business_calendar, REGIONS
+from app.utils.date_utils import parse_date, compare_date, business_count_days, date_buckets, to_date, DATE_BUCKETS
+
+# Page size limits of the productivity leaderboard
+LEADERBOARD_DEFAULT_PAGE_SIZE = 50
+LEADERBOARD_MAX_PAGE_SIZE = 500
+
+# Productivity series limits
+SERIES_GROUP_COLUMNS = ('angel', 'pole')
+SERIES_MAX_BUCKETS = 1500
+
+
+# Backends answering the productivity queries, selected by the ANALYTICS_BACKEND setting
+ANALYTICS_BACKENDS = ('sql', 'columnar')
+
+
+class AnalyticsBackendError(RuntimeError):
+    """
+    Raised when the ANALYTICS_BACKEND setting is unknown. Not a ValueError, which the
+    productivity endpoints report as a bad request, as it is a server misconfiguration.
+    """
+
+
+def check_analytics_backend(backend):
+    """
+    Checks the value of the ANALYTICS_BACKEND setting.
+
+    :param backend: The setting.
+    :type backend: str
+    :return: None
+    :raises AnalyticsBackendError: If the backend is not one of `ANALYTICS_BACKENDS`.
+    """
+    if backend not in ANALYTICS_BACKENDS:
+        raise AnalyticsBackendError('INVALID_ANALYTICS_BACKEND ' + str(backend))
 
 
 class AnalyticsService:
 
+    @staticmethod
+    def get_repository():
+        """
+        Returns the repository answering the productivity queries.
+
+        With `ANALYTICS_BACKEND=columnar` the queries are answered from the in-memory
+        columnar snapshot of the attendances, synced with the database before answering.
+        Otherwise, the default, they are answered by the database. The leaderboard and the
+        series are always answered by the database.
+
+        :return: `AttendanceRepository` or the columnar repository.
+        :raises AnalyticsBackendError: If the configured backend is unknown.
+        """
+        backend = current_app.config.get('ANALYTICS_BACKEND') or 'sql'
+        check_analytics_backend(backend)
+        if backend == 'columnar':
+            # NumPy is only imported when the columnar backend is enabled
+            from app.repositories.columnar_attendance_repository import columnar_attendance_repository
+            columnar_attendance_repository.refresh()
+            return columnar_attendance_repository
+        return AttendanceRepository
+
+    @staticmethod
+    def get_calendar(args):
+        """
+        Returns the business calendar used to count the business days of a request.
+
+        The optional 'region' argument selects the holidays excluded from the business
+        days: 'BR' for the national holidays or a state code, for instance 'BA', for the
+        national and the state holidays. Without it, only the weekends are excluded.
+
+        :param args: The request arguments.
+        :type args: dict
+        :return: The business calendar of the requested region.
+        :rtype: BusinessCalendar
+        :raises ValidationError: If the region is unknown.
+        """
+        region = args.get('region')
+        if region and region.upper() not in REGIONS:
+            raise ValidationError("INVALID_REGION")
+        return get_business_calendar(region)
+
     @staticmethod
     def get_productivity_by_period(args):
         """
@@ -38,9 +113,9 @@ class AnalyticsService:
 
             compare_date(start_date, end_date)
 
-            attendances = AttendanceRepository.get_attendances_by_period(start_date, end_date)
+            attendances = AnalyticsService.get_repository().get_attendances_by_period(start_date, end_date)
 
-            business_days = business_count_days(start_date, end_date)
+            business_days = business_count_days(start_date, end_date, AnalyticsService.get_calendar(args))
 
             result = list(map(lambda attendance: {
                 'angel': attendance.angel,
@@ -66,12 +141,13 @@ class AnalyticsService:
     
             angel = args.get('angel')
 
-            productivity_data = AttendanceRepository.get_productivity_by_angel(angel)
+            productivity_data = AnalyticsService.get_repository().get_productivity_by_angel(angel)
 
             if not productivity_data:
                 return make_response(jsonify({'message': 'NO_DATA_FOUND'}), 404)
 
-            business_days = business_count_days(productivity_data[0].start_date, productivity_data[0].end_date)
+            business_days = business_count_days(productivity_data[0].start_date, productivity_data[0].end_date,
+                                                AnalyticsService.get_calendar(args))
 
             result = list(map(lambda attendance: {
                 'angel': attendance.angel,
@@ -125,12 +201,13 @@ class AnalyticsService:
 
             angel = args.get('angel')
 
-            productivity_data = AttendanceRepository.get_productivity_by_period_with_angel(start_date, end_date, angel)
+            productivity_data = AnalyticsService.get_repository().get_productivity_by_period_with_angel(
+                start_date, end_date, angel)
 
             if not productivity_data:
                 return make_response(jsonify({'message': 'NO_DATA_FOUND'}), 404)
 
-            business_days = business_count_days(start_date, end_date)
+            business_days = business_count_days(start_date, end_date, AnalyticsService.get_calendar(args))
 
             result = list(map(lambda attendance: {
                 'angel': attendance.angel,
@@ -182,7 +259,8 @@ class AnalyticsService:
 
             pole = args.get('pole')
 
-            productivity_data = AttendanceRepository.get_productivity_by_logistics_pole_and_period(pole, start_date, end_date)
+            productivity_data = AnalyticsService.get_repository().get_productivity_by_logistics_pole_and_period(
+                pole, start_date, end_date)
 
             if not productivity_data:
                 return make_response(jsonify({'message': 'NO_DATA_FOUND'}), 404)
@@ -203,3 +281,152 @@ class AnalyticsService:
         except ValidationError as e:
             return jsonify({'message': 'Missing data.', 'error': str(e)}), 400
 
+    @staticmethod
+    def get_productivity_leaderboard(args):
+        """
+        Ranks every angel by productivity within a given period.
+
+        A single grouped query returns, for each angel, the total, on-time and delayed
+        attendances, so a dashboard does not need to call the angel endpoint once per angel.
+        The ranking, the `top_k` cut and the pagination are pushed down to the database.
+
+        :param args: A dictionary containing:
+            - 'start_date' and 'end_date' (required): The period to analyze.
+            - 'order_by' (optional): The ranking column, prefixed by '-' for descending order.
+              Defaults to '-total_attendances'.
+            - 'top_k' (optional): Maximum number of ranked angels considered.
+            - 'page' and 'per_page' (optional): The page of the ranking to return.
+        :type args: dict
+        :return: A JSON response containing the ranked productivity data, the business days
+            of the period and the pagination values, or an error message when the input data
+            is invalid.
+        :rtype: flask.Response
+        """
+        try:
+            if not args.get('end_date') or not args.get('start_date'):
+                raise ValidationError("NO_DATE_SEND")
+
+            start_date = parse_date(args.get('start_date'))
+            end_date = parse_date(args.get('end_date'))
+
+            compare_date(start_date, end_date)
+
+            order_by = args.get('order_by', '-total_attendances')
+            descending = order_by.startswith('-')
+            order_by = order_by[1:] if descending else order_by
+            if order_by not in AttendanceRepository.LEADERBOARD_ORDER_COLUMNS:
+                raise ValidationError("INVALID_ORDER_BY")
+
+            page = int(args.get('page', 1))
+            per_page = int(args.get('per_page', LEADERBOARD_DEFAULT_PAGE_SIZE))
+            top_k = int(args['top_k']) if args.get('top_k') else None
+            if page <= 0 or not 0 < per_page <= LEADERBOARD_MAX_PAGE_SIZE or (top_k is not None and top_k <= 0):
+                raise ValidationError("INVALID_PAGINATION")
+
+            offset = (page - 1) * per_page
+            limit = per_page if top_k is None else max(0, min(per_page, top_k - offset))
+
+            productivity_data = AttendanceRepository.get_productivity_leaderboard(
+                start_date, end_date, order_by, descending, limit, offset) if limit else []
+
+            business_days = business_count_days(start_date, end_date, AnalyticsService.get_calendar(args))
+
+            result = list(map(lambda attendance: {
+                'angel': attendance.angel,
+                'total_attendances': attendance.total_attendances,
+                'on_time_attendances': attendance.on_time_attendances,
+                'delayed_attendances': attendance.delayed_attendances,
+                'productivity_mean': attendance.total_attendances / business_days if business_days > 0 else 0,
+                'on_time_percentage': float(attendance.on_time_percentage)
+            }, productivity_data))
+
+            return make_response(jsonify({'message': 'PRODUCTIVITY_RETRIEVED',
+                                          'productivity_leaderboard': result,
+                                          'business_days': business_days,
+                                          'page': page,
+                                          'per_page': per_page,
+                                          'top_k': top_k}), 201)
+        except ValueError as e:
+            return jsonify({'message': 'Invalid data format', 'error': str(e)}), 400
+        except ValidationError as e:
+            return jsonify({'message': 'Invalid data.', 'error': str(e)}), 400
+
+    @staticmethod
+    def get_productivity_series(args):
+        """
+        Computes the productivity of every angel or pole by day, week or month within a
+        given period.
+
+        The attendances are grouped by bucket and by angel or pole in a single query. The
+        buckets without attendances are filled with zeros, and the business days of each
+        bucket are counted within the period, so a trend chart needs one request.
+
+        :param args: A dictionary containing:
+            - 'start_date' and 'end_date' (required): The period to analyze.
+            - 'bucket' (optional): 'day', 'week' or 'month'. Defaults to 'day'.
+            - 'group_by' (optional): 'angel' or 'pole'. Defaults to 'angel'.
+            - 'angel' or 'pole' (optional): Restricts the series to a single angel or pole,
+              according to the `group_by` value.
+        :type args: dict
+        :return: A JSON response containing the buckets with their business days and the
+            productivity series of each angel or pole, or an error message when the input
+            data is invalid.
+        :rtype: flask.Response
+        """
+        try:
+            if not args.get('end_date') or not args.get('start_date'):
+                raise ValidationError("NO_DATE_SEND")
+
+            bucket = args.get('bucket', 'day')
+            if bucket not in DATE_BUCKETS:
+                raise ValidationError("INVALID_BUCKET")
+
+            group_by = args.get('group_by', 'angel')
+            if group_by not in SERIES_GROUP_COLUMNS:
+                raise ValidationError("INVALID_GROUP_BY")
+
+            start_date = parse_date(args.get('start_date'))
+            end_date = parse_date(args.get('end_date'))
+
+            compare_date(start_date, end_date)
+
+            buckets = date_buckets(start_date, end_date, bucket)
+            if len(buckets) > SERIES_MAX_BUCKETS:
+                raise ValidationError("TOO_MANY_BUCKETS")
+
+            productivity_data = AttendanceRepository.get_productivity_series(
+                start_date, end_date, bucket, group_by, args.get(group_by))
+
+            calendar = AnalyticsService.get_calendar(args)
+            business_days = [business_count_days(range_start, range_end, calendar)
+                             for _, range_start, range_end in buckets]
+            bucket_index = {bucket_start: index for index, (bucket_start, _, _) in enumerate(buckets)}
+
+            # Zero filled series of each angel or pole, indexed as the buckets
+            series = {}
+            for attendance in productivity_data:
+                values = series.setdefault(attendance.group, [(0, 0)] * len(buckets))
+                index = bucket_index[to_date(attendance.bucket_start)]
+                values[index] = (attendance.total_attendances, attendance.on_time_attendances)
+
+            result = [{
+                group_by: group,
+                'series': [{
+                    'bucket_start': bucket_start.isoformat(),
+                    'total_attendances': total_attendances,
+                    'on_time_attendances': on_time_attendances,
+                    'productivity_mean': total_attendances / days if days > 0 else 0
+                } for (bucket_start, _, _), days, (total_attendances, on_time_attendances)
+                    in zip(buckets, business_days, values)]
+            } for group, values in series.items()]
+
+            return make_response(jsonify({'message': 'PRODUCTIVITY_RETRIEVED',
+                                          'bucket': bucket,
+                                          'group_by': group_by,
+                                          'buckets': [{'bucket_start': bucket_start.isoformat(), 'business_days': days}
+                                                      for (bucket_start, _, _), days in zip(buckets, business_days)],
+                                          'productivity_series': result}), 201)
+        except ValueError as e:
+            return jsonify({'message': 'Invalid date format', 'error': str(e)}), 400
+        except ValidationError as e:
+            return jsonify({'message': 'Invalid data.', 'error': str(e)}), 400
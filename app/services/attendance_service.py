@@ -1,26 +1,45 @@
+from collections import Counter
+
 from flask import jsonify, make_response
-from sqlalchemy import insert, desc
+from sqlalchemy import desc
 from sqlalchemy.exc import SQLAlchemyError
-from app.dto.attendance import AttendanceCreationSchema
+from app.dto.attendance import AttendanceCreationSchema, AttendanceUpdateSchema
 from app.models.attendance.attendance_model import Attendance
 from app.config.config import db
 from marshmallow import ValidationError
 
 from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.dimension_repository import angel_repository, pole_repository
 from app.schemas.attendance_schema import AttendanceSchema
+from app.schemas.schema_registry import schema_registry
 from app.utils.date_utils import parse_date
+from app.utils.record_cache import attendance_record_cache
 """
     Service for creating and updating attendance records.
 
     Methods:
         create_attendance: Validates input and creates a new attendance record.
         update_attendance: Updates an existing attendance record by ID.
+        bulk_update_attendances: Updates the given fields of many attendance records.
+        bulk_retrieve_attendances: Retrieves many attendance records by id.
+
+    The attendances read by id are kept serialized on the `attendance_record_cache`,
+    invalidated by the create and update paths of the AttendanceRepository.
     """
+# Items of a bulk update
+BULK_UPDATE_MAX_ITEMS = 10000
+# Values of a bulk retrieve, and the column matched by each field of its payload
+BULK_RETRIEVE_MAX_KEYS = 5000
+BULK_RETRIEVE_FIELDS = {'ids': 'id', 'id_attendance': 'id_attendance'}
+# Largest value of the INTEGER columns matched
+MAX_INTEGER = 2 ** 31 - 1
+
+
 class AttendanceService:
     # TODO: Remove database queries from service and move to repository
     @staticmethod
     def create_attendance(data):
-        attendance_creation_schema = AttendanceCreationSchema()
+        attendance_creation_schema = schema_registry.get(AttendanceCreationSchema)
         try:
             # Uses the schema validator to validate the data
             # @TODO: Remove validations from services
@@ -42,29 +61,18 @@ class AttendanceService:
     @staticmethod
     def update_attendance(data, id):
 
-        attendance_creation_schema = AttendanceCreationSchema()
+        attendance_creation_schema = schema_registry.get(AttendanceCreationSchema)
         try:
-            # Using the attendance repository to find an attendance register on db
-            attendance_record = AttendanceRepository.get_attendance_by_id(id)
+            # Using the attendance repository to check the attendance register exists on db
+            AttendanceRepository.get_attendance_by_id(id)
 
 
             # @TODO: Remove validations from services
             # Uses the schema validator to validate the data
             validated_data = attendance_creation_schema.load(data)
 
-            attendance_record.attendance = validated_data
-
-            # Place an object into the db session
-            db.session.execute(
-                insert(Attendance).values(id_attendance=attendance_record.id_attendance,
-                                          id_client=attendance_record.id_client,
-                                          angel=attendance_record.angel,
-                                          pole=attendance_record.pole,
-                                          deadline=attendance_record.deadline,
-                                          attendance_date=attendance_record.attendance_date)
-            )
-            # Commit the db changes
-            db.session.commit()
+            # Write the validated values and the derived on-time columns on the found record
+            AttendanceRepository.update_attendance(id, validated_data)
 
             return make_response(jsonify({'message': 'ATTENDANCE_UPDATED'}), 201)
         except ValidationError as ve:
@@ -77,14 +85,69 @@ class AttendanceService:
             db.session.rollback()
             return make_response(jsonify({'message': 'ATTENDANCE_NOT_UPDATED', 'error': str(e)}), 500)
 
+    @staticmethod
+    def bulk_update_attendances(data):
+        """
+        Updates the given fields of many attendances. The items are validated with a
+        single pass of the `AttendanceUpdateSchema`, and the valid ones are written in a
+        single transaction.
+
+        :param data: The items, each with the `id` of its attendance and the fields to
+            write.
+        :type data: list[dict]
+        :return: A JSON response with the result of each item, in the order of the
+            request: `ATTENDANCE_UPDATED`, `ATTENDANCE_NOT_FOUND`, `INVALID_DATA` along
+            with its errors, or `DUPLICATE_ID` when several items have the same id, none
+            of them being applied.
+        :rtype: flask.Response
+        """
+        if not isinstance(data, list) or not data:
+            return make_response(jsonify({'message': 'INVALID_DATA', 'error': 'EXPECTED_A_LIST_OF_ATTENDANCES'}), 400)
+        if len(data) > BULK_UPDATE_MAX_ITEMS:
+            return make_response(jsonify({'message': 'INVALID_DATA',
+                                          'error': f'AT_MOST_{BULK_UPDATE_MAX_ITEMS}_ATTENDANCES'}), 400)
+
+        schema = schema_registry.get(AttendanceUpdateSchema, many=True)
+        try:
+            items, errors = schema.load(data), {}
+        except ValidationError as ve:
+            items, errors = ve.valid_data, ve.messages
+
+        valid = [index for index in range(len(data)) if index not in errors]
+        ids = Counter(items[index]['id'] for index in valid)
+        results = [None] * len(data)
+        for index in range(len(data)):
+            if index in errors:
+                id = data[index].get('id') if isinstance(data[index], dict) else None
+                results[index] = {'id': id, 'result': 'INVALID_DATA', 'errors': errors[index]}
+            elif ids[items[index]['id']] > 1:
+                results[index] = {'id': items[index]['id'], 'result': 'DUPLICATE_ID'}
+
+        applied = [index for index in valid if results[index] is None]
+        try:
+            not_found = AttendanceRepository.bulk_update_attendances([items[index] for index in applied])
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            return make_response(jsonify({'message': 'DATABASE_ERROR', 'error': str(e.__cause__)}), 500)
+
+        for index in applied:
+            id = items[index]['id']
+            results[index] = {'id': id, 'result': 'ATTENDANCE_NOT_FOUND' if id in not_found else 'ATTENDANCE_UPDATED'}
+        return make_response(jsonify({'message': 'ATTENDANCES_UPDATED',
+                                      'counts': Counter(result['result'] for result in results),
+                                      'results': results}), 200)
+
     # TODO: Remove database queries from service and move to repository
     @staticmethod
     def retrieve_attendance(id):
 
-        attendance_schema = AttendanceSchema()
+        attendance_schema = schema_registry.get(AttendanceSchema)
         try:
-            # Uses the schema validator to validate the data
-            attendance = attendance_schema.dump(AttendanceRepository.get_attendance_by_id(id))
+            attendance = attendance_record_cache.get(id)
+            if attendance is None:
+                generation = attendance_record_cache.generation
+                attendance = attendance_schema.dump(AttendanceRepository.get_attendance_by_id(id))
+                attendance_record_cache.put([attendance], generation)
 
             return make_response(jsonify({'message': 'ATTENDANCE_FOUND', 'attendance': attendance}), 201)
         except ValidationError as ve:
@@ -97,6 +160,60 @@ class AttendanceService:
             db.session.rollback()
             return make_response(jsonify({'message': 'ATTENDANCE_NOT_FOUND', 'error': str(e)}), 500)
 
+    @staticmethod
+    def bulk_retrieve_attendances(data):
+        """
+        Retrieves many attendances with a single query, by their `ids` or by their
+        `id_attendance` values.
+
+        :param data: The payload, with either a list of `ids` or a list of
+            `id_attendance` values.
+        :type data: dict
+        :return: A JSON response with an entry by requested value, in the order of the
+            request: the attendance, or `ATTENDANCE_NOT_FOUND`. A value matching several
+            attendances, as an `id_attendance` loaded twice, gets an entry by attendance.
+        :rtype: flask.Response
+        """
+        try:
+            fields = [field for field in BULK_RETRIEVE_FIELDS if isinstance(data, dict) and field in data]
+            if len(fields) != 1:
+                raise ValueError('EXPECTED_IDS_OR_ID_ATTENDANCE')
+            field = fields[0]
+            key = BULK_RETRIEVE_FIELDS[field]
+            values = data[field]
+            if not isinstance(values, list) or not values:
+                raise ValueError(f'{field.upper()}_MUST_BE_A_NON_EMPTY_LIST')
+            if len(values) > BULK_RETRIEVE_MAX_KEYS:
+                raise ValueError(f'AT_MOST_{BULK_RETRIEVE_MAX_KEYS}_{field.upper()}')
+            if not all(type(value) is int and 0 < value <= MAX_INTEGER for value in values):
+                raise ValueError(f'{field.upper()}_MUST_BE_POSITIVE_INTEGERS')
+        except ValueError as e:
+            return make_response(jsonify({'message': 'INVALID_DATA', 'error': str(e)}), 400)
+
+        unique = list(dict.fromkeys(values))
+        found = attendance_record_cache.find(key, unique)
+        missing = [value for value in unique if value not in found]
+        if missing:
+            generation = attendance_record_cache.generation
+            try:
+                attendances = AttendanceRepository.get_attendances_by_keys(key, missing)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                return make_response(jsonify({'message': 'DATABASE_ERROR', 'error': str(e.__cause__)}), 500)
+            dumped = schema_registry.get(AttendanceSchema, many=True).dump(attendances)
+            attendance_record_cache.put(dumped, generation, key, missing)
+            for attendance in dumped:
+                found.setdefault(attendance[key], []).append(attendance)
+        results = []
+        for value in values:
+            results.extend({key: value, 'result': 'ATTENDANCE_FOUND', 'attendance': attendance}
+                           for attendance in found.get(value, ()))
+            if value not in found:
+                results.append({key: value, 'result': 'ATTENDANCE_NOT_FOUND'})
+        return make_response(jsonify({'message': 'ATTENDANCES_RETRIEVED',
+                                      'found': sum(len(attendances) for attendances in found.values()),
+                                      'not_found': len(unique) - len(found), 'attendances': results}), 200)
+
     # TODO: Remove database queries from service and move to repository
     @staticmethod
     def get_all_attendances(args):
@@ -130,8 +247,8 @@ class AttendanceService:
                 Attendance.attendance_date == v[0],
                 Attendance.deadline == v[1]
             ) if v and v[0] and v[1] else q,
-            'pole': lambda q, v: q.filter(Attendance.pole == v) if v else q,
-            'angel': lambda q, v: q.filter(Attendance.angel == v) if v else q,
+            'pole': lambda q, v: q.filter(Attendance.pole_id == pole_repository.find_id(v)) if v else q,
+            'angel': lambda q, v: q.filter(Attendance.angel_id == angel_repository.find_id(v)) if v else q,
             'id_attendance': lambda q, v: q.filter(Attendance.id_attendance == v) if v else q
         }
 
@@ -159,7 +276,7 @@ class AttendanceService:
                     query = query.order_by(field)
 
         attendances = query.all()
-        schema = AttendanceSchema(many=True)
+        schema = schema_registry.get(AttendanceSchema, many=True)
         result = schema.dump(attendances)
         return jsonify(result)
 
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from flask import jsonify, make_response
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.ingest_progress_model import INGEST_STATUSES
+from app.repositories.ingest_progress_repository import IngestProgressRepository
+from app.repositories.ingest_reject_repository import IngestRejectRepository
+
+# Ingests listed by default, and at most
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+
+# Service of the ingest endpoints
+class IngestService:
+
+    @staticmethod
+    def get_status(args):
+        """
+        Retrieves the progress of an ingest, or of the most recently started ones.
+
+        :param args: The request arguments: a `file_hash`, or an optional `status` and
+            `limit`, up to MAX_LIMIT.
+        :type args: dict
+        :return: A JSON response with the progress of the ingest of the file, along with
+            its rejected rows by reason, or the progress of the ingests, the most
+            recently started first.
+        :rtype: flask.Response
+        """
+        try:
+            limit = int(args.get('limit', DEFAULT_LIMIT))
+            if not 0 < limit <= MAX_LIMIT:
+                raise ValueError(f"LIMIT_MUST_BE_BETWEEN_1_AND_{MAX_LIMIT}")
+            status = args.get('status') or None
+            if status is not None and status not in INGEST_STATUSES:
+                raise ValueError(f"STATUS_MUST_BE_ONE_OF_{'_'.join(INGEST_STATUSES).upper()}")
+        except ValueError as e:
+            return make_response(jsonify({'message': 'INVALID_INGEST_STATUS_ARGUMENTS', 'error': str(e)}), 400)
+
+        now = datetime.now()
+        try:
+            if args.get('file_hash'):
+                progress = IngestProgressRepository.get_by_file_hash(args['file_hash'])
+                if progress is None:
+                    return make_response(jsonify({'message': 'INGEST_NOT_FOUND'}), 404)
+                ingest = progress.to_dict(now)
+                ingest['rejects_by_error_code'] = IngestRejectRepository.count_rejects_by_error_code(progress.file_hash)
+                return make_response(jsonify({'message': 'INGEST_STATUS_RETRIEVED', 'ingest': ingest}), 200)
+
+            ingests = IngestProgressRepository.get_recent(limit, status)
+            return make_response(jsonify({'message': 'INGEST_STATUS_RETRIEVED',
+                                          'ingests': [progress.to_dict(now) for progress in ingests]}), 200)
+        except SQLAlchemyError as e:
+            return make_response(jsonify({'message': 'DATABASE_ERROR', 'error': str(e.__cause__)}), 500)
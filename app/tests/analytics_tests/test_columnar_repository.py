@@ -0,0 +1,117 @@
+import time
+import unittest
+from datetime import datetime
+
+import numpy as np
+from flask import Flask
+
+from app.repositories.columnar_attendance_repository import (
+    ColumnarAttendanceRepository, NULL_EPOCH, to_epoch
+)
+from app.services.analytics_service import AnalyticsBackendError, AnalyticsService
+
+
+def row(id, angel, pole, attendance_date, deadline):
+    return [id, angel, pole, to_epoch(attendance_date) if attendance_date else NULL_EPOCH, to_epoch(deadline)]
+
+
+class TestColumnarAttendanceRepository(unittest.TestCase):
+    """
+    Unit tests for the `ColumnarAttendanceRepository`.
+
+    The snapshot is built from in-memory rows, so the tests validate the vectorized
+    queries and the incremental merge without a database.
+    """
+
+    def setUp(self):
+
+        self.repository = ColumnarAttendanceRepository()
+        self.repository._angel_ids = {'Angel A': 1, 'Angel B': 2}
+        self.repository._angel_names = {1: 'Angel A', 2: 'Angel B'}
+        self.repository._pole_ids = {'Pole X': 1}
+        self.repository._pole_names = {1: 'Pole X'}
+        self.load([
+            row(1, 1, 1, datetime(2021, 6, 1, 10), datetime(2021, 6, 1, 12)),
+            row(2, 1, 1, datetime(2021, 6, 15, 10), datetime(2021, 6, 14, 12)),
+            row(3, 2, 1, datetime(2021, 7, 1, 10), datetime(2021, 7, 2, 12)),
+            row(4, 2, 1, None, datetime(2021, 7, 2, 12)),
+        ])
+
+    def load(self, rows):
+        self.repository._snapshot = ColumnarAttendanceRepository._merge(
+            self.repository._snapshot, np.array(rows, dtype=np.int64))
+        self.repository._synced_at = time.monotonic()
+
+    def test_attendances_by_period(self):
+        """
+        Tests that the attendances of each angel are counted within the period, with
+        their first and last attendance dates.
+        """
+        rows = self.repository.get_attendances_by_period(datetime(2021, 6, 1), datetime(2021, 7, 31))
+
+        self.assertEqual([tuple(row) for row in rows], [
+            ('Angel A', 2, datetime(2021, 6, 1, 10), datetime(2021, 6, 15, 10)),
+            ('Angel B', 1, datetime(2021, 7, 1, 10), datetime(2021, 7, 1, 10)),
+        ])
+
+    def test_productivity_by_angel_counts_attendances_without_date(self):
+        """
+        Tests that all the attendances of an angel are counted, while its first and last
+        dates ignore the attendances without a date.
+        """
+        rows = self.repository.get_productivity_by_angel('Angel B')
+
+        self.assertEqual(tuple(rows[0]), ('Angel B', 2, datetime(2021, 7, 1, 10), datetime(2021, 7, 1, 10), 1))
+        self.assertEqual(self.repository.get_productivity_by_angel('Unknown'), [])
+
+    def test_pole_on_time_attendances(self):
+        """
+        Tests that the on-time attendances of a pole are computed from the dates.
+        """
+        rows = self.repository.get_productivity_by_logistics_pole_and_period(
+            'Pole X', datetime(2021, 6, 1), datetime(2021, 6, 30))
+
+        self.assertEqual(tuple(rows[0]), ('Pole X', 2, 1))
+
+    def test_merge_updates_and_appends_rows(self):
+        """
+        Tests that a sync updates the rows already on the snapshot and appends the new
+        ones, keeping the rows sorted by id.
+        """
+        self.load([
+            row(2, 1, 1, datetime(2021, 6, 14, 10), datetime(2021, 6, 14, 12)),
+            row(6, 2, 1, datetime(2021, 6, 20, 10), datetime(2021, 6, 20, 12)),
+        ])
+        self.load([row(5, 1, 1, datetime(2021, 6, 21, 10), datetime(2021, 6, 21, 12))])
+
+        snapshot = self.repository.snapshot
+        self.assertEqual(snapshot.id.tolist(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.repository.get_productivity_by_period_with_angel(
+            datetime(2021, 6, 1), datetime(2021, 6, 30), 'Angel A')[0].total_attendances, 3)
+        self.assertEqual(self.repository.get_productivity_by_logistics_pole_and_period(
+            'Pole X', datetime(2021, 6, 1), datetime(2021, 6, 30))[0].on_time_attendances, 4)
+
+    def test_merge_does_not_change_a_published_snapshot(self):
+        """
+        Tests that the rows updated by a sync are written to a new snapshot, the one read
+        by a running query keeping its values.
+        """
+        published = self.repository.snapshot
+        self.load([row(2, 2, 1, datetime(2021, 6, 13, 10), datetime(2021, 6, 14, 12))])
+
+        self.assertIsNot(self.repository.snapshot, published)
+        self.assertEqual(published.angel[:published.size].tolist(), [1, 1, 2, 2])
+        self.assertEqual(published.on_time[:published.size].tolist(), [True, False, True, False])
+        self.assertEqual(self.repository.snapshot.angel[:4].tolist(), [1, 2, 2, 2])
+        self.assertEqual(self.repository.snapshot.on_time[:4].tolist(), [True, True, True, False])
+
+    def test_unknown_backend_is_not_a_bad_request(self):
+        """
+        Tests that an unknown ANALYTICS_BACKEND is raised as a server error, rather than
+        reported to the client as an invalid date.
+        """
+        app = Flask(__name__)
+        app.config['ANALYTICS_BACKEND'] = 'duckdb'
+        with app.app_context():
+            with self.assertRaises(AnalyticsBackendError):
+                AnalyticsService.get_productivity_by_angel({'angel': 'Angel A'})
@@ -0,0 +1,189 @@
+import unittest
+from collections import namedtuple
+from datetime import datetime
+from unittest.mock import patch
+from flask import Flask
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.dimension_repository import angel_repository, pole_repository
+from app.services.analytics_service import AnalyticsService
+
+
+LeaderboardRow = namedtuple('LeaderboardRow', ['angel', 'total_attendances', 'on_time_attendances',
+                                               'delayed_attendances', 'on_time_percentage'])
+
+
+class TestProductivityLeaderboard(unittest.TestCase):
+    """
+    Unit tests for the `get_productivity_leaderboard` method of the AnalyticsService.
+
+    The repository is mocked, so the tests validate the arguments parsing, the
+    pagination values pushed down to the query and the response format.
+
+    :ivar valid_args: A valid set of query parameters used for testing.
+    :type valid_args: dict
+    """
+    valid_args = {
+        "start_date": "01/06/2021",
+        "end_date": "30/06/2021",
+    }
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        # Mock the repository query
+        self.repository_mock = patch(
+            'app.repositories.attendance_repository.AttendanceRepository.get_productivity_leaderboard',
+            return_value=[LeaderboardRow('Angel A', 44, 33, 11, 75.0)]
+        ).start()
+        self.addCleanup(patch.stopall)
+
+    def tearDown(self):
+
+        self.app_context.pop()
+
+    def test_leaderboard_valid_data(self):
+        """
+        Tests that the leaderboard returns the productivity of the angels with the
+        default ranking and page.
+        """
+        response = AnalyticsService.get_productivity_leaderboard(self.valid_args)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['business_days'], 22)
+        self.assertEqual(response.json['productivity_leaderboard'][0], {
+            'angel': 'Angel A',
+            'total_attendances': 44,
+            'on_time_attendances': 33,
+            'delayed_attendances': 11,
+            'productivity_mean': 2,
+            'on_time_percentage': 75.0
+        })
+
+        args = self.repository_mock.call_args.args
+        self.assertEqual(args[2:], ('total_attendances', True, 50, 0))
+
+    def test_leaderboard_top_k_limits_the_last_page(self):
+        """
+        Tests that the `top_k` cut is applied to the limit of the requested page.
+        """
+        args = {**self.valid_args, 'order_by': 'on_time_percentage', 'top_k': '5', 'per_page': '3', 'page': '2'}
+
+        response = AnalyticsService.get_productivity_leaderboard(args)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.repository_mock.call_args.args[2:], ('on_time_percentage', False, 2, 3))
+
+    def test_leaderboard_page_after_top_k(self):
+        """
+        Tests that a page after the `top_k` cut is empty and does not query the database.
+        """
+        args = {**self.valid_args, 'top_k': '5', 'per_page': '5', 'page': '2'}
+
+        response = AnalyticsService.get_productivity_leaderboard(args)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['productivity_leaderboard'], [])
+        self.repository_mock.assert_not_called()
+
+    def test_leaderboard_missing_date(self):
+        """
+        Tests that both dates of the period are required.
+        """
+        response, status_code = AnalyticsService.get_productivity_leaderboard({'start_date': '01/06/2021'})
+
+        self.assertEqual(status_code, 400)
+        self.assertEqual(response.json['error'], 'NO_DATE_SEND')
+        self.repository_mock.assert_not_called()
+
+    def test_leaderboard_invalid_order_by(self):
+        """
+        Tests that only the aggregated columns can be used to rank the angels.
+        """
+        for order_by in ('-id_client', '--total_attendances', '---angel'):
+            response, status_code = AnalyticsService.get_productivity_leaderboard(
+                {**self.valid_args, 'order_by': order_by})
+
+            self.assertEqual(status_code, 400)
+            self.assertEqual(response.json['error'], 'INVALID_ORDER_BY')
+        self.repository_mock.assert_not_called()
+
+    def test_leaderboard_invalid_page_size(self):
+        """
+        Tests that the page size is bounded.
+        """
+        args = {**self.valid_args, 'per_page': '100000'}
+
+        response, status_code = AnalyticsService.get_productivity_leaderboard(args)
+
+        self.assertEqual(status_code, 400)
+        self.assertEqual(response.json['error'], 'INVALID_PAGINATION')
+        self.repository_mock.assert_not_called()
+
+
+class TestProductivityLeaderboardQuery(unittest.TestCase):
+    """
+    Tests the grouped query of `AttendanceRepository.get_productivity_leaderboard` on an
+    in-memory SQLite database.
+    """
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        angel_repository.clear()
+        pole_repository.clear()
+
+        # Angel A: 3 attendances in June, 2 on time. Angel B: 2, 2 on time. Angel C: 1, late
+        attendances = [
+            Attendance(id_attendance=index, id_client=1, angel=angel, pole='Pole X',
+                       deadline=datetime(2021, 6, day, 12), attendance_date=datetime(2021, 6, day, hour))
+            for index, (angel, day, hour) in enumerate([
+                ('Angel A', 1, 10), ('Angel A', 2, 10), ('Angel A', 3, 14),
+                ('Angel B', 4, 10), ('Angel B', 5, 10),
+                ('Angel C', 6, 14),
+            ])
+        ]
+        # Out of the period
+        attendances.append(Attendance(id_attendance=99, id_client=1, angel='Angel C', pole='Pole X',
+                                      deadline=datetime(2021, 7, 1, 12), attendance_date=datetime(2021, 7, 1, 10)))
+        AttendanceRepository.resolve_dimensions(attendances)
+        db.session.add_all(attendances)
+        db.session.commit()
+
+    def tearDown(self):
+
+        db.session.remove()
+        db.drop_all()
+        angel_repository.clear()
+        pole_repository.clear()
+        self.app_context.pop()
+
+    def test_angels_are_ranked_within_the_period(self):
+        """
+        Tests the aggregated columns of each angel and their ranking.
+        """
+        rows = AttendanceRepository.get_productivity_leaderboard(datetime(2021, 6, 1), datetime(2021, 6, 30, 23, 59))
+
+        self.assertEqual([(row.angel, row.total_attendances, row.on_time_attendances, row.delayed_attendances)
+                          for row in rows],
+                         [('Angel A', 3, 2, 1), ('Angel B', 2, 2, 0), ('Angel C', 1, 0, 1)])
+        self.assertAlmostEqual(rows[0].on_time_percentage, 200 / 3)
+
+    def test_order_limit_and_offset_are_applied_by_the_query(self):
+        """
+        Tests the ascending order and the page of angels returned.
+        """
+        rows = AttendanceRepository.get_productivity_leaderboard(
+            datetime(2021, 6, 1), datetime(2021, 6, 30, 23, 59), 'on_time_percentage', False, 2, 1)
+
+        self.assertEqual([row.angel for row in rows], ['Angel A', 'Angel B'])
@@ -0,0 +1,123 @@
+import unittest
+from datetime import datetime
+
+from flask import Flask
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.dimension_repository import angel_repository, pole_repository
+from app.services.analytics_service import AnalyticsService
+from app.utils.date_utils import date_buckets
+
+
+class TestProductivitySeries(unittest.TestCase):
+    """
+    Tests the productivity series on an in-memory SQLite database, where the buckets are
+    truncated with the SQLite date functions instead of `date_trunc`.
+    """
+    period = {'start_date': '01/06/2021', 'end_date': '31/07/2021'}
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        angel_repository.clear()
+        pole_repository.clear()
+
+        # 2021-06-06 is a Sunday, of the week starting on Monday 2021-05-31
+        attendances = [
+            Attendance(id_attendance=index, id_client=1, angel=angel, pole=pole,
+                       deadline=datetime(2021, month, day, 12), attendance_date=datetime(2021, month, day, hour))
+            for index, (angel, pole, month, day, hour) in enumerate([
+                ('Angel A', 'Pole X', 6, 1, 10),
+                ('Angel A', 'Pole X', 6, 6, 14),
+                ('Angel A', 'Pole X', 6, 7, 10),
+                ('Angel A', 'Pole X', 7, 5, 10),
+                ('Angel B', 'Pole Y', 6, 15, 10),
+                # Out of the period
+                ('Angel B', 'Pole Y', 8, 2, 10),
+            ])
+        ]
+        AttendanceRepository.resolve_dimensions(attendances)
+        db.session.add_all(attendances)
+        db.session.commit()
+
+    def tearDown(self):
+
+        db.session.remove()
+        db.drop_all()
+        angel_repository.clear()
+        pole_repository.clear()
+        self.app_context.pop()
+
+    def series(self, args):
+        response = AnalyticsService.get_productivity_series({**self.period, **args})
+        self.assertEqual(response.status_code, 201)
+        return response.json, {entry[args.get('group_by', 'angel')]: entry['series']
+                               for entry in response.json['productivity_series']}
+
+    def test_week_buckets_match_date_buckets(self):
+        """
+        Tests that the weeks of the query start on the Mondays of `date_buckets`, the
+        weeks without attendances being filled with zeros.
+        """
+        body, series = self.series({'bucket': 'week'})
+        expected = [bucket_start.isoformat() for bucket_start, _, _ in
+                    date_buckets(datetime(2021, 6, 1), datetime(2021, 7, 31), 'week')]
+
+        self.assertEqual([bucket['bucket_start'] for bucket in body['buckets']], expected)
+        self.assertEqual([entry['bucket_start'] for entry in series['Angel A']], expected)
+        totals = {entry['bucket_start']: entry['total_attendances'] for entry in series['Angel A']}
+        self.assertEqual(totals, {**dict.fromkeys(expected, 0), '2021-05-31': 2, '2021-06-07': 1, '2021-07-05': 1})
+        on_time = {entry['bucket_start']: entry['on_time_attendances'] for entry in series['Angel A']}
+        self.assertEqual(on_time['2021-05-31'], 1)
+
+    def test_month_buckets_are_zero_filled(self):
+        """
+        Tests the month buckets of each angel, a month without attendances being zero.
+        """
+        body, series = self.series({'bucket': 'month'})
+
+        self.assertEqual([bucket['bucket_start'] for bucket in body['buckets']], ['2021-06-01', '2021-07-01'])
+        self.assertEqual([entry['total_attendances'] for entry in series['Angel A']], [3, 1])
+        self.assertEqual([entry['total_attendances'] for entry in series['Angel B']], [1, 0])
+        self.assertEqual(series['Angel B'][1]['productivity_mean'], 0)
+
+    def test_group_by_and_filters(self):
+        """
+        Tests the series by pole, restricted to a pole or to an angel.
+        """
+        _, series = self.series({'bucket': 'month', 'group_by': 'pole'})
+        self.assertEqual(sorted(series), ['Pole X', 'Pole Y'])
+
+        _, series = self.series({'bucket': 'month', 'group_by': 'pole', 'pole': 'Pole Y'})
+        self.assertEqual(list(series), ['Pole Y'])
+
+        _, series = self.series({'bucket': 'month', 'angel': 'Angel A'})
+        self.assertEqual(list(series), ['Angel A'])
+
+        _, series = self.series({'bucket': 'month', 'angel': 'Angel Z'})
+        self.assertEqual(series, {})
+
+    def test_too_many_buckets(self):
+        """
+        Tests that a period of more than `SERIES_MAX_BUCKETS` buckets is refused.
+        """
+        response, status_code = AnalyticsService.get_productivity_series(
+            {'start_date': '01/01/2015', 'end_date': '31/12/2021', 'bucket': 'day'})
+
+        self.assertEqual(status_code, 400)
+        self.assertEqual(response.json['error'], 'TOO_MANY_BUCKETS')
+
+        response = AnalyticsService.get_productivity_series(
+            {'start_date': '01/01/2015', 'end_date': '31/12/2021', 'bucket': 'month'})
+        self.assertEqual(response.status_code, 201)
+
+
+if __name__ == '__main__':
+    unittest.main()
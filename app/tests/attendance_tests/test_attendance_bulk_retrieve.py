@@ -0,0 +1,119 @@
+import unittest
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import update
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.dimension_repository import angel_repository, pole_repository
+from app.services.attendance_service import AttendanceService
+from app.utils.record_cache import LocalCacheBackend, attendance_record_cache
+
+
+class TestAttendanceBulkRetrieve(unittest.TestCase):
+    """
+    Tests the bulk retrieve of the attendances, and the record cache of the attendances
+    read by id, on an in-memory SQLite database.
+    """
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        angel_repository.clear()
+        pole_repository.clear()
+
+        attendances = [
+            Attendance(id_attendance=id_attendance, id_client=1, angel='Angel A', pole='Pole X',
+                       deadline=datetime(2021, 6, 1, 12), attendance_date=datetime(2021, 6, 1, 10))
+            for id_attendance in (10, 20, 20)
+        ]
+        AttendanceRepository.resolve_dimensions(attendances)
+        db.session.add_all(attendances)
+        db.session.commit()
+        self.ids = [attendance.id for attendance in attendances]
+
+    def tearDown(self):
+
+        db.session.remove()
+        db.drop_all()
+        angel_repository.clear()
+        pole_repository.clear()
+        attendance_record_cache.configure(None)
+        self.app_context.pop()
+
+    def test_ids_are_returned_in_request_order(self):
+        """
+        Tests that an entry is returned by requested id, in the order of the request,
+        the unknown ids being marked as not found.
+        """
+        first, second, third = self.ids
+        response = AttendanceService.bulk_retrieve_attendances({'ids': [third, 999, first, third]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['found'], 2)
+        self.assertEqual(response.json['not_found'], 1)
+        entries = response.json['attendances']
+        self.assertEqual([entry['id'] for entry in entries], [third, 999, first, third])
+        self.assertEqual([entry['result'] for entry in entries],
+                         ['ATTENDANCE_FOUND', 'ATTENDANCE_NOT_FOUND', 'ATTENDANCE_FOUND', 'ATTENDANCE_FOUND'])
+        self.assertEqual(entries[0]['attendance']['id'], third)
+        self.assertEqual(entries[0]['attendance']['angel'], 'Angel A')
+        self.assertNotIn('attendance', entries[1])
+
+    def test_id_attendance_matching_several_attendances(self):
+        """
+        Tests that an `id_attendance` loaded twice gets an entry by attendance.
+        """
+        first, second, third = self.ids
+        response = AttendanceService.bulk_retrieve_attendances({'id_attendance': [20, 30, 10]})
+
+        self.assertEqual(response.status_code, 200)
+        entries = response.json['attendances']
+        self.assertEqual([(entry['id_attendance'], entry['result']) for entry in entries],
+                         [(20, 'ATTENDANCE_FOUND'), (20, 'ATTENDANCE_FOUND'), (30, 'ATTENDANCE_NOT_FOUND'),
+                          (10, 'ATTENDANCE_FOUND')])
+        self.assertEqual([entry['attendance']['id'] for entry in entries if 'attendance' in entry],
+                         [second, third, first])
+
+    def test_invalid_payloads(self):
+        """
+        Tests that the payloads without a single list of positive integers are refused.
+        """
+        for data in (None, [], {}, {'ids': []}, {'ids': '1,2'}, {'ids': [1, 'a']}, {'ids': [0]},
+                     {'ids': [True]}, {'ids': [2 ** 31]}, {'ids': [1], 'id_attendance': [1]}):
+            response = AttendanceService.bulk_retrieve_attendances(data)
+            self.assertEqual(response.status_code, 400, data)
+            self.assertEqual(response.json['message'], 'INVALID_DATA')
+
+    def test_cached_attendances_are_invalidated_by_updates(self):
+        """
+        Tests that the attendances read by id are served from the cache, and read again
+        from the database once updated through the repository.
+        """
+        attendance_record_cache.configure(LocalCacheBackend(100, None))
+        first, second, third = self.ids
+        self.assertEqual(AttendanceService.retrieve_attendance(first).json['attendance']['id_client'], 1)
+        AttendanceService.bulk_retrieve_attendances({'id_attendance': [20]})
+
+        # Written behind the cache, not seen
+        db.session.execute(update(Attendance).where(Attendance.id.in_(self.ids)).values(id_client=2))
+        db.session.commit()
+        self.assertEqual(AttendanceService.retrieve_attendance(first).json['attendance']['id_client'], 1)
+        entries = AttendanceService.bulk_retrieve_attendances({'id_attendance': [20]}).json['attendances']
+        self.assertEqual([entry['attendance']['id_client'] for entry in entries], [1, 1])
+
+        AttendanceRepository.bulk_update_attendances([{'id': first, 'id_client': 3}, {'id': third, 'id_client': 3}])
+        self.assertEqual(AttendanceService.retrieve_attendance(first).json['attendance']['id_client'], 3)
+        entries = AttendanceService.bulk_retrieve_attendances({'id_attendance': [20]}).json['attendances']
+        self.assertEqual([entry['attendance']['id_client'] for entry in entries], [2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
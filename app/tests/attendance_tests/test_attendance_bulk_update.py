@@ -0,0 +1,122 @@
+import unittest
+from datetime import datetime, date
+
+from flask import Flask
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.dimension_repository import angel_repository, pole_repository
+from app.services.attendance_service import AttendanceService
+
+
+class TestAttendanceBulkUpdate(unittest.TestCase):
+    """
+    Tests the bulk update of the attendances on an in-memory SQLite database, where the
+    UPDATE statement runs once by row.
+    """
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        angel_repository.clear()
+        pole_repository.clear()
+
+        attendances = [
+            Attendance(id_attendance=1, id_client=1, angel='Angel A', pole='Pole X',
+                       deadline=datetime(2021, 6, 1, 12), attendance_date=datetime(2021, 6, 1, 10)),
+            Attendance(id_attendance=2, id_client=2, angel='Angel B', pole='Pole X',
+                       deadline=datetime(2021, 6, 2, 12), attendance_date=datetime(2021, 6, 3, 10)),
+        ]
+        AttendanceRepository.resolve_dimensions(attendances)
+        db.session.add_all(attendances)
+        db.session.commit()
+        self.ids = [attendance.id for attendance in attendances]
+
+    def tearDown(self):
+
+        db.session.remove()
+        db.drop_all()
+        angel_repository.clear()
+        pole_repository.clear()
+        self.app_context.pop()
+
+    def get(self, id):
+        db.session.expire_all()
+        return db.session.get(Attendance, id)
+
+    def test_bulk_update_writes_fields_and_derived_columns(self):
+        """
+        Tests that only the given fields are written, and that the on-time flag is
+        computed with the date of the row that was not given.
+        """
+        first, second = self.ids
+        response = AttendanceService.bulk_update_attendances([
+            {'id': first, 'attendance_date': '01/06/2021 13:00:00'},
+            {'id': second, 'deadline': '04/06/2021 12:00:00', 'angel': 'Angel C'},
+            {'id': 999, 'pole': 'Pole Y'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['result'] for result in response.json['results']],
+                         ['ATTENDANCE_UPDATED', 'ATTENDANCE_UPDATED', 'ATTENDANCE_NOT_FOUND'])
+
+        attendance = self.get(first)
+        self.assertEqual(attendance.attendance_date, datetime(2021, 6, 1, 13))
+        self.assertEqual(attendance.attendance_day, date(2021, 6, 1))
+        self.assertFalse(attendance.on_time)
+        self.assertEqual(attendance.angel, 'Angel A')
+
+        attendance = self.get(second)
+        self.assertEqual(attendance.attendance_date, datetime(2021, 6, 3, 10))
+        self.assertTrue(attendance.on_time)
+        self.assertEqual(attendance.angel, 'Angel C')
+
+    def test_invalid_and_duplicated_items_are_not_applied(self):
+        """
+        Tests that the items breaking a rule, and the items sharing an id, are reported
+        and left out, the other items being applied.
+        """
+        first, second = self.ids
+        response = AttendanceService.bulk_update_attendances([
+            {'id': first, 'id_client': 0},
+            {'id': second, 'attendance_date': None},
+            {'id': second, 'attendance_date': '05/06/2021 10:00:00'},
+            {'attendance_date': '05/06/2021 10:00:00'},
+        ])
+
+        results = response.json['results']
+        self.assertEqual(results[0], {'id': first, 'result': 'INVALID_DATA', 'errors': {'id_client': ['INVALID_CLIENT_ID']}})
+        self.assertEqual([result['result'] for result in results[1:]], ['DUPLICATE_ID', 'DUPLICATE_ID', 'INVALID_DATA'])
+        self.assertEqual(self.get(first).id_client, 1)
+        self.assertEqual(self.get(second).attendance_date, datetime(2021, 6, 3, 10))
+
+    def test_item_without_fields_is_invalid(self):
+        """
+        Tests that an item with no field to write is reported, rather than updating only
+        the `updated_at` of its attendance.
+        """
+        first, second = self.ids
+        response = AttendanceService.bulk_update_attendances([{'id': first}, {'id': second, 'id_client': 2}])
+
+        results = response.json['results']
+        self.assertEqual(results[0], {'id': first, 'result': 'INVALID_DATA',
+                                      'errors': {'_schema': ['NO_FIELDS_TO_UPDATE']}})
+        self.assertEqual(results[1]['result'], 'ATTENDANCE_UPDATED')
+        self.assertEqual(self.get(second).id_client, 2)
+
+    def test_bulk_update_expects_a_list(self):
+        """
+        Tests that a payload other than a non-empty list is refused.
+        """
+        self.assertEqual(AttendanceService.bulk_update_attendances({'id': 1}).status_code, 400)
+        self.assertEqual(AttendanceService.bulk_update_attendances([]).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,6 +37,9 @@ class TestAttendanceUpdate(unittest.TestCase):
 
         # Mock the db session data
         self.db_session_mock = patch('app.config.config.db.session', autospec=True).start()
+        # Mock the angel and pole dimension keys resolution
+        patch('app.repositories.dimension_repository.DimensionRepository.get_ids',
+              side_effect=lambda names: {name: 1 for name in names}).start()
         self.addCleanup(patch.stopall)
 
 
@@ -0,0 +1,101 @@
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+from flask import Flask
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.repositories.partition_repository import PartitionRepository
+
+
+class TestPartitionRepository(unittest.TestCase):
+    """
+    Tests the helpers of the `PartitionRepository`, which do not depend on the database,
+    and the no-op of `ensure_partitions` on the regular table of SQLite.
+    """
+
+    def setUp(self):
+
+        self.partitions = PartitionRepository(Attendance.__table__, 'attendance_date')
+
+    def test_partition_names(self):
+        """
+        Tests the names of the monthly and default partitions.
+        """
+        self.assertEqual(self.partitions.partition_name(date(2021, 6, 1)), 'attendances_y2021m06')
+        self.assertEqual(self.partitions.partition_name(date(987, 12, 1)), 'attendances_y0987m12')
+        self.assertEqual(self.partitions.default_partition, 'attendances_default')
+
+    def test_month_range(self):
+        """
+        Tests that a partition ends on the first day of the next month, across years.
+        """
+        self.assertEqual(PartitionRepository.month_range(date(2021, 1, 1)), (date(2021, 1, 1), date(2021, 2, 1)))
+        self.assertEqual(PartitionRepository.month_range(date(2024, 2, 1)), (date(2024, 2, 1), date(2024, 3, 1)))
+        self.assertEqual(PartitionRepository.month_range(date(2021, 12, 1)), (date(2021, 12, 1), date(2022, 1, 1)))
+
+    def test_upcoming_months(self):
+        """
+        Tests the current month and the following ones, from any day of the month.
+        """
+        self.assertEqual(self.partitions.upcoming_months(2, today=date(2021, 11, 30)),
+                         [date(2021, 11, 1), date(2021, 12, 1), date(2022, 1, 1)])
+        self.assertEqual(self.partitions.upcoming_months(0, today=date(2021, 6, 15)), [date(2021, 6, 1)])
+
+    def test_ensure_partitions_creates_the_missing_months_only(self):
+        """
+        Tests that only the months without partition are created, and that the months
+        known to have one are not looked up again.
+        """
+        connection = mock.Mock(name='connection')
+        # The partition of June exists and the one of July does not
+        connection.execute.return_value.scalar.side_effect = ['attendances_y2021m06', None]
+        with mock.patch.object(self.partitions, 'is_partitioned', return_value=True), \
+                mock.patch.object(self.partitions, 'create_partition') as create_partition:
+            created = self.partitions.ensure_partitions(
+                [datetime(2021, 6, 3, 10), None, date(2021, 7, 9), datetime(2021, 6, 30)], connection)
+
+            self.assertEqual(created, [date(2021, 7, 1)])
+            create_partition.assert_called_once_with(connection, date(2021, 7, 1))
+
+            connection.reset_mock()
+            self.assertEqual(self.partitions.ensure_partitions([date(2021, 6, 20)], connection), [])
+            connection.execute.assert_not_called()
+
+
+class TestPartitionRepositorySqlite(unittest.TestCase):
+    """
+    Tests the `PartitionRepository` on an in-memory SQLite database, where the table is
+    a regular table.
+    """
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.partitions = PartitionRepository(Attendance.__table__, 'attendance_date')
+
+    def tearDown(self):
+
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_ensure_partitions_is_a_no_op(self):
+        """
+        Tests that no partition is created nor cached on a non-partitioned table.
+        """
+        self.assertFalse(PartitionRepository.is_supported(db.session.connection()))
+        self.assertFalse(self.partitions.is_partitioned(db.session.connection()))
+        self.assertEqual(self.partitions.ensure_partitions([date(2021, 6, 1), None]), [])
+        self.assertEqual(self.partitions._months, set())
+        self.assertEqual(self.partitions.ensure_partitions([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import threading
+import unittest
+
+from marshmallow import ValidationError
+
+from app.dto.attendance import AttendanceCreationSchema
+from app.schemas.attendance_schema import AttendanceSchema
+from app.schemas.schema_registry import SchemaRegistry
+
+
+class TestSchemaRegistry(unittest.TestCase):
+    """
+    Unit tests for the schema registry and the validation of the shared creation schema.
+    """
+
+    valid_data = {
+        "id_attendance": 4,
+        "id_client": 3,
+        "angel": "Jônatas Neves Bandoli",
+        "pole": "Rio de Janeiro",
+        "deadline": "29/06/2021  09:09:30",
+        "attendance_date": "28/06/2021  09:01:19"
+    }
+
+    def setUp(self):
+
+        self.registry = SchemaRegistry()
+
+    def test_one_instance_by_class_and_options(self):
+        """
+        Tests that a schema is built once by class and options, from every thread.
+        """
+        schemas = []
+        threads = [threading.Thread(target=lambda: schemas.append(self.registry.get(AttendanceCreationSchema)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len({id(schema) for schema in schemas}), 1)
+        self.assertIs(self.registry.get(AttendanceSchema, many=True), self.registry.get(AttendanceSchema, many=True))
+        self.assertIsNot(self.registry.get(AttendanceSchema), self.registry.get(AttendanceSchema, many=True))
+        self.assertTrue(self.registry.get(AttendanceSchema, many=True).many)
+
+    def test_shared_schema_reports_every_invalid_field(self):
+        """
+        Tests that the shared creation schema reports the rule of each invalid field,
+        and does not keep the errors of a load for the next one.
+        """
+        schema = self.registry.get(AttendanceCreationSchema)
+
+        with self.assertRaises(ValidationError) as context:
+            schema.load({**self.valid_data, "id_attendance": 0, "id_client": -1, "angel": ""})
+
+        self.assertEqual(context.exception.messages['id_attendance'], ["INVALID_ATTENDANCE_ID"])
+        self.assertEqual(context.exception.messages['id_client'], ["INVALID_CLIENT_ID"])
+        self.assertEqual(context.exception.messages['angel'], ["INVALID_ANGEL_NAME"])
+        self.assertEqual(set(context.exception.messages), {'id_attendance', 'id_client', 'angel'})
+
+        attendance = schema.load(self.valid_data)
+        self.assertEqual(attendance.id_attendance, 4)
+        self.assertEqual(attendance.angel, "Jônatas Neves Bandoli")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from app.scripts import csv_reader
+from app.scripts.csv_reader import MappedCSVReader
+
+
+class TestMappedCSVReader(unittest.TestCase):
+    """
+    Unit tests for the `MappedCSVReader`.
+
+    The chunks are kept small, so a file of a few hundred rows is split on several line
+    boundaries.
+    """
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'attendances.csv')
+        with open(self.path, 'w', encoding='utf-8-sig') as f:
+            f.write('id_atendimento;angel;data_de_atendimento\n')
+            for i in range(500):
+                f.write(f'{i};Angel {i % 7};0{i % 9 + 1}/06/2021 10:15:27\n')
+        self.min_chunk_bytes = csv_reader.MIN_CHUNK_BYTES
+        csv_reader.MIN_CHUNK_BYTES = 512
+
+    def tearDown(self):
+
+        csv_reader.MIN_CHUNK_BYTES = self.min_chunk_bytes
+        self.tmp_dir.cleanup()
+
+    def test_reads_every_row_across_chunks(self):
+        """
+        Tests that the chunks are split on line boundaries, without losing or splitting
+        rows, and that the header is read once without its byte order mark.
+        """
+        with MappedCSVReader(self.path, sep=';', memory_budget=4096,
+                             string_columns=['data_de_atendimento']) as reader:
+            chunks = list(reader)
+
+            self.assertEqual(reader.columns, ['id_atendimento', 'angel', 'data_de_atendimento'])
+            self.assertEqual(reader.rows_read, 500)
+            self.assertEqual(reader.bytes_read, reader.size)
+
+        self.assertGreater(len(chunks), 1)
+        ids = [i for chunk in chunks for i in chunk['id_atendimento'].tolist()]
+        self.assertEqual(ids, list(range(500)))
+        self.assertEqual(chunks[-1]['data_de_atendimento'].iloc[-1], '05/06/2021 10:15:27')
+
+    def test_empty_file(self):
+        """
+        Tests that an empty file has no columns and no chunks.
+        """
+        open(self.path, 'w').close()
+
+        with MappedCSVReader(self.path, sep=';') as reader:
+            self.assertEqual(reader.columns, [])
+            self.assertEqual(list(reader), [])
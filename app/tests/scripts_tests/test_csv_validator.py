@@ -0,0 +1,99 @@
+import unittest
+from datetime import date, datetime
+
+import pandas as pd
+
+from app.repositories.ingest_reject_repository import IngestRejectRepository
+from app.scripts.csv_validator import validate_chunk, parse_date_column, to_records
+from app.utils.date_utils import parse_date
+
+
+class TestCSVValidator(unittest.TestCase):
+    """
+    Unit tests for the vectorized validation of the CSV chunks.
+    """
+
+    def setUp(self):
+
+        self.now = datetime(2022, 1, 1)
+
+    def chunk(self, *rows):
+        return pd.DataFrame(list(rows), columns=['id_atendimento', 'id_cliente', 'angel', 'polo', 'data_limite',
+                                                 'data_de_atendimento'])
+
+    def test_rejects_rows_breaking_the_schema_rules(self):
+        """
+        Tests that each row breaking a rule of the AttendanceCreationSchema is rejected
+        with its line and the reason of its first broken rule.
+        """
+        chunk = self.chunk(
+            [1, 1, 'Angel', 'Pole', '01/06/2021', '02/06/2021 10:00'],
+            [0, 1, 'Angel', 'Pole', '01/06/2021', 'invalid'],
+            [3, -1, 'Angel', 'Pole', '01/06/2021', None],
+            [4, 1, None, 'Pole', '01/06/2021', None],
+            [5, 1, 'Angel', '', '01/06/2021', None],
+            [6, 1, 'Angel', 'Pole', '31/02/2021', None],
+            [7, 1, 'Angel', 'Pole', '01/06/2021', '2021-06-02'],
+            [8, 1, 'Angel', 'Pole', '01/06/2023', None],
+            [9, 1, 'Angel', 'Pole', '01/06/2021', None],
+        )
+
+        accepted, rejects = validate_chunk(chunk, 10, self.now)
+
+        self.assertEqual([(reject.line, reject.error_code) for reject in rejects], [
+            (11, 'INVALID_ATTENDANCE_ID'),
+            (12, 'INVALID_CLIENT_ID'),
+            (13, 'INVALID_ANGEL_NAME'),
+            (14, 'INVALID_POLE_NAME'),
+            (15, 'INVALID_DEADLINE'),
+            (16, 'INVALID_ATTENDANCE_DATE'),
+            (17, 'DATE_IN_FUTURE'),
+        ])
+        self.assertEqual(rejects[0].row['data_de_atendimento'], 'invalid')
+        self.assertEqual(accepted['id_attendance'].tolist(), [1, 9])
+
+    def test_dates_are_parsed_as_parse_date(self):
+        """
+        Tests that every format of parse_date is parsed to the same date.
+        """
+        values = ['29/06/2021 10:15:27', '29/06/2021 10:15', '30/06/2021', '30/062021 09:28',
+                  '2021-06-26 10:31:14', '27/06/21', '28 /06 /2021 10:57:27', ' 1/6/2021 ']
+
+        dates = parse_date_column(pd.Series(values), self.now)
+
+        self.assertEqual(dates.tolist(), [parse_date(value) for value in values])
+        self.assertEqual(parse_date_column(pd.Series(['-']), self.now).tolist(), [self.now])
+
+    def test_records(self):
+        """
+        Tests that the accepted rows are converted to records with the dimension keys
+        and the derived columns.
+        """
+        accepted, _ = validate_chunk(self.chunk(
+            [1, 2, 'Angel', 'Pole', '01/06/2021 12:00', '01/06/2021 10:00'],
+            [3, 4, 'Angel', 'Pole', '01/06/2021 12:00', None],
+        ), 2, self.now)
+
+        records = to_records(accepted, {'Angel': 5}, {'Pole': 6})
+
+        self.assertEqual(records, [
+            {'id_attendance': 1, 'id_client': 2, 'angel_id': 5, 'pole_id': 6,
+             'deadline': datetime(2021, 6, 1, 12), 'attendance_date': datetime(2021, 6, 1, 10),
+             'on_time': True, 'attendance_day': date(2021, 6, 1)},
+            {'id_attendance': 3, 'id_client': 4, 'angel_id': 5, 'pole_id': 6,
+             'deadline': datetime(2021, 6, 1, 12), 'attendance_date': None,
+             'on_time': False, 'attendance_day': None},
+        ])
+
+    def test_raw_row_of_reject(self):
+        """
+        Tests that a rejected row is written back as its line for the quarantine table,
+        with the missing values left empty and the ids not written as floats.
+        """
+        _, rejects = validate_chunk(self.chunk(
+            [None, 2, 'Angel', 'Pole', '01/06/2021 12:00', None],
+            [3, 4, 'Angel', 'A' * 256, '01/06/2021 12:00', None],
+        ), 2, self.now)
+
+        self.assertEqual([reject.error_code for reject in rejects], ['INVALID_ATTENDANCE_ID', 'INVALID_POLE_NAME'])
+        self.assertEqual(IngestRejectRepository.raw_row(rejects[0].row), ';2;Angel;Pole;01/06/2021 12:00;')
@@ -0,0 +1,175 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from app.config.config import db
+from app.scripts.file_processor import get_file_hash
+from app.scripts.ingest_daemon import IngestDaemon, PollingWatcher, is_candidate
+
+
+class TestIngestDaemon(unittest.TestCase):
+    """
+    Unit tests for the watcher and the file handling of the ingest daemon.
+    """
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.tmp_dir.name
+
+    def tearDown(self):
+
+        self.tmp_dir.cleanup()
+
+    def write(self, name, content='id;angel\n'):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_candidates(self):
+        """
+        Tests that only the visible CSV files are picked up.
+        """
+        self.assertTrue(is_candidate('attendances.csv'))
+        self.assertTrue(is_candidate('ATTENDANCES.CSV'))
+        self.assertFalse(is_candidate('.attendances.csv'))
+        self.assertFalse(is_candidate('attendances.csv.part'))
+
+    def test_polling_reports_stable_files(self):
+        """
+        Tests that a file is reported once its size did not change between two scans.
+        """
+        watcher = PollingWatcher(self.directory)
+        path = self.write('attendances.csv')
+
+        self.assertEqual(watcher.scan(), [])
+        self.assertEqual(watcher.scan(), [path])
+
+        with open(path, 'a') as f:
+            f.write('1;Angel\n')
+        self.assertEqual(watcher.scan(), [])
+
+    def test_move_keeps_files_with_the_same_name(self):
+        """
+        Tests that a handled file does not replace a former file with the same name, and
+        that the error of a failed file is written next to it.
+        """
+        failed = os.path.join(self.directory, 'failed')
+        os.makedirs(failed)
+        first = IngestDaemon.move(self.write('attendances.csv'), failed, 'CSV_MISSING_COLUMNS')
+        second = IngestDaemon.move(self.write('attendances.csv'), failed, 'CSV_MISSING_COLUMNS')
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(len([name for name in os.listdir(failed) if name.endswith('.csv')]), 2)
+        with open(second + '.error') as f:
+            self.assertEqual(f.read(), 'CSV_MISSING_COLUMNS\n')
+
+
+@patch('app.scripts.ingest_daemon.import_csv')
+class TestIngestDaemonProcess(unittest.TestCase):
+    """
+    Tests the handling of a dropped file by a worker, the import being mocked.
+    """
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.daemon = IngestDaemon(self.app, self.tmp_dir.name, workers=1)
+        for directory in (self.daemon.processed_directory, self.daemon.failed_directory):
+            os.makedirs(directory)
+
+    def tearDown(self):
+
+        self.tmp_dir.cleanup()
+
+    def process(self, name, content='id;angel\n'):
+        path = os.path.join(self.daemon.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        # The slot is taken by `submit` before the file is handed to a worker
+        self.daemon._slots.acquire()
+        self.daemon._pending.add(path)
+        self.daemon._process(path)
+        return path
+
+    def assertReleased(self):
+        self.assertEqual(self.daemon._pending, set())
+        self.assertEqual(self.daemon._hashes, set())
+
+    def test_loaded_file_moved_to_processed(self, import_csv_mock):
+        """
+        Tests that a loaded file is moved to the processed folder.
+        """
+        import_csv_mock.return_value = 0
+        path = self.process('attendances.csv')
+
+        processed = os.path.join(self.daemon.processed_directory, 'attendances.csv')
+        import_csv_mock.assert_called_once_with(path, self.daemon.memory_budget, get_file_hash(processed))
+        self.assertEqual(os.listdir(self.daemon.processed_directory), ['attendances.csv'])
+        self.assertFalse(os.path.exists(path))
+        self.assertReleased()
+
+    def test_failed_file_moved_to_failed(self, import_csv_mock):
+        """
+        Tests that a file whose import raises is moved to the failed folder, with its
+        error next to it.
+        """
+        import_csv_mock.side_effect = ValueError('CSV_MISSING_COLUMNS')
+        with self.assertLogs(level='ERROR'):
+            self.process('attendances.csv')
+
+        self.assertEqual(sorted(os.listdir(self.daemon.failed_directory)),
+                         ['attendances.csv', 'attendances.csv.error'])
+        with open(os.path.join(self.daemon.failed_directory, 'attendances.csv.error')) as f:
+            self.assertEqual(f.read(), 'CSV_MISSING_COLUMNS\n')
+        self.assertEqual(os.listdir(self.daemon.processed_directory), [])
+        self.assertReleased()
+
+    def test_already_loaded_file_moved_to_processed(self, import_csv_mock):
+        """
+        Tests that a file whose hash is already recorded, for which the import returns
+        None, is moved to the processed folder.
+        """
+        import_csv_mock.return_value = None
+        with self.assertLogs(level='INFO') as logs:
+            self.process('attendances.csv')
+
+        self.assertEqual(os.listdir(self.daemon.processed_directory), ['attendances.csv'])
+        self.assertIn('was already loaded', logs.output[0])
+        self.assertReleased()
+
+    def test_same_content_waits_for_the_other_worker(self, import_csv_mock):
+        """
+        Tests that a file with the content of a file being loaded by another worker is
+        only loaded once that worker is done.
+        """
+        import_csv_mock.return_value = 0
+        self.process('first.csv')
+        file_hash = get_file_hash(os.path.join(self.daemon.processed_directory, 'first.csv'))
+        import_csv_mock.reset_mock()
+        # Another worker is loading the same content
+        self.daemon._hashes.add(file_hash)
+        worker = threading.Thread(target=self.process, args=('second.csv',))
+        worker.start()
+        worker.join(0.2)
+
+        self.assertTrue(worker.is_alive())
+        import_csv_mock.assert_not_called()
+
+        with self.daemon._lock:
+            self.daemon._hashes.discard(file_hash)
+            self.daemon._lock.notify_all()
+        worker.join(5)
+
+        self.assertFalse(worker.is_alive())
+        import_csv_mock.assert_called_once()
+        self.assertEqual(sorted(os.listdir(self.daemon.processed_directory)), ['first.csv', 'second.csv'])
+        self.assertReleased()
@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from flask import Flask
+
+from app.models.ingest_progress_model import IngestProgress, INGEST_RUNNING, INGEST_COMPLETED
+from app.services.ingest_service import IngestService
+
+
+def progress(status, started_at, updated_at, finished_at=None):
+    return IngestProgress(file_hash='2d8bf302', file_name='drop/attendances.csv', status=status,
+                          size_bytes=1000, bytes_read=250, rows_read=500, rows_accepted=490, rows_rejected=10,
+                          rows_inserted=490, started_at=started_at, updated_at=updated_at, finished_at=finished_at)
+
+
+class TestIngestProgress(unittest.TestCase):
+    """
+    Unit tests for the rates and the estimated time left of the ingests, and for the
+    arguments of the status endpoint.
+    """
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        self.started_at = datetime(2024, 1, 1, 10, 0, 0)
+
+    def test_running_ingest_rate_and_eta(self):
+        """
+        Tests that the rate is measured up to the last committed chunk, and that the
+        time left is estimated from the bytes left, less the time since that chunk.
+        """
+        running = progress(INGEST_RUNNING, self.started_at, self.started_at + timedelta(seconds=10))
+
+        ingest = running.to_dict(now=self.started_at + timedelta(seconds=12))
+
+        self.assertEqual(ingest['progress'], 0.25)
+        self.assertEqual(ingest['rows_per_second'], 50.0)
+        # 750 bytes left at 25 bytes per second, 2 seconds after the last chunk
+        self.assertEqual(ingest['eta_seconds'], 28.0)
+
+    def test_finished_ingest_has_no_eta(self):
+        """
+        Tests that the rate of a finished ingest is measured up to its end, without time
+        left.
+        """
+        finished_at = self.started_at + timedelta(seconds=20)
+        completed = progress(INGEST_COMPLETED, self.started_at, finished_at, finished_at)
+
+        ingest = completed.to_dict(now=finished_at + timedelta(hours=1))
+
+        self.assertEqual(ingest['rows_per_second'], 25.0)
+        self.assertIsNone(ingest['eta_seconds'])
+
+    @patch('app.services.ingest_service.IngestProgressRepository.get_recent')
+    def test_status_arguments(self, get_recent_mock):
+        """
+        Tests that an unknown status or a limit out of bounds is refused, and that the
+        valid arguments are given to the repository.
+        """
+        get_recent_mock.return_value = [progress(INGEST_RUNNING, self.started_at, self.started_at)]
+
+        self.assertEqual(IngestService.get_status({'status': 'paused'}).status_code, 400)
+        self.assertEqual(IngestService.get_status({'limit': '0'}).status_code, 400)
+        self.assertEqual(IngestService.get_status({'limit': 'all'}).status_code, 400)
+
+        response = IngestService.get_status({'status': 'running', 'limit': '5'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['ingests'][0]['rows_read'], 500)
+        get_recent_mock.assert_called_once_with(5, 'running')
+
+
+if __name__ == '__main__':
+    unittest.main()
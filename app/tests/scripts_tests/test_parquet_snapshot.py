@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+from unittest.mock import patch
+
+import pyarrow.parquet as pq
+from flask import Flask
+
+from app.config.config import db
+from app.models.attendance.attendance_model import Attendance
+from app.repositories.dimension_repository import angel_repository, pole_repository
+from app.scripts.parquet_snapshot import (to_record_batch, to_attendance_table, load_parquet_to_db,
+                                          PARTITION_COLUMN)
+
+
+class TestParquetSnapshot(unittest.TestCase):
+    """
+    Unit tests for the conversions of the Parquet snapshots.
+
+    The dimension repositories are mocked, so the tests validate the typed columns
+    without a database.
+    """
+
+    def test_record_batch_from_sqlite_rows(self):
+        """
+        Tests that the dates returned as strings and the booleans returned as integers
+        by SQLite are typed, and that each row gets the month of its attendance date.
+        """
+        batch = to_record_batch([
+            (1, '2021-06-01 09:00:00', '2021-06-01 09:00:00', 10, 20, 'Angel A', 'Pole X',
+             '2021-06-01 12:00:00', '2021-06-01 10:00:00.500000', 1),
+            (2, '2021-06-02 09:00:00', '2021-06-02 09:00:00', 11, 21, 'Angel B', 'Pole X',
+             '2021-06-02 12:00:00', None, 0),
+        ])
+
+        self.assertEqual(batch.column('attendance_date').to_pylist(), [datetime(2021, 6, 1, 10, 0, 0, 500000), None])
+        self.assertEqual(batch.column('on_time').to_pylist(), [True, False])
+        self.assertEqual(batch.column('angel').dictionary.to_pylist(), ['Angel A', 'Angel B'])
+        self.assertEqual(batch.column(PARTITION_COLUMN).to_pylist(), ['2021-06', None])
+
+    @patch('app.repositories.dimension_repository.DimensionRepository.get_ids',
+           side_effect=lambda names: {name: index + 1 for index, name in enumerate(sorted(names))})
+    def test_attendance_table_derives_columns(self, get_ids_mock):
+        """
+        Tests that the names are resolved to the dimension keys and that the derived
+        columns are computed from the dates.
+        """
+        batch = to_record_batch([
+            (1, '2021-06-01 09:00:00', '2021-06-01 09:00:00', 10, 20, 'Angel B', 'Pole X',
+             '2021-06-01 12:00:00', '2021-06-01 13:00:00', 1),
+            (2, '2021-06-02 09:00:00', '2021-06-02 09:00:00', 11, 21, 'Angel A', 'Pole X',
+             '2021-06-02 12:00:00', None, 0),
+        ])
+        now = datetime(2024, 1, 1)
+
+        table = to_attendance_table(batch, now)
+
+        self.assertEqual(table.column('angel_id').to_pylist(), [2, 1])
+        self.assertEqual(table.column('pole_id').to_pylist(), [1, 1])
+        # The stored flag is recomputed, it is not trusted from the file
+        self.assertEqual(table.column('on_time').to_pylist(), [False, False])
+        self.assertEqual(table.column('attendance_day').to_pylist(), [date(2021, 6, 1), None])
+        self.assertEqual(table.column('updated_at').to_pylist(), [now, now])
+
+
+class TestLoadParquetToDb(unittest.TestCase):
+    """
+    Tests the import of a Parquet snapshot on an in-memory SQLite database.
+    """
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        angel_repository.clear()
+        pole_repository.clear()
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'snapshot.parquet')
+        # Each batch is written with the dictionary of its own names, as the export does
+        batches = [
+            to_record_batch([(1, '2021-06-01 09:00:00', '2021-06-01 09:00:00', 10, 20, 'Angel A', 'Pole X',
+                              '2021-06-01 12:00:00', '2021-06-01 10:00:00', 1)]),
+            to_record_batch([(2, '2021-07-02 09:00:00', '2021-07-02 09:00:00', 11, 21, 'Angel B', 'Pole Y',
+                              '2021-07-02 12:00:00', '2021-07-02 13:00:00', 0)]),
+        ]
+        batches = [batch.drop_columns([PARTITION_COLUMN]) for batch in batches]
+        with pq.ParquetWriter(self.path, batches[0].schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+        db.session.remove()
+        db.drop_all()
+        angel_repository.clear()
+        pole_repository.clear()
+        self.app_context.pop()
+
+    @patch('app.scripts.parquet_snapshot.attendance_record_cache')
+    @patch('app.scripts.parquet_snapshot.attendance_partitions')
+    def test_names_resolved_before_the_partitions(self, partitions_mock, cache_mock):
+        """
+        Tests that the names brought by the second batch are resolved before the
+        partitions of the first batch are created, so no dimension record is inserted
+        while the session holds an uncommitted partition, and that the cached
+        attendances are invalidated once the file is committed.
+        """
+        resolved = []
+        partitions_mock.ensure_partitions.side_effect = lambda months: resolved.append(
+            set(angel_repository._ids_by_name))
+
+        imported = load_parquet_to_db(self.path, batch_size=1)
+
+        self.assertEqual(imported, 2)
+        self.assertEqual(resolved, [{'Angel A', 'Angel B'}] * 2)
+        rows = db.session.query(Attendance.id_attendance, Attendance.on_time).order_by(Attendance.id_attendance).all()
+        self.assertEqual(rows, [(10, True), (11, False)])
+        self.assertEqual(Attendance.query.filter_by(id_attendance=11).one().angel, 'Angel B')
+        cache_mock.invalidate.assert_called_once_with(id_attendance={10, 11})
@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from dotenv import dotenv_values
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Budgets of a web worker, overridden through the environment on slower machines
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', 1250))
+WORKER_RSS_BUDGET_MB = float(os.environ.get('WORKER_RSS_BUDGET_MB', 100))
+
+# Modules of the ingest subsystem, kept out of the web workers
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow')
+
+# Builds the app as a web worker does, and prints its peak RSS in KiB and the heavy modules
+# imported. On Linux ru_maxrss keeps the peak of the forking process across exec, so the
+# VmHWM of the worker itself is read when available
+WORKER_SCRIPT = """
+import os, resource, sys
+from app import create_app
+create_app()
+if os.path.exists('/proc/self/status'):
+    with open('/proc/self/status') as f:
+        print(next(line.split()[1] for line in f if line.startswith('VmHWM:')))
+else:
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1))
+print(','.join(name for name in sys.argv[1:] if name in sys.modules))
+"""
+
+# Runs the cold imports several times, the fastest one being the least disturbed by the machine
+RUNS = 3
+
+
+class TestImportBudget(unittest.TestCase):
+    """
+    Startup budget of the web workers: the cold import time of `app`, measured with
+    `python -X importtime`, and the peak RSS once the app is built. Each measure runs
+    on a fresh interpreter.
+    """
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # The .env.example values fill the settings missing from the environment
+        self.env = {**dotenv_values(os.path.join(ROOT_DIR, '.env.example')), **os.environ,
+                    'PYTHONPATH': ROOT_DIR, 'PYTHONDONTWRITEBYTECODE': '1',
+                    'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.tmp_dir.name, 'budget.db')}"}
+
+    def tearDown(self):
+
+        self.tmp_dir.cleanup()
+
+    def run_python(self, *args):
+        return subprocess.run([sys.executable, *args], cwd=ROOT_DIR, env=self.env, capture_output=True, text=True,
+                              check=True)
+
+    def import_times(self):
+        """
+        Returns the cumulative import time in microseconds of each module imported by
+        `import app`.
+        """
+        times = {}
+        for line in self.run_python('-X', 'importtime', '-c', 'import app').stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, cumulative, name = line.split('|')
+                if cumulative.strip().isdigit():
+                    times[name.strip()] = int(cumulative)
+        return times
+
+    def test_cold_import_time(self):
+        """
+        Tests that `import app` stays within the import time budget, without importing
+        the ingest subsystem.
+        """
+        runs = [self.import_times() for _ in range(RUNS)]
+
+        self.assertEqual([name for name in HEAVY_MODULES if name in runs[0]], [])
+        fastest_ms = min(times['app'] for times in runs) / 1000
+        self.assertLessEqual(fastest_ms, IMPORT_TIME_BUDGET_MS,
+                             f"import app took {fastest_ms:.0f} ms, over the {IMPORT_TIME_BUDGET_MS:.0f} ms budget")
+
+    def test_worker_rss(self):
+        """
+        Tests that building the app stays within the RSS budget of a web worker, the
+        ingest subsystem being left out when there is no new seed file.
+        """
+        output = self.run_python('-c', WORKER_SCRIPT, *HEAVY_MODULES).stdout.splitlines()
+        rss_mb = int(output[-2]) / 1024
+
+        self.assertEqual(output[-1], '')
+        self.assertLessEqual(rss_mb, WORKER_RSS_BUDGET_MB,
+                             f"the worker uses {rss_mb:.0f} MB, over the {WORKER_RSS_BUDGET_MB:.0f} MB budget")
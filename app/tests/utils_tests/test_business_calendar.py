@@ -0,0 +1,81 @@
+import random
+import unittest
+from datetime import date, datetime, timedelta
+from app.utils.business_calendar import BusinessCalendar, get_business_calendar, easter_sunday
+from app.utils.date_utils import business_count_days
+
+
+def loop_business_count_days(date1, date2):
+    """
+    Former day by day implementation of `business_count_days`, used as reference.
+    """
+    return sum(1 for day in (date1 + timedelta(days=i)
+                                   for i in range((date2 - date1).days + 1))
+                     if day.weekday() < 5)
+
+
+class TestBusinessCalendar(unittest.TestCase):
+    """
+    Unit tests for the business calendars used to count the business days of the analytics.
+    """
+
+    def test_weekend_calendar_matches_the_day_by_day_count(self):
+        """
+        Tests that the arithmetic count gives the same results as the former loop,
+        including datetime arguments with partial days and reversed ranges.
+        """
+        rng = random.Random(42)
+        start = datetime(2020, 1, 1)
+        for _ in range(2000):
+            date1 = start + timedelta(minutes=rng.randint(0, 60 * 24 * 800))
+            date2 = date1 + timedelta(minutes=rng.randint(-60 * 24 * 10, 60 * 24 * 400))
+
+            self.assertEqual(business_count_days(date1, date2), loop_business_count_days(date1, date2))
+
+    def test_long_range(self):
+        """
+        Tests the count over a century.
+        """
+        date1, date2 = date(1950, 1, 1), date(2049, 12, 31)
+
+        self.assertEqual(business_count_days(date1, date2), loop_business_count_days(date1, date2))
+
+    def test_holidays_are_excluded(self):
+        """
+        Tests that the holidays falling on weekdays are excluded from the count.
+        """
+        # 2021-09-07 is a Tuesday and 2021-09-11 is a Saturday
+        calendar = BusinessCalendar([date(2021, 9, 7), date(2021, 9, 11)])
+
+        self.assertEqual(calendar.count(date(2021, 9, 6), date(2021, 9, 12)), 4)
+        self.assertEqual(calendar.count(date(2021, 9, 8), date(2021, 9, 12)), 3)
+
+    def test_national_and_state_calendars(self):
+        """
+        Tests the national holidays and the holidays of a state.
+        """
+        # June 2021: 22 weekdays, Corpus Christi on Thursday 2021-06-03
+        self.assertEqual(get_business_calendar('BR').count(date(2021, 6, 1), date(2021, 6, 30)), 21)
+        # July 2021 in Bahia: 22 weekdays, Independência da Bahia on Friday 2021-07-02
+        self.assertEqual(get_business_calendar('BA').count(date(2021, 7, 1), date(2021, 7, 31)), 21)
+        self.assertEqual(get_business_calendar('BR').count(date(2021, 7, 1), date(2021, 7, 31)), 22)
+
+    def test_calendars_are_cached(self):
+        """
+        Tests that the calendar of a region is built once.
+        """
+        self.assertIs(get_business_calendar('RJ'), get_business_calendar('RJ'))
+
+    def test_unknown_region(self):
+        """
+        Tests that an unknown region is rejected.
+        """
+        self.assertRaises(ValueError, get_business_calendar, 'XX')
+
+    def test_easter_sunday(self):
+        """
+        Tests the Easter Sunday computation.
+        """
+        self.assertEqual(easter_sunday(2021), date(2021, 4, 4))
+        self.assertEqual(easter_sunday(2024), date(2024, 3, 31))
+        self.assertEqual(easter_sunday(2025), date(2025, 4, 20))
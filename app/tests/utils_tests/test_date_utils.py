@@ -0,0 +1,57 @@
+import unittest
+from datetime import date, datetime
+from app.utils.date_utils import truncate_date, date_buckets, to_date
+
+
+class TestDateBuckets(unittest.TestCase):
+    """
+    Unit tests for the date bucket helpers used by the productivity series.
+    """
+
+    def test_truncate_date(self):
+        """
+        Tests the truncation of a date to the start of its day, week and month.
+        """
+        value = datetime(2021, 6, 17, 10, 15, 27)
+
+        self.assertEqual(truncate_date(value, 'day'), date(2021, 6, 17))
+        self.assertEqual(truncate_date(value, 'week'), date(2021, 6, 14))
+        self.assertEqual(truncate_date(value, 'month'), date(2021, 6, 1))
+        self.assertRaises(ValueError, truncate_date, value, 'year')
+
+    def test_date_buckets_are_clipped_to_the_range(self):
+        """
+        Tests that the first and last buckets are clipped to the requested range.
+        """
+        buckets = date_buckets(datetime(2021, 6, 17), datetime(2021, 8, 3), 'month')
+
+        self.assertEqual(buckets, [
+            (date(2021, 6, 1), date(2021, 6, 17), date(2021, 6, 30)),
+            (date(2021, 7, 1), date(2021, 7, 1), date(2021, 7, 31)),
+            (date(2021, 8, 1), date(2021, 8, 1), date(2021, 8, 3)),
+        ])
+
+    def test_date_buckets_by_week(self):
+        """
+        Tests that the weekly buckets start on Monday.
+        """
+        buckets = date_buckets(date(2021, 6, 2), date(2021, 6, 14), 'week')
+
+        self.assertEqual([bucket_start for bucket_start, _, _ in buckets],
+                         [date(2021, 5, 31), date(2021, 6, 7), date(2021, 6, 14)])
+
+    def test_date_buckets_by_day_over_a_year(self):
+        """
+        Tests that a daily series of a year has one bucket by day.
+        """
+        buckets = date_buckets(date(2021, 1, 1), date(2021, 12, 31), 'day')
+
+        self.assertEqual(len(buckets), 365)
+
+    def test_to_date(self):
+        """
+        Tests the conversion of the bucket values returned by PostgreSQL and SQLite.
+        """
+        self.assertEqual(to_date('2021-06-14'), date(2021, 6, 14))
+        self.assertEqual(to_date(datetime(2021, 6, 14)), date(2021, 6, 14))
+        self.assertEqual(to_date(date(2021, 6, 14)), date(2021, 6, 14))
@@ -0,0 +1,76 @@
+import unittest
+
+from flask import Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+from app.utils.instrumentation import Histogram, init_instrumentation, render_metrics, timed
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Unit tests for the request timing and the SQL statement counting, on an app with
+    an in-memory SQLite database.
+    """
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db = SQLAlchemy(self.app)
+        init_instrumentation(self.app)
+
+        @self.app.route('/instrumented')
+        def instrumented():
+            with timed('parse_date'):
+                db.session.execute(text('SELECT 1'))
+            db.session.execute(text('SELECT 2'))
+            return jsonify({'value': 1})
+
+        self.client = self.app.test_client()
+
+    def server_timing(self, response):
+        entries = {}
+        for entry in response.headers['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            entries[name] = dict(param.split('=', 1) for param in params)
+        return entries
+
+    def test_server_timing(self):
+        """
+        Tests that the statements are counted, and that the SQL time run inside a span
+        is not counted twice.
+        """
+        timing = self.server_timing(self.client.get('/instrumented'))
+
+        self.assertEqual(timing['sql']['desc'], '"statements: 2"')
+        self.assertEqual(set(timing), {'total', 'sql', 'parse_date', 'json'})
+        spans = sum(float(timing[name]['dur']) for name in ('sql', 'parse_date', 'json'))
+        self.assertLessEqual(spans, float(timing['total']['dur']))
+
+    def test_metrics(self):
+        """
+        Tests that the requests are collected by endpoint on the Prometheus text.
+        """
+        self.client.get('/instrumented')
+
+        metrics = render_metrics()
+
+        self.assertIn('kpi_request_sql_statements_bucket{endpoint="instrumented",le="2"}', metrics)
+        self.assertIn('kpi_request_span_duration_seconds_count{endpoint="instrumented",span="parse_date"}', metrics)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """
+        Tests that the bucket counts are cumulative and that the bounds are inclusive.
+        """
+        histogram = Histogram('test_seconds', 'Test.', ('route',), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'a"b')
+
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{route="a\\"b",le="0.1"} 2',
+            'test_seconds_bucket{route="a\\"b",le="1"} 3',
+            'test_seconds_bucket{route="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{route="a\\"b"} 3.65',
+            'test_seconds_count{route="a\\"b"} 4',
+        ])
@@ -0,0 +1,145 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.utils.record_cache import LocalCacheBackend, RecordCache, SqliteCacheBackend, create_backend
+
+
+def record(id, id_attendance):
+    return {'id': id, 'id_attendance': id_attendance, 'angel': 'Angel A'}
+
+
+class TestRecordCache(unittest.TestCase):
+    """
+    Unit tests for the record cache, its LRU eviction and its invalidations.
+    """
+
+    def setUp(self):
+
+        self.cache = RecordCache('attendance', aliases=('id_attendance',), backend=LocalCacheBackend(3, None))
+
+    def shared_cache(self, max_entries=2):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'record_cache.sqlite3')
+        return (RecordCache('attendance', backend=SqliteCacheBackend(path, max_entries, 60)),
+                RecordCache('attendance', backend=SqliteCacheBackend(path, max_entries, 60)))
+
+    def test_least_recently_read_entries_are_evicted(self):
+        """
+        Tests that the entries past the size are evicted, the least recently read first.
+        """
+        backend = LocalCacheBackend(2, None)
+        backend.set_many({'a': 1, 'b': 2})
+        backend.get_many(['a'])
+        backend.set_many({'c': 3})
+
+        self.assertEqual(backend.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+        self.assertEqual(backend.evictions, 1)
+
+    def test_entries_expire(self):
+        """
+        Tests that an entry is not read once its time to live has passed.
+        """
+        backend = LocalCacheBackend(10, 60)
+        with mock.patch('app.utils.record_cache.time.monotonic', return_value=1000.0):
+            backend.set_many({'a': 1})
+        with mock.patch('app.utils.record_cache.time.monotonic', return_value=1059.0):
+            self.assertEqual(backend.get_many(['a']), {'a': 1})
+        with mock.patch('app.utils.record_cache.time.monotonic', return_value=1061.0):
+            self.assertEqual(backend.get_many(['a']), {})
+        self.assertEqual(len(backend), 0)
+
+    def test_records_by_id_and_by_alias(self):
+        """
+        Tests that the records are read by id, and by an alias value once all of its
+        records are cached.
+        """
+        self.cache.put([record(1, 10), record(2, 10)], self.cache.generation, 'id_attendance', [10, 20])
+
+        self.assertEqual(self.cache.get(1), record(1, 10))
+        self.assertIsNone(self.cache.get(3))
+        self.assertEqual(self.cache.find('id_attendance', [10, 20]), {10: [record(1, 10), record(2, 10)]})
+        self.assertEqual(self.cache.stats(), {'backend': 'local', 'entries': 3, 'hits': 2, 'misses': 2})
+
+    def test_alias_entry_of_a_changed_record_is_not_read(self):
+        """
+        Tests that an alias entry is ignored once one of its records is invalidated or
+        has another value.
+        """
+        self.cache.put([record(1, 10), record(2, 10)], self.cache.generation, 'id_attendance', [10])
+        self.cache.invalidate([2], id_attendance=[30])
+        self.assertEqual(self.cache.find('id_attendance', [10]), {})
+
+        self.cache.put([record(2, 30)], self.cache.generation)
+        self.assertEqual(self.cache.find('id_attendance', [10]), {})
+
+    def test_records_loaded_before_an_invalidation_are_not_stored(self):
+        """
+        Tests that the records loaded before an invalidation are not stored, as they may
+        predate the write.
+        """
+        generation = self.cache.generation
+        self.cache.invalidate([1])
+        self.cache.put([record(1, 10)], generation)
+
+        self.assertIsNone(self.cache.get(1))
+
+    def test_failing_backend_is_read_as_a_miss(self):
+        """
+        Tests that the errors of the backend do not reach the caller.
+        """
+        backend = mock.Mock(name='backend')
+        backend.get_many.side_effect = OSError('unavailable')
+        backend.set_many.side_effect = OSError('unavailable')
+        cache = RecordCache('attendance', backend=backend)
+
+        cache.put([record(1, 10)], cache.generation)
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(cache.get(1))
+
+    def test_shared_backend_is_seen_by_other_instances(self):
+        """
+        Tests that the entries and the invalidations of the SQLite backend are seen by
+        another instance on the same file, as by another process.
+        """
+        writer, reader = self.shared_cache()
+
+        writer.put([record(1, 10), record(2, 20)], writer.generation)
+        self.assertEqual(reader.get(1), record(1, 10))
+        writer.put([record(3, 30)], writer.generation)
+        self.assertEqual(len(reader.backend), 2)
+        self.assertIsNone(reader.get(2))
+
+        writer.invalidate([1])
+        self.assertIsNone(reader.get(1))
+
+    def test_records_loaded_before_an_invalidation_of_another_process_are_not_stored(self):
+        """
+        Tests that the generation of the SQLite backend is shared, so a record loaded by
+        a worker before another process invalidated it is not stored.
+        """
+        worker, daemon = self.shared_cache()
+        generation = worker.generation
+        daemon.invalidate([1])
+        worker.put([record(1, 10)], generation)
+
+        self.assertIsNone(daemon.get(1))
+        self.assertNotEqual(worker.generation, generation)
+        worker.put([record(1, 11)], worker.generation)
+        self.assertEqual(daemon.get(1), record(1, 11))
+
+    def test_create_backend(self):
+        """
+        Tests the backends of the RECORD_CACHE_BACKEND setting.
+        """
+        self.assertIsInstance(create_backend('local', 10, 0), LocalCacheBackend)
+        self.assertIsNone(create_backend('local', 10, 0).ttl_seconds)
+        self.assertIsNone(create_backend('none'))
+        with self.assertRaises(ValueError):
+            create_backend('redis')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from app.services.admin_service import AdminService
+from app.utils.sampling_profiler import SamplingProfiler, ProfilerBusyError, render_collapsed
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    """
+    Unit tests for the sampling profiler, on a thread busy during the profile.
+    """
+
+    def setUp(self):
+
+        self.profiler = SamplingProfiler()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=busy_loop, args=(self.stop,), name='busy worker')
+        self.thread.start()
+
+    def tearDown(self):
+
+        self.stop.set()
+        self.thread.join()
+
+    def test_collapsed_stacks_of_the_busy_thread(self):
+        """
+        Tests that the stacks of the busy thread are counted from the thread name to the
+        innermost function, and that the idle threads and the profiling thread are left
+        out.
+        """
+        stacks, rounds = self.profiler.profile(seconds=0.2, interval=0.005)
+
+        busy = [stack for stack in stacks if stack.startswith('busy_worker;')]
+        self.assertTrue(busy)
+        self.assertTrue(all(stack.endswith('test_sampling_profiler.py:busy_loop') for stack in busy))
+        self.assertLessEqual(sum(stacks[stack] for stack in busy), rounds)
+        self.assertFalse([stack for stack in stacks if 'test_collapsed_stacks_of_the_busy_thread' in stack])
+
+        line = render_collapsed(stacks).splitlines()[0]
+        self.assertRegex(line, r'^\S+ \d+$')
+
+    def test_interval_longer_than_the_profile(self):
+        """
+        Tests that the sleep between two samples ends with the profile, so an interval
+        longer than the profile does not extend it.
+        """
+        started = time.monotonic()
+        stacks, rounds = self.profiler.profile(seconds=0.1, interval=5)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(rounds, 1)
+
+    def test_single_profile_at_a_time(self):
+        """
+        Tests that a profile requested while another one runs is refused.
+        """
+        results = []
+        first = threading.Thread(target=lambda: results.append(self.profiler.profile(seconds=0.3, interval=0.01)))
+        first.start()
+        while not self.profiler._lock.locked():
+            pass
+
+        with self.assertRaises(ProfilerBusyError):
+            self.profiler.profile(seconds=0.1)
+        first.join()
+        self.assertEqual(len(results), 1)
+
+
+class TestProfileArguments(unittest.TestCase):
+    """
+    Tests the validation of the arguments of the profile endpoint.
+    """
+
+    def setUp(self):
+
+        self.app = Flask(__name__)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+
+        self.app_context.pop()
+
+    @patch('app.services.admin_service.sampling_profiler')
+    def test_invalid_intervals(self, profiler_mock):
+        """
+        Tests that the intervals out of bounds, NaN included, are refused before
+        profiling.
+        """
+        for interval_ms in ('0.5', '5000', 'nan', 'inf', 'abc'):
+            with self.subTest(interval_ms=interval_ms):
+                response = AdminService.get_profile({'seconds': '1', 'interval_ms': interval_ms})
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.get_json()['message'], 'INVALID_PROFILE_ARGUMENTS')
+        profiler_mock.profile.assert_not_called()
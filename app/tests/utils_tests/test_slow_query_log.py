@@ -0,0 +1,57 @@
+import unittest
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+from app.utils.slow_query_log import SlowQueryLog
+
+
+class TestSlowQueryLog(unittest.TestCase):
+    """
+    Unit tests for the slow query log, on an in-memory SQLite engine.
+    """
+
+    def setUp(self):
+
+        self.log = SlowQueryLog(threshold_seconds=0, size=2)
+        self.log.install()
+        self.engine = create_engine('sqlite://')
+
+    def tearDown(self):
+
+        # The listeners of the Engine class are kept by the other tests otherwise
+        event.remove(Engine, 'before_cursor_execute', self.log._before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', self.log._after_cursor_execute)
+        self.engine.dispose()
+
+    def test_records_statements_with_caller(self):
+        """
+        Tests that a slow statement is recorded with its bound parameters and the
+        repository function that ran it, without plan outside PostgreSQL.
+        """
+        namespace = {'__name__': 'app.repositories.fake_repository', 'engine': self.engine, 'text': text}
+        exec('def get_value(value):\n'
+             '    with engine.connect() as connection:\n'
+             '        return connection.execute(text("SELECT :value"), {"value": value}).scalar()\n', namespace)
+
+        namespace['get_value'](42)
+
+        [record] = self.log.records()
+        self.assertEqual(record['statement'], 'SELECT ?')
+        self.assertEqual(record['parameters'], '(42,)')
+        self.assertTrue(record['caller'].endswith('get_value'))
+        self.assertEqual(record['plan_status'], 'not_captured')
+
+    def test_ring_buffer_keeps_the_most_recent(self):
+        """
+        Tests that the oldest records are dropped past the size of the log, and that the
+        statements under the threshold are not recorded.
+        """
+        with self.engine.connect() as connection:
+            for value in range(3):
+                connection.execute(text(f'SELECT {value}'))
+            self.log.threshold_seconds = 60
+            connection.execute(text('SELECT 3'))
+
+        self.assertEqual([record['statement'] for record in self.log.records()], ['SELECT 2', 'SELECT 1'])
+        self.assertEqual(len(self.log.records(limit=1)), 1)
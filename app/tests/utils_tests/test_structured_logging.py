@@ -0,0 +1,123 @@
+import io
+import json
+import logging
+import unittest
+
+from flask import Flask
+
+from app.utils.structured_logging import AsyncQueueHandler, configure_logging, init_logging, shutdown_logging
+
+
+class TestStructuredLogging(unittest.TestCase):
+    """
+    Unit tests for the queued JSON logging, the sampling of the DEBUG records and the
+    request ids.
+    """
+
+    def setUp(self):
+
+        self.root = logging.getLogger()
+        self.level = self.root.level
+        self.output = io.StringIO()
+        self.addCleanup(self.restore)
+
+    def restore(self):
+
+        shutdown_logging()
+        self.root.setLevel(self.level)
+
+    def records(self):
+        # Stopping the listener writes the records waiting on the queue
+        shutdown_logging()
+        return [json.loads(line) for line in self.output.getvalue().splitlines()]
+
+    def test_json_records_with_extra_fields_and_traceback(self):
+        """
+        Tests that a record is written as JSON with its formatted message, its extra
+        fields and its traceback.
+        """
+        configure_logging('INFO', stream=self.output)
+        logging.getLogger('app.tests').info("Loaded %d rows of %s", 3, 'file.csv', extra={'file': 'file.csv'})
+        try:
+            raise ValueError("CSV_MISSING_COLUMNS")
+        except ValueError:
+            logging.getLogger('app.tests').exception("Failed to load")
+
+        loaded, failed = self.records()
+        self.assertEqual(loaded['message'], "Loaded 3 rows of file.csv")
+        self.assertEqual(loaded['level'], 'INFO')
+        self.assertEqual(loaded['logger'], 'app.tests')
+        self.assertEqual(loaded['file'], 'file.csv')
+        self.assertIn('ValueError: CSV_MISSING_COLUMNS', failed['exception'])
+
+    def test_debug_records_sampled_by_call_site(self):
+        """
+        Tests that one DEBUG record is kept every `debug_sample_every` by call site,
+        and that the other levels are all kept.
+        """
+        configure_logging('DEBUG', debug_sample_every=10, stream=self.output)
+        for row in range(25):
+            logging.debug("Rejected line %d", row)
+            logging.info("Processed line %d", row)
+
+        records = self.records()
+        debug = [record['message'] for record in records if record['level'] == 'DEBUG']
+        self.assertEqual(debug, ["Rejected line 0", "Rejected line 10", "Rejected line 20"])
+        self.assertTrue(all(record['sampled_every'] == 10 for record in records if record['level'] == 'DEBUG'))
+        self.assertEqual(len([record for record in records if record['level'] == 'INFO']), 25)
+
+    def test_full_queue_drops_records_without_blocking(self):
+        """
+        Tests that the records past the size of the queue are dropped, and counted on
+        the next record written.
+        """
+        handler = AsyncQueueHandler([logging.StreamHandler(self.output)], queue_size=2)
+        # Not started, so the queue is not emptied
+        handler._pid = -1
+        handler.start = lambda: None
+        for row in range(5):
+            handler.handle(logging.makeLogRecord({'msg': f"row {row}"}))
+
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+        handler.queue.get_nowait()
+        handler.handle(logging.makeLogRecord({'msg': "row 5"}))
+        self.assertEqual(handler.dropped, 0)
+        self.assertEqual(handler.queue.get_nowait().msg, "row 1")
+        self.assertEqual(handler.queue.get_nowait().dropped_records, 3)
+
+    def test_request_id_and_request_log(self):
+        """
+        Tests that the id of a request is read from its header or generated, returned
+        on the response, and added to the records logged while it runs.
+        """
+        app = Flask(__name__)
+        app.config.update(LOG_LEVEL='INFO', LOG_FORMAT='json', LOG_QUEUE_SIZE=100, LOG_DEBUG_SAMPLE_EVERY=100,
+                          LOG_REQUESTS=True)
+        init_logging(app)
+        configure_logging('INFO', stream=self.output)
+
+        @app.route('/attendances')
+        def attendances():
+            logging.info("Listing the attendances")
+            return {'attendances': []}
+
+        client = app.test_client()
+        given = client.get('/attendances', headers={'X-Request-ID': 'abc-123'})
+        generated = client.get('/attendances', headers={'X-Request-ID': 'not valid'})
+
+        self.assertEqual(given.headers['X-Request-ID'], 'abc-123')
+        self.assertNotEqual(generated.headers['X-Request-ID'], 'not valid')
+        records = self.records()
+        self.assertEqual([record['request_id'] for record in records],
+                         ['abc-123', 'abc-123'] + [generated.headers['X-Request-ID']] * 2)
+        request_log = records[1]
+        self.assertEqual(request_log['logger'], 'app.requests')
+        self.assertEqual(request_log['status'], 200)
+        self.assertEqual(request_log['path'], '/attendances')
+        self.assertGreaterEqual(request_log['duration_ms'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
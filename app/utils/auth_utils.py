@@ -0,0 +1,44 @@
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+"""
+Authorization helpers of the admin endpoints.
+
+The admin api_clients are the ones listed on the ADMIN_API_CLIENTS setting, a comma
+separated list of api_client keys.
+"""
+
+
+def get_api_client_key():
+    """
+    Returns the api_client key of the token of the current request.
+
+    :return: The api_client key, or None if the token identity has none.
+    :rtype: str or None
+    """
+    identity = get_jwt_identity()
+    if isinstance(identity, dict):
+        return identity.get('api_client_key')
+    return identity
+
+
+def admin_required():
+    """
+    Decorator of the views reserved to the admin api_clients. The request must carry a
+    valid token, as with `jwt_required`, of an api_client listed on the
+    ADMIN_API_CLIENTS setting.
+
+    :return: The decorator.
+    :rtype: Callable
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            if get_api_client_key() not in current_app.config['ADMIN_API_CLIENTS']:
+                return jsonify({'message': 'ADMIN_REQUIRED'}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
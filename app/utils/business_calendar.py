@@ -0,0 +1,200 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from functools import lru_cache
+
+"""
+Business calendars used to count the business days of the analytics periods.
+
+The weekdays of a range are counted arithmetically, and the holidays are kept as a
+sorted list of ordinals, so counting the business days of any range costs two binary
+searches instead of a loop over every day of the range.
+"""
+
+# Years covered by the holiday calendars
+HOLIDAY_YEARS = range(2000, 2101)
+
+# Brazilian national holidays with a fixed date (month, day)
+NATIONAL_HOLIDAYS = (
+    (1, 1),    # Confraternização Universal
+    (4, 21),   # Tiradentes
+    (5, 1),    # Dia do Trabalho
+    (9, 7),    # Independência do Brasil
+    (10, 12),  # Nossa Senhora Aparecida
+    (11, 2),   # Finados
+    (11, 15),  # Proclamação da República
+    (12, 25),  # Natal
+)
+
+# Days after the Easter Sunday of the national holidays with a moving date
+NATIONAL_EASTER_HOLIDAYS = (
+    -48,  # Carnaval (Monday)
+    -47,  # Carnaval (Tuesday)
+    -2,   # Sexta-feira Santa
+    60,   # Corpus Christi
+)
+
+# State holidays (month, day) of the Brazilian states, keyed by the state code
+STATE_HOLIDAYS = {
+    'AC': ((1, 23), (6, 15), (9, 5), (11, 17)),
+    'AL': ((6, 24), (6, 29), (9, 16), (11, 20)),
+    'AM': ((9, 5), (11, 20)),
+    'AP': ((3, 19), (10, 5), (11, 20)),
+    'BA': ((7, 2),),
+    'CE': ((3, 19), (3, 25)),
+    'DF': ((11, 30),),
+    'ES': ((10, 28),),
+    'GO': ((10, 28),),
+    'MA': ((7, 28),),
+    'MG': (),
+    'MS': ((10, 11),),
+    'MT': ((11, 20),),
+    'PA': ((8, 15),),
+    'PB': ((8, 5),),
+    'PE': ((3, 6),),
+    'PI': ((10, 19),),
+    'PR': ((12, 19),),
+    'RJ': ((4, 23), (11, 20)),
+    'RN': ((10, 3),),
+    'RO': ((1, 4), (6, 18)),
+    'RR': ((10, 5),),
+    'RS': ((9, 20),),
+    'SC': ((8, 11),),
+    'SE': ((7, 8),),
+    'SP': ((7, 9), (11, 20)),
+    'TO': ((9, 8), (10, 5)),
+}
+
+# Regions accepted by `get_business_calendar`
+REGIONS = ('BR', *STATE_HOLIDAYS)
+
+
+def easter_sunday(year):
+    """
+    Computes the Easter Sunday of a year with the anonymous Gregorian algorithm.
+
+    :param year: The year.
+    :type year: int
+    :return: The Easter Sunday date.
+    :rtype: datetime.date
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(years=HOLIDAY_YEARS):
+    """
+    Lists the Brazilian national holidays of the given years.
+
+    :param years: The years of the holidays.
+    :type years: Iterable[int]
+    :return: The national holiday dates.
+    :rtype: list[datetime.date]
+    """
+    holidays = []
+    for year in years:
+        holidays.extend(date(year, month, day) for month, day in NATIONAL_HOLIDAYS)
+        if year >= 2024:
+            # Dia Nacional de Zumbi e da Consciência Negra
+            holidays.append(date(year, 11, 20))
+        easter = easter_sunday(year)
+        holidays.extend(easter + timedelta(days=days) for days in NATIONAL_EASTER_HOLIDAYS)
+    return holidays
+
+
+def state_holidays(state, years=HOLIDAY_YEARS):
+    """
+    Lists the holidays of a Brazilian state of the given years.
+
+    :param state: The state code, for instance 'BA'.
+    :type state: str
+    :param years: The years of the holidays.
+    :type years: Iterable[int]
+    :return: The state holiday dates.
+    :rtype: list[datetime.date]
+    """
+    return [date(year, month, day) for year in years for month, day in STATE_HOLIDAYS[state]]
+
+
+class BusinessCalendar:
+    """
+    Counts the business days (Monday through Friday, except holidays) of date ranges.
+
+    The weekdays are counted arithmetically from the weekday of the first day and the
+    length of the range. The holidays falling on weekdays are precomputed as a sorted
+    list of ordinals and subtracted with two binary searches, so a count does not
+    depend on the length of the range.
+
+    :ivar holidays: Sorted ordinals of the holidays falling on weekdays.
+    :type holidays: list[int]
+    """
+
+    def __init__(self, holidays=()):
+        self.holidays = sorted({holiday.toordinal() for holiday in holidays if holiday.weekday() < 5})
+
+    def count(self, date1, date2):
+        """
+        Calculate the count of business days between two dates, inclusive of the start
+        and end dates.
+
+        The days of the range are the days `date1 + i days` for `i` in
+        `range((date2 - date1).days + 1)`, as on the former day by day loop, so datetime
+        arguments give the same results.
+
+        :param date1: The starting date of the range
+        :type date1: datetime.date
+        :param date2: The ending date of the range
+        :type date2: datetime.date
+        :return: The number of business days between `date1` and `date2`, inclusive
+        :rtype: int
+        """
+        days = (date2 - date1).days + 1
+        if days <= 0:
+            return 0
+
+        weeks, remainder = divmod(days, 7)
+        first_weekday = date1.weekday()
+        business_days = weeks * 5 + sum(1 for i in range(remainder) if (first_weekday + i) % 7 < 5)
+
+        if self.holidays:
+            first_day = date1.toordinal()
+            last_day = first_day + days - 1
+            business_days -= bisect_right(self.holidays, last_day) - bisect_left(self.holidays, first_day)
+
+        return business_days
+
+
+# Calendar without holidays, only the weekends are not business days
+WEEKEND_CALENDAR = BusinessCalendar()
+
+
+@lru_cache(maxsize=None)
+def get_business_calendar(region=None):
+    """
+    Returns the business calendar of a region. The calendars are built once and cached.
+
+    :param region: None for a weekends only calendar, 'BR' for the national holidays, or a
+        state code, for instance 'BA', for the national and the state holidays.
+    :type region: str or None
+    :return: The business calendar of the region.
+    :rtype: BusinessCalendar
+    :raises ValueError: If the region is not one of `REGIONS`.
+    """
+    if not region:
+        return WEEKEND_CALENDAR
+    region = region.upper()
+    if region not in REGIONS:
+        raise ValueError('INVALID_REGION ' + str(region))
+    holidays = national_holidays()
+    if region != 'BR':
+        holidays += state_holidays(region)
+    return BusinessCalendar(holidays)
+
@@ -1,7 +1,22 @@
 from datetime import datetime, timedelta
 from marshmallow import ValidationError
 
+from app.utils.business_calendar import WEEKEND_CALENDAR
+from app.utils.instrumentation import timed
 
+# Formats accepted by parse_date, tried in this order
+DATE_FORMATS = [
+    '%d/%m/%Y %H:%M:%S',  # 29/06/2021 10:15:27
+    '%d/%m/%Y %H:%M',  # 29/06/2021 10:15
+    '%d/%m/%Y',  # 30/06/2021
+    '%d/%m%Y %H:%M',  # 30/062021 09:28
+    '%Y-%m-%d %H:%M:%S',  # 2021-06-26 10:31:14
+    '%d/%m/%y',  # 27/06/21
+    '%d /%m /%Y %H:%M:%S'  # 28 /06 /2021 10:57:27
+]
+
+
+@timed('parse_date')
 def parse_date(date_str):
     """
     Parses a date string into a datetime object based on one of several predefined formats.
@@ -22,15 +37,7 @@ def parse_date(date_str):
         raise ValidationError("DATE_INVALID_FORMAT")
 
 
-    formats=[
-        '%d/%m/%Y %H:%M:%S',  # 29/06/2021 10:15:27
-        '%d/%m/%Y %H:%M',  # 29/06/2021 10:15
-        '%d/%m/%Y',  # 30/06/2021
-        '%d/%m%Y %H:%M',  # 30/062021 09:28
-        '%Y-%m-%d %H:%M:%S',  # 2021-06-26 10:31:14
-        '%d/%m/%y',  # 27/06/21
-        '%d /%m /%Y %H:%M:%S'  # 28 /06 /2021 10:57:27
-    ]
+    formats = DATE_FORMATS
     # Return the date formated
     # If the formated date is invalid, return an exception
     # @TODO: Refactor to allow a empty field in the attendance_data field on db
@@ -86,24 +93,106 @@ def compare_date(date1, date2):
     return True
 # Count the number of days between two dates
 # Used to determine the number of business days between two dates
-def business_count_days(date1, date2):
+def business_count_days(date1, date2, calendar=WEEKEND_CALENDAR):
     """
     Calculate the count of business days (Monday through Friday) between two dates,
     inclusive of the start and end dates.
 
-    This utility function iterates over the date range starting from `date1`
-    and ending at `date2` (both inclusive), and counts only the days that fall
-    within Monday to Friday range. It excludes weekends (Saturday and Sunday)
-    from the count.
+    The count is delegated to a business calendar, which counts the weekdays
+    arithmetically instead of iterating over every day of the range. With the default
+    calendar only the weekends (Saturday and Sunday) are excluded from the count; a
+    regional calendar also excludes its holidays.
 
     :param date1: The starting date of the range
     :type date1: datetime.date
     :param date2: The ending date of the range
     :type date2: datetime.date
-    :return: The number of business days (excluding weekends) between `date1`
-             and `date2`, inclusive
+    :param calendar: The business calendar used to count the days
+    :type calendar: BusinessCalendar
+    :return: The number of business days (excluding weekends and the calendar's holidays)
+             between `date1` and `date2`, inclusive
     :rtype: int
     """
-    return sum(1 for day in (date1 + timedelta(days=i)
-                                   for i in range((date2 - date1).days + 1))
-                     if day.weekday() < 5)
+    return calendar.count(date1, date2)
+
+# Size of the time buckets accepted by the productivity series
+DATE_BUCKETS = ('day', 'week', 'month')
+
+
+# Truncate a date to the start of its bucket, like the date_trunc function of PostgreSQL
+def truncate_date(date, bucket):
+    """
+    Truncates a date to the first day of the day, week or month that contains it.
+    Weeks start on Monday, as the PostgreSQL `date_trunc('week', ...)` function does.
+
+    :param date: The date to be truncated.
+    :type date: datetime.date or datetime.datetime
+    :param bucket: The bucket size, one of `DATE_BUCKETS`.
+    :type bucket: str
+    :return: The first day of the bucket containing the date.
+    :rtype: datetime.date
+    :raises ValueError: If the bucket is not one of `DATE_BUCKETS`.
+    """
+    if isinstance(date, datetime):
+        date = date.date()
+    if bucket == 'day':
+        return date
+    if bucket == 'week':
+        return date - timedelta(days=date.weekday())
+    if bucket == 'month':
+        return date.replace(day=1)
+    raise ValueError('INVALID_BUCKET ' + str(bucket))
+
+
+# List the buckets between two dates
+def date_buckets(date1, date2, bucket):
+    """
+    Returns the consecutive buckets covering the range from `date1` to `date2`, both
+    inclusive. Each bucket is returned as its first day and its last day clipped to
+    the range, so the business days of the bucket can be counted within the period.
+
+    :param date1: The starting date of the range
+    :type date1: datetime.date or datetime.datetime
+    :param date2: The ending date of the range
+    :type date2: datetime.date or datetime.datetime
+    :param bucket: The bucket size, one of `DATE_BUCKETS`.
+    :type bucket: str
+    :return: A list of tuples (bucket_start, range_start, range_end), where range_start and
+        range_end are the first and last days of the bucket within the range.
+    :rtype: list[tuple[datetime.date, datetime.date, datetime.date]]
+    """
+    if isinstance(date1, datetime):
+        date1 = date1.date()
+    if isinstance(date2, datetime):
+        date2 = date2.date()
+
+    buckets = []
+    bucket_start = truncate_date(date1, bucket)
+    while bucket_start <= date2:
+        if bucket == 'day':
+            next_start = bucket_start + timedelta(days=1)
+        elif bucket == 'week':
+            next_start = bucket_start + timedelta(days=7)
+        else:
+            next_start = (bucket_start + timedelta(days=31)).replace(day=1)
+        buckets.append((bucket_start, max(bucket_start, date1), min(next_start - timedelta(days=1), date2)))
+        bucket_start = next_start
+    return buckets
+
+
+# Convert the date values returned by the database to date
+def to_date(value):
+    """
+    Converts a date value returned by the database to a date. PostgreSQL returns a
+    datetime for the `date_trunc` function, while SQLite returns an ISO formatted string.
+
+    :param value: The value to be converted.
+    :type value: datetime.datetime or datetime.date or str
+    :return: The corresponding date.
+    :rtype: datetime.date
+    """
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
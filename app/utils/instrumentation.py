@@ -0,0 +1,268 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+"""
+Per-request timing and SQL instrumentation.
+
+`init_instrumentation` times each request by endpoint, counts the SQL statements
+it runs and their duration through the SQLAlchemy cursor events, and splits the
+remaining time into the spans recorded with `timed` (date parsing, marshmallow
+schemas and JSON serialization). Each response gets a `Server-Timing` header, and
+the timings are collected into histograms rendered in the Prometheus text format
+by `render_metrics`, for the `/metrics` endpoint.
+
+The time of a span excludes the time of the spans and SQL statements it runs, so
+the durations of a request add up. The histograms are kept by process: with
+several gunicorn workers, each scrape reads the worker that answered it.
+"""
+
+# Upper bounds of the duration buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Upper bounds of the SQL statements per request buckets
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Label of the requests matching no route
+UNMATCHED_ENDPOINT = 'unmatched'
+
+
+class Histogram:
+    """
+    Thread-safe Prometheus histogram with labels.
+
+    :ivar name: The metric name.
+    :type name: str
+    :ivar documentation: The help text of the metric.
+    :type documentation: str
+    :ivar label_names: The names of the labels, in the order of the `observe` values.
+    :type label_names: tuple[str]
+    :ivar buckets: The sorted upper bounds of the buckets, +Inf excluded.
+    :type buckets: tuple[float]
+    """
+
+    def __init__(self, name, documentation, label_names, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """
+        Records a value under the given label values.
+
+        :param value: The observed value.
+        :type value: float
+        :param labels: The values of the labels.
+        :type labels: str
+        :return: None
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Count by bucket, with the +Inf one last, then the sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        """
+        Renders the histogram in the Prometheus text format.
+
+        :return: The lines of the metric.
+        :rtype: list[str]
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            separator = ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text}{separator}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-1]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('kpi_request_duration_seconds', 'Duration of the requests.',
+                             ('endpoint', 'method', 'status'))
+SQL_DURATION = Histogram('kpi_request_sql_duration_seconds', 'Time spent on SQL statements by request.',
+                         ('endpoint',))
+SQL_STATEMENTS = Histogram('kpi_request_sql_statements', 'Number of SQL statements by request.',
+                           ('endpoint',), STATEMENT_BUCKETS)
+SPAN_DURATION = Histogram('kpi_request_span_duration_seconds', 'Time spent on each span of a request.',
+                          ('endpoint', 'span'))
+
+METRICS = (REQUEST_DURATION, SQL_DURATION, SQL_STATEMENTS, SPAN_DURATION)
+
+
+class RequestTimings:
+    """
+    Timings of the current request, kept on `flask.g`.
+
+    :ivar started: The `perf_counter` value at the start of the request.
+    :type started: float
+    :ivar spans: Seconds spent by span, excluding the nested spans and statements.
+    :type spans: dict[str, float]
+    :ivar sql_seconds: Seconds spent on SQL statements.
+    :type sql_seconds: float
+    :ivar sql_statements: Number of SQL statements run.
+    :type sql_statements: int
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.sql_seconds = 0.0
+        self.sql_statements = 0
+        # Seconds of the nested spans and statements of each open span
+        self.children = []
+
+    def add_child(self, seconds):
+        if self.children:
+            self.children[-1] += seconds
+
+
+def current_timings():
+    """
+    Returns the timings of the current request, or None outside an instrumented
+    request.
+
+    :rtype: RequestTimings or None
+    """
+    return g.get('_request_timings') if has_request_context() else None
+
+
+@contextmanager
+def timed(span):
+    """
+    Times a block, or a function when used as a decorator, under a span of the
+    current request. Outside an instrumented request nothing is recorded.
+
+    :param span: The name of the span, as shown on the Server-Timing header.
+    :type span: str
+    """
+    timings = current_timings()
+    if timings is None:
+        yield
+        return
+    timings.children.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings.spans[span] = timings.spans.get(span, 0.0) + elapsed - timings.children.pop()
+        timings.add_child(elapsed)
+
+
+class TimedSchemaMixin:
+    """
+    Times the `load` and `dump` of a marshmallow schema under the `marshmallow` span.
+    """
+
+    def load(self, *args, **kwargs):
+        with timed('marshmallow'):
+            return super().load(*args, **kwargs)
+
+    def dump(self, *args, **kwargs):
+        with timed('marshmallow'):
+            return super().dump(*args, **kwargs)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider of the app timing the serialization of the responses under the
+    `json` span.
+    """
+
+    def dumps(self, obj, **kwargs):
+        with timed('json'):
+            return super().dumps(obj, **kwargs)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and current_timings() is not None:
+        context._instrumentation_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instrumentation_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    timings = current_timings()
+    if timings is not None:
+        timings.sql_seconds += elapsed
+        timings.sql_statements += 1
+        timings.add_child(elapsed)
+
+
+def _start_request():
+    g._request_timings = RequestTimings()
+
+
+def _finish_request(response):
+    timings = g.pop('_request_timings', None)
+    if timings is None:
+        return response
+    total = time.perf_counter() - timings.started
+    endpoint = request.endpoint or UNMATCHED_ENDPOINT
+
+    REQUEST_DURATION.observe(total, endpoint, request.method, str(response.status_code))
+    SQL_DURATION.observe(timings.sql_seconds, endpoint)
+    SQL_STATEMENTS.observe(timings.sql_statements, endpoint)
+    for span, seconds in timings.spans.items():
+        SPAN_DURATION.observe(seconds, endpoint, span)
+
+    entries = [f'total;dur={total * 1000:.2f}',
+               f'sql;dur={timings.sql_seconds * 1000:.2f};desc="statements: {timings.sql_statements}"']
+    entries += [f'{span};dur={seconds * 1000:.2f}' for span, seconds in timings.spans.items()]
+    response.headers.add('Server-Timing', ', '.join(entries))
+    return response
+
+
+def init_instrumentation(app):
+    """
+    Installs the request timing, the SQL statement events and the timed JSON
+    provider on an app.
+
+    :param app: The Flask application.
+    :type app: flask.Flask
+    :return: None
+    """
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    # Listening on the Engine class covers the engines created later by Flask-SQLAlchemy
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def render_metrics():
+    """
+    Renders every metric in the Prometheus text format.
+
+    :return: The text of the `/metrics` endpoint.
+    :rtype: str
+    """
+    return '\n'.join(line for metric in METRICS for line in metric.render()) + '\n'
@@ -0,0 +1,515 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.provider import DefaultJSONProvider
+
+"""
+Read-through cache of the serialized records, keyed by id and by alias columns.
+
+The records are kept on a backend, chosen by the RECORD_CACHE_BACKEND setting:
+
+ - `local`, an LRU dictionary of the process, the default. Each gunicorn worker has
+   its own, so a record written through a worker is still read from the cache of the
+   others until it expires after RECORD_CACHE_TTL_SECONDS.
+ - `shared`, a SQLite file at RECORD_CACHE_PATH opened by every process of the host,
+   the workers and the ingest daemon, standing in for a shared store. An invalidation
+   is seen by every process, and no process stores a record it loaded before it.
+ - `none`, no cache.
+
+An alias entry, as `attendance:id_attendance:42`, holds the ids of the records having
+the value, read from their own entries. A record whose alias value has changed since
+is not returned for it, so an alias entry is only invalidated for the values a record
+takes. The invalidations bump a generation kept on the backend, and the records loaded
+before are not stored, so a record read by a thread or a process while another one
+updates it is not cached after its invalidation. With the `shared` backend the
+generation is compared and the entries stored in a single transaction of the file.
+"""
+
+# Settings of the cache, overridden by the environment
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 60
+DEFAULT_PATH = '/tmp/kpi_record_cache.sqlite3'
+
+# Backends of the RECORD_CACHE_BACKEND setting
+RECORD_CACHE_BACKENDS = ('local', 'shared', 'none')
+
+# Keys of an IN list of the shared backend, below the SQLite bound variables limit
+SQLITE_BATCH_SIZE = 500
+
+
+class CacheBackend:
+    """
+    Store of the cache entries, bounded to `max_entries` with the least recently read
+    entries evicted first. The values are serializable by the JSON provider of the
+    app, and are not to be changed once stored or read.
+    """
+
+    name = None
+
+    def get_many(self, keys):
+        """
+        Reads the entries of the given keys.
+
+        :param keys: The keys.
+        :type keys: list[str]
+        :return: The values of the keys found and not expired.
+        :rtype: dict[str, Any]
+        """
+        raise NotImplementedError
+
+    def generation(self):
+        """
+        Returns the number of invalidations of the store.
+
+        :return: The generation, bumped by `delete_many` and `clear`.
+        :rtype: int
+        """
+        raise NotImplementedError
+
+    def set_many(self, entries, generation=None):
+        """
+        Writes entries, evicting the least recently read ones past the size, unless the
+        store was invalidated since the given generation.
+
+        :param entries: The values by key.
+        :type entries: dict[str, Any]
+        :param generation: The generation read before the values were loaded, or None
+            to write them anyway.
+        :type generation: int or None
+        :return: Whether the entries were written.
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        """
+        Removes the entries of the given keys and bumps the generation.
+
+        :param keys: The keys.
+        :type keys: Iterable[str]
+        :return: None
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Removes every entry and bumps the generation.
+
+        :return: None
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class LocalCacheBackend(CacheBackend):
+    """
+    Entries kept on an ordered dictionary of the process, from the least to the most
+    recently read.
+
+    :ivar max_entries: The number of entries kept.
+    :type max_entries: int
+    :ivar ttl_seconds: The seconds an entry is kept, or None to keep it until evicted.
+    :type ttl_seconds: float or None
+    :ivar evictions: The entries evicted to keep the size.
+    :type evictions: int
+    """
+
+    name = 'local'
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at is not None and expires_at <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def generation(self):
+        return self._generation
+
+    def set_many(self, entries, generation=None):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            for key, value in entries.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def delete_many(self, keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteCacheBackend(CacheBackend):
+    """
+    Entries kept on a SQLite file, shared by the processes of the host. Each thread
+    has its own connection, opened again in a forked process, and the file is in WAL
+    mode so the readers do not wait for a writer. The values are stored as JSON
+    encoded as the responses are, the dates becoming the strings they are sent as. The
+    generation is a row of the file, so it is shared by the processes as the entries.
+
+    :ivar path: The path of the SQLite file.
+    :type path: str
+    :ivar max_entries: The number of entries kept.
+    :type max_entries: int
+    :ivar ttl_seconds: The seconds an entry is kept, or None to keep it until evicted.
+    :type ttl_seconds: float or None
+    """
+
+    name = 'shared'
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS record_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                               'expires_at REAL, used_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS record_cache_used_at ON record_cache (used_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS record_cache_generation '
+                               '(id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)')
+            connection.execute('INSERT OR IGNORE INTO record_cache_generation (id, value) VALUES (0, 0)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get_many(self, keys):
+        connection = self._connection()
+        now = time.time()
+        found = {}
+        for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+            batch = keys[start:start + SQLITE_BATCH_SIZE]
+            rows = connection.execute(
+                f"SELECT key, value FROM record_cache WHERE key IN ({','.join('?' * len(batch))}) "
+                "AND (expires_at IS NULL OR expires_at > ?)", (*batch, now)).fetchall()
+            if rows:
+                connection.execute(f"UPDATE record_cache SET used_at = ? WHERE key IN ({','.join('?' * len(rows))})",
+                                   (now, *(key for key, _ in rows)))
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def _bump_generation(self, connection):
+        connection.execute('UPDATE record_cache_generation SET value = value + 1 WHERE id = 0')
+
+    def generation(self):
+        return self._connection().execute('SELECT value FROM record_cache_generation WHERE id = 0').fetchone()[0]
+
+    def set_many(self, entries, generation=None):
+        connection = self._connection()
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        rows = [(key, json.dumps(value, default=DefaultJSONProvider.default), expires_at, now)
+                for key, value in entries.items()]
+        # The connection is in autocommit mode, the generation is compared and the entries
+        # and the eviction are written at once
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if generation is not None and generation != connection.execute(
+                    'SELECT value FROM record_cache_generation WHERE id = 0').fetchone()[0]:
+                connection.execute('ROLLBACK')
+                return False
+            connection.executemany('INSERT OR REPLACE INTO record_cache (key, value, expires_at, used_at) '
+                                   'VALUES (?, ?, ?, ?)', rows)
+            excess = connection.execute('SELECT count(*) FROM record_cache').fetchone()[0] - self.max_entries
+            if excess > 0:
+                connection.execute('DELETE FROM record_cache WHERE key IN '
+                                   '(SELECT key FROM record_cache ORDER BY used_at LIMIT ?)', (excess,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return True
+
+    def delete_many(self, keys):
+        connection = self._connection()
+        keys = list(keys)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._bump_generation(connection)
+            for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+                batch = keys[start:start + SQLITE_BATCH_SIZE]
+                connection.execute(f"DELETE FROM record_cache WHERE key IN ({','.join('?' * len(batch))})", batch)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._bump_generation(connection)
+            connection.execute('DELETE FROM record_cache')
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM record_cache').fetchone()[0]
+
+
+class RecordCache:
+    """
+    Serialized records of a table, keyed by their `id` and by the values of their
+    alias columns. A failing backend is logged and read as a miss, so the requests
+    fall back on the database.
+
+    :ivar namespace: The prefix of the keys.
+    :type namespace: str
+    :ivar aliases: The columns the records can also be looked up by.
+    :type aliases: tuple[str]
+    :ivar backend: The store of the entries, or None when the cache is disabled.
+    :type backend: CacheBackend or None
+    :ivar hits: The records read from the cache.
+    :type hits: int
+    :ivar misses: The records looked up and not found on the cache.
+    :type misses: int
+    """
+
+    def __init__(self, namespace, aliases=(), backend=None):
+        self.namespace = namespace
+        self.aliases = tuple(aliases)
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def configure(self, backend):
+        """
+        Replaces the backend, None disabling the cache.
+
+        :param backend: The new backend.
+        :type backend: CacheBackend or None
+        :return: None
+        """
+        with self._lock:
+            self.backend = backend
+            self.hits = self.misses = 0
+
+    @property
+    def generation(self):
+        """
+        The number of invalidations of the backend, read before loading records to be
+        stored. None when the cache is disabled or the backend fails, the records being
+        then not stored.
+        """
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.generation()
+        except Exception as e:
+            logging.warning("Failed to read the %s record cache: %s", self.namespace, e)
+            return None
+
+    def key(self, field, value):
+        return f'{self.namespace}:{field}:{value}'
+
+    def get(self, id):
+        """
+        Reads a record by id.
+
+        :param id: The id of the record.
+        :type id: int
+        :return: The serialized record, or None if not cached.
+        :rtype: dict or None
+        """
+        return self.find('id', [id]).get(id, [None])[0]
+
+    def find(self, field, values):
+        """
+        Reads the records having the given values of the `id` or of an alias column.
+
+        :param field: `id` or an alias column.
+        :type field: str
+        :param values: The values looked up.
+        :type values: list
+        :return: The records of each value found, ordered by id. The values of an alias
+            are found only when all of their records are cached.
+        :rtype: dict[Any, list[dict]]
+        """
+        if self.backend is None:
+            return {}
+        try:
+            if field == 'id':
+                records = self._get_records(values)
+                found = {id: [records[id]] for id in values if id in records}
+            else:
+                ids_by_value = {value: ids for value, ids in zip(values, self._get_many(
+                    [self.key(field, value) for value in values])) if ids is not None}
+                records = self._get_records([id for ids in ids_by_value.values() for id in ids])
+                found = {}
+                for value, ids in ids_by_value.items():
+                    # A record missing or no longer having the value makes the entry stale
+                    if all(id in records and records[id][field] == value for id in ids):
+                        found[value] = [records[id] for id in ids]
+        except Exception as e:
+            logging.warning("Failed to read the %s record cache: %s", self.namespace, e)
+            found = {}
+        hits = len(found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(set(values)) - hits
+        return found
+
+    def put(self, records, generation, field='id', values=()):
+        """
+        Stores records loaded from the database, unless the backend was invalidated,
+        by any process sharing it, since the given generation was read.
+
+        :param records: The serialized records, each with its `id`.
+        :type records: list[dict]
+        :param generation: The `generation` read before the records were loaded.
+        :type generation: int or None
+        :param field: The column the records were looked up by, `id` or an alias.
+        :type field: str
+        :param values: The values of an alias column looked up, whose entries are stored
+            with the ids of their records.
+        :type values: Iterable
+        :return: None
+        """
+        if self.backend is None or generation is None:
+            return
+        entries = {self.key('id', record['id']): record for record in records}
+        if field != 'id':
+            ids_by_value = {}
+            for record in sorted(records, key=lambda record: record['id']):
+                ids_by_value.setdefault(record[field], []).append(record['id'])
+            entries.update((self.key(field, value), ids_by_value[value]) for value in values
+                           if value in ids_by_value)
+        try:
+            self.backend.set_many(entries, generation)
+        except Exception as e:
+            logging.warning("Failed to write the %s record cache: %s", self.namespace, e)
+
+    def invalidate(self, ids=(), **aliases):
+        """
+        Removes the records of the given ids, and the alias entries of the given values,
+        once the records are written to the database.
+
+        :param ids: The ids of the records written.
+        :type ids: Iterable[int]
+        :param aliases: The values of each alias column taken by the records written.
+        :type aliases: Iterable
+        :return: None
+        """
+        if self.backend is None:
+            return
+        keys = [self.key('id', id) for id in ids]
+        keys.extend(self.key(field, value) for field, values in aliases.items() for value in values)
+        try:
+            self.backend.delete_many(keys)
+        except Exception as e:
+            logging.warning("Failed to invalidate the %s record cache: %s", self.namespace, e)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        """
+        Returns the counters of the cache.
+
+        :return: The backend, the entries and the hits and misses of the process.
+        :rtype: dict
+        """
+        return {
+            'backend': self.backend.name if self.backend is not None else None,
+            'entries': len(self.backend) if self.backend is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _get_many(self, keys):
+        values = self.backend.get_many(keys)
+        return [values.get(key) for key in keys]
+
+    def _get_records(self, ids):
+        return {id: record for id, record in zip(ids, self._get_many([self.key('id', id) for id in ids]))
+                if record is not None}
+
+
+attendance_record_cache = RecordCache('attendance', aliases=('id_attendance',))
+
+
+def create_backend(name, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, path=DEFAULT_PATH):
+    """
+    Creates the backend of a RECORD_CACHE_BACKEND setting.
+
+    :param name: `local`, `shared` or `none`.
+    :type name: str
+    :param max_entries: The number of entries kept.
+    :type max_entries: int
+    :param ttl_seconds: The seconds an entry is kept, 0 to keep it until evicted.
+    :type ttl_seconds: float
+    :param path: The SQLite file of the `shared` backend.
+    :type path: str
+    :return: The backend, or None for `none`.
+    :rtype: CacheBackend or None
+    :raises ValueError: If the name is not one of `RECORD_CACHE_BACKENDS`.
+    """
+    if name not in RECORD_CACHE_BACKENDS:
+        raise ValueError('INVALID_RECORD_CACHE_BACKEND ' + str(name))
+    if name == 'local':
+        return LocalCacheBackend(max_entries, ttl_seconds or None)
+    if name == 'shared':
+        return SqliteCacheBackend(path, max_entries, ttl_seconds or None)
+    return None
+
+
+def init_record_cache(app):
+    """
+    Configures the record caches from the app settings.
+
+    :param app: The Flask application.
+    :type app: flask.Flask
+    :return: None
+    """
+    attendance_record_cache.configure(create_backend(
+        app.config['RECORD_CACHE_BACKEND'], app.config['RECORD_CACHE_SIZE'],
+        app.config['RECORD_CACHE_TTL_SECONDS'], app.config['RECORD_CACHE_PATH']))
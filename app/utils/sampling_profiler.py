@@ -0,0 +1,143 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+"""
+Sampling profiler of the threads of a worker process.
+
+A background thread reads the stack of every other thread with
+`sys._current_frames` at a fixed interval, and counts the stacks in the collapsed
+format of flamegraph.pl, speedscope and most flame graph viewers:
+
+    thread;module.py:function;module.py:function 42
+
+The sampled threads are not instrumented, so the overhead is the time the sampler
+holds the GIL to walk the stacks, a few microseconds by thread and sample.
+"""
+
+# Settings of a profile, bounded so a profile does not hold a worker thread too long
+DEFAULT_SECONDS = 10
+MAX_SECONDS = 60
+DEFAULT_INTERVAL_MS = 10
+MIN_INTERVAL_MS = 1
+MAX_INTERVAL_MS = 1000
+
+# Frames kept by stack, the outermost ones being dropped
+MAX_STACK_DEPTH = 128
+
+# Modules of the innermost frame of the idle threads, waiting for a request or a task
+IDLE_MODULES = ('threading', 'selectors', 'queue', 'concurrent.futures.thread')
+
+
+class ProfilerBusyError(RuntimeError):
+    """
+    Raised when a profile is requested while another one is running in the process.
+    """
+
+
+def frame_name(frame):
+    """
+    Returns the name of a frame on a collapsed stack.
+
+    :param frame: The frame.
+    :type frame: types.FrameType
+    :return: The file name and the qualified name of the function of the frame.
+    :rtype: str
+    """
+    code = frame.f_code
+    # co_qualname, with the class name, is only available from Python 3.11
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame, thread_name):
+    """
+    Returns the collapsed stack of a frame, from the thread to the frame.
+
+    :param frame: The innermost frame of the stack.
+    :type frame: types.FrameType
+    :param thread_name: The name of the thread, the root of the stack.
+    :type thread_name: str
+    :return: The names of the frames separated by semicolons.
+    :rtype: str
+    """
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.append(thread_name)
+    # Semicolons separate the frames, and a space the count
+    return ';'.join(reversed(names)).replace(' ', '_')
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads of the process. A single profile runs at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds=DEFAULT_SECONDS, interval=DEFAULT_INTERVAL_MS / 1000, include_idle=False, exclude=()):
+        """
+        Samples the stacks of the threads during the given duration, blocking the
+        calling thread, which is not sampled.
+
+        :param seconds: The duration of the profile.
+        :type seconds: float
+        :param interval: The seconds between two samples.
+        :type interval: float
+        :param include_idle: Whether the samples of the idle threads are kept, the
+            threads waiting on a lock, a queue or a selector.
+        :type include_idle: bool
+        :param exclude: The identifiers of other threads not to sample.
+        :type exclude: Iterable[int]
+        :return: The number of samples of each collapsed stack, and the number of
+            sampling rounds.
+        :rtype: tuple[collections.Counter, int]
+        :raises ProfilerBusyError: If another profile is running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("PROFILE_ALREADY_RUNNING")
+        try:
+            stacks = Counter()
+            rounds = [0]
+            excluded = set(exclude) | {threading.get_ident()}
+
+            def sample():
+                own = threading.get_ident()
+                stop_at = time.monotonic() + seconds
+                while time.monotonic() < stop_at:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    for ident, frame in sys._current_frames().items():
+                        if ident == own or ident in excluded:
+                            continue
+                        if not include_idle and frame.f_globals.get('__name__') in IDLE_MODULES:
+                            continue
+                        stacks[collapse(frame, names.get(ident, f'thread-{ident}'))] += 1
+                    rounds[0] += 1
+                    # The last sleep ends with the profile
+                    time.sleep(max(0, min(interval, stop_at - time.monotonic())))
+
+            sampler = threading.Thread(target=sample, name='sampling-profiler', daemon=True)
+            sampler.start()
+            sampler.join()
+            return stacks, rounds[0]
+        finally:
+            self._lock.release()
+
+
+def render_collapsed(stacks):
+    """
+    Renders the counted stacks in the collapsed format, the most sampled first.
+
+    :param stacks: The number of samples of each collapsed stack.
+    :type stacks: collections.Counter
+    :return: One `stack count` line by stack.
+    :rtype: str
+    """
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+sampling_profiler = SamplingProfiler()
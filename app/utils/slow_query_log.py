@@ -0,0 +1,233 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+"""
+Slow query log of the SQLAlchemy engines.
+
+The statements running longer than a threshold are logged with their bound
+parameters and the repository method that ran them, and kept on a bounded ring
+buffer read by the `/api/admin/slow_queries` endpoint. On PostgreSQL, the plan of a
+slow SELECT is captured with `EXPLAIN (ANALYZE, BUFFERS)` by a background thread,
+on its own connection and in a read-only transaction rolled back, so the request that
+ran the statement does not wait for it.
+"""
+
+# Settings of the log, overridden by the environment
+DEFAULT_THRESHOLD_SECONDS = 0.5
+DEFAULT_SIZE = 200
+# Plans waiting for the background thread, the slow queries past it are kept without plan
+EXPLAIN_QUEUE_SIZE = 16
+# Longest EXPLAIN ANALYZE run, as it runs the statement again
+EXPLAIN_TIMEOUT_MS = 30000
+
+# Length of the parameters kept, an executemany can bind thousands of rows
+MAX_PARAMETERS_LENGTH = 2000
+
+# Modules whose functions are reported as the caller of a statement
+CALLER_MODULE_PREFIX = 'app.repositories.'
+
+# Statements whose plan is captured, EXPLAIN ANALYZE running them again in a read-only
+# transaction
+EXPLAINED_STATEMENTS = ('select', 'with')
+
+
+def find_caller(frame):
+    """
+    Finds the repository function running a statement on the call stack.
+
+    :param frame: The frame to start from.
+    :type frame: types.FrameType
+    :return: The qualified name of the innermost repository function, or None.
+    :rtype: str or None
+    """
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith(CALLER_MODULE_PREFIX):
+            code = frame.f_code
+            # co_qualname, with the class name, is only available from Python 3.11
+            return getattr(code, 'co_qualname', f"{module.rsplit('.', 1)[-1]}.{code.co_name}")
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    """
+    Records the slow statements of every engine on a ring buffer.
+
+    :ivar threshold_seconds: The duration over which a statement is recorded.
+    :type threshold_seconds: float
+    :ivar size: The number of records kept, the oldest being dropped first.
+    :type size: int
+    :ivar explain: Whether the plans are captured on PostgreSQL.
+    :type explain: bool
+    """
+
+    def __init__(self, threshold_seconds=DEFAULT_THRESHOLD_SECONDS, size=DEFAULT_SIZE, explain=True):
+        self.threshold_seconds = threshold_seconds
+        self.explain = explain
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(EXPLAIN_QUEUE_SIZE)
+        self._executor = None
+        self._executor_pid = None
+
+    @property
+    def size(self):
+        return self._records.maxlen
+
+    def configure(self, threshold_seconds, size, explain=True):
+        """
+        Changes the settings of the log, the records being kept up to the new size.
+
+        :return: None
+        """
+        with self._lock:
+            self.threshold_seconds = threshold_seconds
+            self.explain = explain
+            if size != self._records.maxlen:
+                self._records = deque(self._records, maxlen=size)
+
+    def install(self):
+        """
+        Listens to the statements of every engine, including the ones created later.
+
+        :return: None
+        """
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def records(self, limit=None):
+        """
+        Returns the recorded statements, the most recent first.
+
+        :param limit: The maximum number of records returned.
+        :type limit: int or None
+        :return: Copies of the records.
+        :rtype: list[dict]
+        """
+        with self._lock:
+            records = [dict(record) for record in reversed(self._records)]
+        return records[:limit] if limit is not None else records
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._slow_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_slow_query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed >= self.threshold_seconds and not conn.info.get('slow_query_explain'):
+            self.record(conn.engine, statement, parameters, elapsed, executemany, find_caller(sys._getframe(1)))
+
+    def record(self, engine, statement, parameters, seconds, executemany=False, caller=None):
+        """
+        Logs a slow statement, keeps it on the ring buffer and queues the capture of
+        its plan.
+
+        :param engine: The engine that ran the statement.
+        :type engine: sqlalchemy.engine.Engine
+        :param statement: The SQL sent to the driver.
+        :type statement: str
+        :param parameters: The bound parameters.
+        :type parameters: Any
+        :param seconds: The duration of the statement.
+        :type seconds: float
+        :param executemany: Whether the statement ran once by parameter set.
+        :type executemany: bool
+        :param caller: The repository function that ran the statement.
+        :type caller: str or None
+        :return: The record.
+        :rtype: dict
+        """
+        bound = repr(parameters)
+        if len(bound) > MAX_PARAMETERS_LENGTH:
+            bound = bound[:MAX_PARAMETERS_LENGTH] + '...'
+        record = {
+            'recorded_at': datetime.now().isoformat(),
+            'duration_ms': round(seconds * 1000, 2),
+            'caller': caller,
+            'statement': statement,
+            'parameters': bound,
+            'dialect': engine.dialect.name,
+            'plan': None,
+            'plan_status': 'not_captured',
+        }
+        logging.warning("Slow query of %s ms in %s: %s %s", record['duration_ms'], caller, statement, bound,
+                        extra={'duration_ms': record['duration_ms'], 'caller': caller})
+
+        if (self.explain and engine.dialect.name == 'postgresql' and not executemany
+                and statement.lstrip().lower().startswith(EXPLAINED_STATEMENTS)):
+            if self._slots.acquire(blocking=False):
+                record['plan_status'] = 'pending'
+                self._get_executor().submit(self._capture_plan, engine, statement, parameters, record)
+            else:
+                record['plan_status'] = 'skipped'
+
+        with self._lock:
+            self._records.append(record)
+        return record
+
+    def _get_executor(self):
+        # The thread of an executor created before a fork does not exist in the child
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explain')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _capture_plan(self, engine, statement, parameters, record):
+        try:
+            with engine.connect() as connection:
+                connection.info['slow_query_explain'] = True
+                transaction = connection.begin()
+                try:
+                    # A data-modifying WITH, or a SELECT locking rows, fails instead of running
+                    connection.exec_driver_sql('SET TRANSACTION READ ONLY')
+                    connection.exec_driver_sql(f'SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}')
+                    rows = connection.exec_driver_sql(f'EXPLAIN (ANALYZE, BUFFERS) {statement}',
+                                                      parameters).fetchall()
+                finally:
+                    # EXPLAIN ANALYZE ran the statement, nothing of it is kept
+                    transaction.rollback()
+                    connection.info.pop('slow_query_explain', None)
+            plan, status = '\n'.join(row[0] for row in rows), 'captured'
+        except Exception as e:
+            logging.warning("Failed to capture the plan of a slow query: %s", e)
+            plan, status = None, 'failed'
+        finally:
+            self._slots.release()
+        with self._lock:
+            record['plan'] = plan
+            record['plan_status'] = status
+
+
+slow_query_log = SlowQueryLog()
+
+
+def init_slow_query_log(app):
+    """
+    Configures the slow query log from the app settings and listens to the engines.
+
+    :param app: The Flask application.
+    :type app: flask.Flask
+    :return: None
+    """
+    slow_query_log.configure(app.config['SLOW_QUERY_SECONDS'], app.config['SLOW_QUERY_LOG_SIZE'],
+                             app.config['SLOW_QUERY_EXPLAIN'])
+    slow_query_log.install()
@@ -0,0 +1,298 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+from app.utils.instrumentation import current_timings
+
+"""
+Logging of the app, configured by `init_logging` from `create_app`.
+
+The records are not written by the thread that logs them: a `QueueHandler` puts them
+on a bounded queue, and a `QueueListener` thread of the process writes them to the
+output, one JSON object by line. The message is formatted on the calling thread, so
+the listener does not read objects the caller may change. When the queue is full the
+records are dropped rather than blocking the request, and the next record written
+carries the number of records dropped.
+
+Each request gets an id, read from the `X-Request-ID` header or generated, returned
+on the response and added to the records logged while the request runs. Each request
+is logged on the `app.requests` logger with its status and duration. The DEBUG
+records are sampled by call site, one kept every `LOG_DEBUG_SAMPLE_EVERY`, so a
+debug line run by row or by statement does not flood the output.
+"""
+
+# Settings of the logging, overridden by the environment
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_DEBUG_SAMPLE_EVERY = 100
+
+# Header carrying the id of a request, from the client or a proxy and on the response
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Ids of the clients kept, the other ones being replaced by a generated one
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._:-]{1,64}')
+
+# Format of the records with LOG_FORMAT=text
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Attributes of every record, the other ones being the `extra` fields of the call
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+request_logger = logging.getLogger('app.requests')
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a JSON object, with its `extra` fields.
+    """
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps one DEBUG record every `every` by call site, the first one included. The
+    kept records carry the rate on their `sampled_every` field.
+
+    :ivar every: The number of records of a call site by kept record.
+    :type every: int
+    """
+
+    def __init__(self, every=DEFAULT_DEBUG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = every
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sampled_every = self.every
+        return True
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds the id of the current request to the records logged while it runs.
+    """
+
+    def filter(self, record):
+        if has_request_context() and not hasattr(record, 'request_id'):
+            request_id = g.get('request_id')
+            if request_id is not None:
+                record.request_id = request_id
+        return True
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    Puts the records on a bounded queue, written to the handlers by a listener
+    thread. The listener is started again in a forked process, on its first record,
+    as the thread of the parent does not exist there.
+
+    :ivar targets: The handlers writing the records.
+    :type targets: tuple[logging.Handler]
+    :ivar queue_size: The records waiting for the listener, past which they are dropped.
+    :type queue_size: int
+    :ivar dropped: The records dropped since the last one written.
+    :type dropped: int
+    """
+
+    def __init__(self, targets, queue_size=DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.targets = tuple(targets)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._exception_formatter = logging.Formatter()
+
+    def start(self):
+        """
+        Starts the listener thread of the current process.
+
+        :return: None
+        """
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # The queue of the parent may have been locked by its listener at the fork
+                self.queue = queue.Queue(self.queue_size)
+            self._listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """
+        Writes the records waiting on the queue and stops the listener thread.
+
+        :return: None
+        """
+        with self._start_lock:
+            if self._listener is not None and self._pid == os.getpid():
+                try:
+                    self._listener.stop()
+                except queue.Full:
+                    pass
+            self._listener = None
+            self._pid = None
+
+    def prepare(self, record):
+        # Formats the message on the calling thread, and keeps the traceback apart from
+        # it for the JSON formatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self.start()
+        dropped = self.dropped
+        if dropped:
+            record.dropped_records = dropped
+        try:
+            self.queue.put_nowait(record)
+            self.dropped -= dropped
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+
+
+def configure_logging(level='INFO', log_format='json', queue_size=DEFAULT_QUEUE_SIZE,
+                      debug_sample_every=DEFAULT_DEBUG_SAMPLE_EVERY, stream=None):
+    """
+    Sends the records of the root logger through the queue handler, replacing the
+    one of a former call.
+
+    :param level: The level of the root logger.
+    :type level: str or int
+    :param log_format: `json`, or `text` for the former line format.
+    :type log_format: str
+    :param queue_size: The records waiting for the listener, past which they are dropped.
+    :type queue_size: int
+    :param debug_sample_every: The DEBUG records of a call site by kept record.
+    :type debug_sample_every: int
+    :param stream: The output of the records, the standard error by default.
+    :type stream: io.TextIOBase or None
+    :return: The queue handler.
+    :rtype: AsyncQueueHandler
+    """
+    global _handler
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    handler = AsyncQueueHandler([output], queue_size)
+    handler.addFilter(DebugSampler(debug_sample_every))
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    shutdown_logging()
+    root.addHandler(handler)
+    root.setLevel(level)
+    handler.start()
+    _handler = handler
+    return handler
+
+
+def shutdown_logging():
+    """
+    Writes the waiting records and removes the queue handler from the root logger.
+
+    :return: None
+    """
+    global _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler.stop()
+        _handler = None
+
+
+# Runs before the shutdown of the logging module, so the waiting records are written
+atexit.register(shutdown_logging)
+
+
+def _start_request():
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = request_id if REQUEST_ID_PATTERN.fullmatch(request_id) else uuid.uuid4().hex
+    g._logging_started = time.perf_counter()
+
+
+def _finish_request(response):
+    request_id = g.get('request_id')
+    if request_id is None:
+        return response
+    response.headers[REQUEST_ID_HEADER] = request_id
+    if request_logger.isEnabledFor(logging.INFO):
+        duration_ms = round((time.perf_counter() - g._logging_started) * 1000, 2)
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+        }
+        timings = current_timings()
+        if timings is not None:
+            fields['sql_statements'] = timings.sql_statements
+            fields['sql_ms'] = round(timings.sql_seconds * 1000, 2)
+        request_logger.info('%s %s %s in %.2f ms', request.method, request.path, response.status_code,
+                            duration_ms, extra=fields)
+    return response
+
+
+def init_logging(app):
+    """
+    Configures the logging from the app settings and installs the request ids and the
+    request log. Called after `init_instrumentation`, so the request log reads the
+    SQL figures of the request before they are collected.
+
+    :param app: The Flask application.
+    :type app: flask.Flask
+    :return: None
+    """
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'], app.config['LOG_QUEUE_SIZE'],
+                      app.config['LOG_DEBUG_SAMPLE_EVERY'])
+    request_logger.disabled = not app.config['LOG_REQUESTS']
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
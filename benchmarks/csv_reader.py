@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+Compares the readers of the ingest CSV files: `pd.read_csv` with a fixed chunk of rows,
+as `load_csv_to_db` read the files before, against the memory-mapped `MappedCSVReader`
+with chunks sized to a memory budget.
+
+A synthetic `;` separated file of the given size is written once, then each reader
+runs in its own process, so the peak resident memory of one does not hide the other,
+and iterates over every chunk. Usage:
+
+    python -m benchmarks.csv_reader --megabytes 2048
+    python -m benchmarks.csv_reader --megabytes 2048 --memory-budget 268435456
+"""
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bytes by row of the synthetic file, to estimate the rows of a target size
+ROW_BYTES = 80
+
+
+def read_pandas(path, chunksize):
+    import pandas as pd
+
+    rows = 0
+    for chunk in pd.read_csv(path, sep=';', chunksize=chunksize):
+        rows += len(chunk)
+    return rows
+
+
+def read_mapped(path, memory_budget):
+    from app.scripts.csv_reader import MappedCSVReader
+    from app.scripts.load_data_csv import STRING_COLUMNS
+
+    rows = 0
+    with MappedCSVReader(path, sep=';', memory_budget=memory_budget, string_columns=STRING_COLUMNS) as reader:
+        for chunk in reader:
+            rows += len(chunk)
+    return rows
+
+
+def run_reader(args):
+    """
+    Runs a single reader and prints its measures, in the child process.
+    """
+    started = time.perf_counter()
+    if args.reader == 'pandas':
+        rows = read_pandas(args.path, args.chunksize)
+    else:
+        rows = read_mapped(args.path, args.memory_budget)
+    seconds = time.perf_counter() - started
+    print(json.dumps({
+        'reader': args.reader,
+        'rows': rows,
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(rows / seconds),
+        'megabytes_per_second': round(os.path.getsize(args.path) / seconds / 1024 ** 2, 1),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_megabytes': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pandas chunked vs memory-mapped CSV reader')
+    parser.add_argument('--megabytes', type=int, default=2048, help='Size of the synthetic file')
+    parser.add_argument('--chunksize', type=int, default=1000, help='Rows by chunk of pd.read_csv')
+    parser.add_argument('--memory-budget', type=int, default=64 * 1024 * 1024,
+                        help='Bytes by DataFrame of the memory-mapped reader')
+    parser.add_argument('--reader', choices=('pandas', 'mapped'), help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT_DIR)
+    if args.reader:
+        run_reader(args)
+        return
+
+    from benchmarks.synthetic_data import write_attendances_csv
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'attendances.csv')
+        write_attendances_csv(path, args.megabytes * 1024 ** 2 // ROW_BYTES)
+        results = []
+        for reader in ('pandas', 'mapped'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.csv_reader', '--reader', reader, '--path', path,
+                 '--chunksize', str(args.chunksize), '--memory-budget', str(args.memory_budget)],
+                cwd=ROOT_DIR, check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        file_bytes = os.path.getsize(path)
+
+    print(json.dumps({
+        'file_bytes': file_bytes,
+        'chunksize': args.chunksize,
+        'memory_budget': args.memory_budget,
+        'readers': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from dotenv import dotenv_values
+
+"""
+Compares seeding an environment from the `;` separated CSV (load_csv_to_db, which
+parses every date with parse_date) against the Parquet snapshot import
+(load_parquet_to_db, typed columns).
+
+A synthetic CSV is loaded into a first database and exported to Parquet, then the
+Parquet snapshot is imported into a second database. Usage:
+
+    python -m benchmarks.parquet_seed --rows 200000
+"""
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_app(uri):
+    from app import create_app
+    from app.config.create_db import create_db
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = uri
+    app = create_app()
+    create_db(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CSV vs Parquet seeding')
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    for key, value in dotenv_values(os.path.join(ROOT_DIR, '.env.example')).items():
+        os.environ.setdefault(key, value)
+    sys.path.insert(0, ROOT_DIR)
+
+    from app.repositories.dimension_repository import angel_repository, pole_repository
+    from app.scripts.load_data_csv import load_csv_to_db
+    from app.scripts.parquet_snapshot import export_attendances_to_parquet, load_parquet_to_db
+    from benchmarks.synthetic_data import write_attendances_csv
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'attendances.csv')
+        parquet_dir = os.path.join(tmp_dir, 'snapshot')
+        write_attendances_csv(csv_path, args.rows)
+
+        app = build_app(f"sqlite:///{os.path.join(tmp_dir, 'csv.db')}")
+        with app.app_context():
+            started = time.perf_counter()
+            load_csv_to_db(csv_path)
+            csv_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            exported = export_attendances_to_parquet(parquet_dir)
+            export_seconds = time.perf_counter() - started
+
+        # The dimension keys of the first database are not valid on the second one
+        angel_repository.clear()
+        pole_repository.clear()
+
+        app = build_app(f"sqlite:///{os.path.join(tmp_dir, 'parquet.db')}")
+        with app.app_context():
+            started = time.perf_counter()
+            imported = load_parquet_to_db(parquet_dir)
+            parquet_seconds = time.perf_counter() - started
+
+        csv_bytes = os.path.getsize(csv_path)
+        parquet_bytes = sum(os.path.getsize(os.path.join(root, name))
+                            for root, _, names in os.walk(parquet_dir) for name in names)
+
+    print(json.dumps({
+        'rows': args.rows,
+        'exported': exported,
+        'imported': imported,
+        'csv_load_seconds': round(csv_seconds, 2),
+        'parquet_export_seconds': round(export_seconds, 2),
+        'parquet_import_seconds': round(parquet_seconds, 2),
+        'csv_bytes': csv_bytes,
+        'parquet_bytes': parquet_bytes,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from dotenv import dotenv_values
+
+"""
+Measures the time a request saves by reusing the schema of the registry instead of
+building a schema per call, on the two paths of the attendance service:
+
+- create: `AttendanceCreationSchema().load(payload)` against the load of the
+  registry instance;
+- listing: `AttendanceSchema(many=True).dump(attendances)` against the dump of the
+  registry instance, the attendances being built in memory so no query is timed.
+
+Usage:
+
+    python -m benchmarks.schema_reuse --number 2000 --page 100
+"""
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Format of the dates of the request payloads
+PAYLOAD_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def payloads(count, seed=0):
+    """
+    Generates creation payloads, as posted to the attendance endpoint.
+
+    :return: The payloads.
+    :rtype: list[dict]
+    """
+    generator = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for index in range(count):
+        deadline = start + timedelta(minutes=generator.randrange(525600))
+        rows.append({
+            'id_attendance': index + 1,
+            'id_client': generator.randrange(1, 10000),
+            'angel': f'Angel {generator.randrange(500)}',
+            'pole': f'Pole {generator.randrange(30)}',
+            'deadline': deadline.strftime(PAYLOAD_DATE_FORMAT),
+            'attendance_date': (deadline + timedelta(hours=generator.randrange(-48, 48))).strftime(PAYLOAD_DATE_FORMAT),
+        })
+    return rows
+
+
+def per_call(statement, number, repeat):
+    """
+    Returns the best time of a call of the statement, in microseconds.
+    """
+    return min(timeit.repeat(statement, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the schema reuse of the attendance service')
+    parser.add_argument('--number', type=int, default=2000, help='Calls by timing run')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing runs, the best one is reported')
+    parser.add_argument('--page', type=int, default=100, help='Attendances dumped by listing')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for key, value in dotenv_values(os.path.join(ROOT_DIR, '.env.example')).items():
+        os.environ.setdefault(key, value)
+    sys.path.insert(0, ROOT_DIR)
+
+    from benchmarks.ingest_stages import git_commit
+    from benchmarks.parquet_seed import build_app
+    from app.dto.attendance import AttendanceCreationSchema
+    from app.schemas.attendance_schema import AttendanceSchema
+    from app.schemas.schema_registry import schema_registry
+
+    app = build_app('sqlite://')
+    rows = payloads(max(args.page, 1), args.seed)
+    payload = rows[0]
+
+    with app.app_context():
+        attendances = [AttendanceCreationSchema().load(row) for row in rows[:args.page]]
+        creation_schema = schema_registry.get(AttendanceCreationSchema)
+        listing_schema = schema_registry.get(AttendanceSchema, many=True)
+
+        timings = {
+            'create': {
+                'per_call_us': per_call(lambda: AttendanceCreationSchema().load(payload), args.number, args.repeat),
+                'registry_us': per_call(lambda: creation_schema.load(payload), args.number, args.repeat),
+            },
+            'listing': {
+                'per_call_us': per_call(lambda: AttendanceSchema(many=True).dump(attendances),
+                                        args.number, args.repeat),
+                'registry_us': per_call(lambda: listing_schema.dump(attendances), args.number, args.repeat),
+            },
+            'construction': {
+                'creation_schema_us': per_call(AttendanceCreationSchema, args.number, args.repeat),
+                'attendance_schema_us': per_call(lambda: AttendanceSchema(many=True), args.number, args.repeat),
+            },
+        }
+
+    for path in ('create', 'listing'):
+        timing = timings[path]
+        timing['saved_us'] = timing['per_call_us'] - timing['registry_us']
+        timing['speedup'] = timing['per_call_us'] / timing['registry_us']
+    results = {
+        'commit': git_commit(),
+        'number': args.number,
+        'repeat': args.repeat,
+        'page': args.page,
+        'timings': {path: {name: round(value, 2) for name, value in timing.items()}
+                    for path, timing in timings.items()},
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from dotenv import dotenv_values
+
+"""
+Compares the requests per second of the development server (python run.py)
+against the gunicorn production entry point (wsgi.py).
+
+Both servers run against the same temporary SQLite database, with the settings
+from .env.example, and are driven by the same pool of client threads. Usage:
+
+    python -m benchmarks.server_throughput --duration 10 --concurrency 16
+"""
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def server_commands(port):
+    return {
+        'flask_dev_server': [sys.executable, 'run.py'],
+        'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'python:app.config.gunicorn_config',
+                     '--bind', f'127.0.0.1:{port}', 'wsgi:app'],
+    }
+
+
+def wait_until_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise TimeoutError(f"SERVER_NOT_READY {url}")
+
+
+def drive(url, duration, concurrency):
+    """
+    Sends GET requests to the url from several threads during the given duration.
+
+    :param url: The url to request.
+    :type url: str
+    :param duration: Number of seconds to keep sending requests.
+    :type duration: float
+    :param concurrency: Number of client threads.
+    :type concurrency: int
+    :return: The number of successful requests, failed requests and requests per second.
+    :rtype: dict
+    """
+    counters = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker():
+        ok = failed = 0
+        with requests.Session() as session:
+            while time.monotonic() < stop_at:
+                try:
+                    if session.get(url, timeout=10).status_code < 500:
+                        ok += 1
+                    else:
+                        failed += 1
+                except requests.RequestException:
+                    failed += 1
+        with lock:
+            counters['ok'] += ok
+            counters['failed'] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    return {**counters, 'requests_per_second': counters['ok'] / elapsed}
+
+
+def run_benchmark(name, command, port, path, duration, concurrency, env):
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f'http://127.0.0.1:{port}{path}'
+        wait_until_ready(url)
+        # Warm up the workers before measuring
+        drive(url, 1, concurrency)
+        result = drive(url, duration, concurrency)
+        return {'server': name, **result}
+    finally:
+        # The flask reloader spawns a child process, so the whole group is stopped
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask development server vs gunicorn throughput')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--path', default='/home')
+    args = parser.parse_args()
+
+    # run.py always binds the 8000 port
+    port = 8000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The .env.example values fill the settings missing from the environment
+        env = {**dotenv_values(os.path.join(ROOT_DIR, '.env.example')), **os.environ,
+               'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}",
+               'PORT': str(port)}
+        results = [run_benchmark(name, command, port, args.path, args.duration, args.concurrency, env)
+                   for name, command in server_commands(port).items()]
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
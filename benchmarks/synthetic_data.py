@@ -0,0 +1,100 @@
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from app.utils.date_utils import DATE_FORMATS
+
+"""
+Deterministic generator of `bd_desafio.csv`-shaped files.
+
+The same arguments and seed always write the same file, so the ingest benchmarks of
+two commits load the same data. The dates are written with a configurable mix of the
+formats accepted by `parse_date`, and a share of the rows can be made invalid, with
+the kinds of errors found on the production exports. Usage:
+
+    python -m benchmarks.synthetic_data attendances.csv --rows 1000000 --error-rate 0.01
+"""
+
+HEADER = 'id_atendimento;id_cliente;angel;polo;data_limite;data_de_atendimento\n'
+
+# Share of each of the DATE_FORMATS of parse_date by default, most dates of the exports
+# having the first one
+DEFAULT_FORMAT_WEIGHTS = (70, 10, 5, 2, 10, 2, 1)
+
+# Kinds of the invalid rows, picked evenly
+ERRORS = ('invalid_date', 'invalid_id', 'empty_pole', 'future_date')
+
+# Period of the attendance dates
+START_DATE = datetime(2021, 1, 1)
+PERIOD_SECONDS = 365 * 86400
+
+
+def write_attendances_csv(path, rows, seed=0, format_weights=DEFAULT_FORMAT_WEIGHTS, error_rate=0.0, angels=500,
+                          poles=30):
+    """
+    Writes a CSV file in the format of the production exports.
+
+    :param path: The path of the CSV file.
+    :type path: str
+    :param rows: Number of attendances.
+    :type rows: int
+    :param seed: Seed of the random generator.
+    :type seed: int
+    :param format_weights: Relative share of each of the `DATE_FORMATS`.
+    :type format_weights: Sequence[float]
+    :param error_rate: Share of invalid rows, between 0 and 1.
+    :type error_rate: float
+    :param angels: Number of distinct angels.
+    :type angels: int
+    :param poles: Number of distinct poles.
+    :type poles: int
+    :return: The number of invalid rows written.
+    :rtype: int
+    """
+    generator = random.Random(seed)
+    formats = generator.choices(DATE_FORMATS, weights=format_weights, k=rows)
+    errors = 0
+    with open(path, 'w') as f:
+        f.write(HEADER)
+        for i in range(rows):
+            attendance_date = START_DATE + timedelta(seconds=generator.randrange(PERIOD_SECONDS))
+            deadline = attendance_date + timedelta(seconds=generator.randrange(-86400, 2 * 86400))
+            id_attendance = i + 1
+            pole = f'Pole {generator.randrange(poles)}'
+            deadline_text = deadline.strftime(formats[i])
+            attendance_date_text = attendance_date.strftime(formats[i])
+            if error_rate and generator.random() < error_rate:
+                errors += 1
+                error = ERRORS[generator.randrange(len(ERRORS))]
+                if error == 'invalid_date':
+                    deadline_text = deadline.strftime('%Y/%d/%m')
+                elif error == 'invalid_id':
+                    id_attendance = 0
+                elif error == 'empty_pole':
+                    pole = ''
+                else:
+                    attendance_date_text = datetime(2099, 1, 1).strftime(DATE_FORMATS[0])
+            f.write(f"{id_attendance};{generator.randrange(1, 100000)};Angel {generator.randrange(angels)};{pole};"
+                    f"{deadline_text};{attendance_date_text}\n")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic bd_desafio.csv-shaped file')
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format-weights', type=float, nargs=len(DATE_FORMATS), default=DEFAULT_FORMAT_WEIGHTS,
+                        metavar='WEIGHT', help='Share of each date format, in the order of parse_date')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--angels', type=int, default=500)
+    parser.add_argument('--poles', type=int, default=30)
+    args = parser.parse_args()
+
+    errors = write_attendances_csv(args.path, args.rows, args.seed, args.format_weights, args.error_rate,
+                                   args.angels, args.poles)
+    print(f"Wrote {args.rows} rows to {args.path}, {errors} invalid.")
+
+
+if __name__ == '__main__':
+    main()
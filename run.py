@@ -1,19 +1,17 @@
-
 from app import create_app
 from app.config.create_db import create_db
 
 """
-Main script to initialize the flask server
+Main script to initialize the flask development server
  - Create a new database if it doesn't exist'
  - Run the python run.py to start the server
- - When running in docker container dockerfile will use gunicorn
+ - When running in docker container the image uses gunicorn through wsgi.py
 """
 
 # Create a flask
 app = create_app()
-# Create db with app context
-with app.app_context():
-    create_db()
+# Create db reusing the app already built
+create_db(app)
 # Run flask server
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, debug=True)
@@ -0,0 +1,27 @@
+from sqlalchemy.orm import configure_mappers
+
+from app import create_app
+from app.config.create_db import create_db
+
+"""
+Production WSGI entry point used by gunicorn
+ - Build the app a single time and create the database if it doesn't exist
+ - Configure the SQLAlchemy mappers before the workers are forked
+ - Load the columnar analytics snapshot, when enabled, so the workers share it
+ - Start with: gunicorn -c python:app.config.gunicorn_config wsgi:app
+"""
+
+# Create a flask
+app = create_app()
+# Create db reusing the app already built
+create_db(app)
+# Build the mapper configuration once, so the forked workers inherit it
+configure_mappers()
+
+if app.config["ANALYTICS_BACKEND"] == 'columnar':
+    from app.config.config import db
+    from app.repositories.columnar_attendance_repository import columnar_attendance_repository
+
+    with app.app_context():
+        columnar_attendance_repository.refresh(force=True)
+        db.session.remove()